@@ -1,40 +1,182 @@
 import os
 import sys
+import json
+import time
+import argparse
+import datetime
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# 定义需要分析的项目及其路径（相对于当前脚本所在目录）
-projects = [
-    {"name": "OpenManus", "path": "../../OpenManus"},
-    {"name": "yolov5",   "path": "../../yolov5"},
-    # {"name": "dify",     "path": "../../dify"},
-    # {"name": "tensorflow", "path": "../../tensorflow"},
-    {"name": "LLaMA-Factory", "path": "../../LLaMA-Factory"}
-    # {"name": "diffusers", "path": "../../diffusers"},
-    # {"name": "peft", "path": "../../peft"}
-]
-
-# scenario 参数统一为 "direct"
-scenario = "direct"
-
-def run_project(project):
+from codesense_global_budget import serve_global_budget, new_budget_client, BUDGET_CLIENT_ENV
+from codesense_progress_journal import load_scan_json_with_journal
+from codesense_scan_model import ScanModel
+
+CODE_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_manifest(manifest_path):
+    """
+    读取项目清单；项目的 path 为相对路径时相对于清单文件所在目录解析。
+    enabled 为 false 的项目跳过，项目可单独覆盖 scenario / summarizer_config / output。
+    """
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    projects = []
+    for project in manifest.get("projects", []):
+        if not project.get("enabled", True):
+            continue
+        project = dict(project)
+        project["path"] = os.path.normpath(os.path.join(base_dir, project["path"]))
+        projects.append(project)
+    return manifest, projects
+
+
+def count_summaries(project_name, output):
+    """统计扫描结果中的文件数与已有摘要的文件数，用于计算吞吐量；读取失败时返回 (0, 0)"""
+    scan_path = os.path.join(CODE_ROOT, "scan_results", project_name, output)
+    try:
+        data = load_scan_json_with_journal(scan_path)
+    except Exception:
+        return 0, 0
+    if not data:
+        return 0, 0
+    model = ScanModel(data)
+    done = sum(1 for node in model.iter_files() if node.get("summaries"))
+    return len(model.files), done
+
+
+def run_project(project, manifest, budget_env, budget=None):
+    """
+    在独立子进程中运行 codesense_run_all.py，输出写入 scan_results/<项目>/batch_run.log，
+    各项目的扫描结果、日志与大模型调用记录互不干扰。返回该项目的运行结果。
+    子进程结束（包括超时被终止或崩溃）后收回其仍持有的全局并发槽。
+    """
+    name = project["name"]
+    output = project.get("output", manifest.get("output", "project_structure.json"))
     cmd = [
         sys.executable, "codesense_run_all.py",
-        "--project_name", project["name"],
+        "--project_name", name,
         "--project_path", project["path"],
-        "--scenario", scenario
+        "--scenario", project.get("scenario", manifest.get("scenario", "direct")),
+        "--output", output,
     ]
-    print(f"正在处理项目：{project['name']}")
-    result = subprocess.run(cmd)
-    if result.returncode != 0:
-        print(f"项目 {project['name']} 分析失败，退出。")
-        sys.exit(result.returncode)
-    else:
-        print(f"项目 {project['name']} 分析完成。\n")
+    summarizer_config = project.get("summarizer_config", manifest.get("summarizer_config"))
+    if summarizer_config:
+        cmd += ["--summarizer_config", summarizer_config]
+    output_dir = os.path.join(CODE_ROOT, "scan_results", name)
+    log_path = os.path.join(output_dir, "batch_run.log")
+    if not os.path.isdir(project["path"]):
+        return {"name": name, "ok": False, "error": f"项目路径 {project['path']} 不存在", "seconds": 0.0,
+                "files": 0, "summarized": 0, "log": None}
+    os.makedirs(output_dir, exist_ok=True)
+    client = new_budget_client()
+    env = dict(os.environ, **budget_env)
+    env[BUDGET_CLIENT_ENV] = client
+    _, before = count_summaries(name, output)
+    timeout = project.get("timeout", manifest.get("project_timeout"))
+    start = time.monotonic()
+    with open(log_path, "w", encoding="utf-8") as log:
+        try:
+            returncode = subprocess.run(cmd, cwd=CODE_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                        timeout=timeout).returncode
+            error = None if returncode == 0 else f"退出码 {returncode}"
+        except subprocess.TimeoutExpired:
+            returncode, error = -1, f"超过 {timeout} 秒未完成"
+        except Exception as e:
+            returncode, error = -1, str(e)
+        finally:
+            if budget is not None:
+                try:
+                    budget.release_client(client)
+                except Exception as e:
+                    print(f"收回项目 {name} 的全局并发槽失败：{e}")
+    elapsed = time.monotonic() - start
+    total, after = count_summaries(name, output)
+    return {
+        "name": name,
+        "ok": returncode == 0,
+        "error": error,
+        "seconds": round(elapsed, 2),
+        "files": total,
+        "summarized": after - before,
+        "log": log_path,
+    }
+
+
+def print_report(results, wall_time, budget_stats):
+    print("\n========== 批量分析汇总 ==========")
+    print(f"{'项目':<20}{'状态':<8}{'耗时(s)':>10}{'文件数':>10}{'新摘要':>10}{'文件/分钟':>12}")
+    for r in results:
+        rate = r["summarized"] / r["seconds"] * 60 if r["seconds"] > 0 else 0
+        status = "成功" if r["ok"] else "失败"
+        print(f"{r['name']:<20}{status:<8}{r['seconds']:>10.1f}{r['files']:>10}{r['summarized']:>10}{rate:>12.1f}")
+    serial_time = sum(r["seconds"] for r in results)
+    summarized = sum(r["summarized"] for r in results)
+    print(f"总墙钟时间 {wall_time:.1f} s（各项目耗时之和 {serial_time:.1f} s），"
+          f"共生成 {summarized} 个文件摘要，整体吞吐 {summarized / wall_time * 60 if wall_time else 0:.1f} 文件/分钟")
+    if budget_stats:
+        print(f"全局预算：共发放 {budget_stats['granted']} 次请求许可，峰值并发 {budget_stats['peak_in_flight']}"
+              f"/{budget_stats['max_concurrency']}，等待并发槽累计 {budget_stats['slot_wait']:.1f} s，"
+              f"限流等待累计 {budget_stats['rate_wait']:.1f} s")
+        if budget_stats.get("reclaimed"):
+            print(f"子进程退出时未释放、由编排器收回的并发槽：{budget_stats['reclaimed']} 个")
+    for r in results:
+        if not r["ok"]:
+            print(f"项目 {r['name']} 失败（{r['error']}）" + (f"，详见 {r['log']}" if r["log"] else ""))
+
 
 def main():
-    for project in projects:
-        run_project(project)
-    print("所有项目分析完成。")
+    parser = argparse.ArgumentParser(description="CodeSense 批量分析：并行处理清单中的多个项目，共享全局请求预算")
+    parser.add_argument("--manifest", type=str, default=os.path.join(CODE_ROOT, "batch_projects.json"),
+                        help="项目清单文件路径（默认: batch_projects.json）")
+    parser.add_argument("--parallel", type=int, default=None, help="同时处理的项目数（覆盖清单中的 max_parallel_projects）")
+    parser.add_argument("--scenario", type=str, choices=["direct", "correct", "usage", "custom"], default=None,
+                        help="统一的总结场景（覆盖清单中的 scenario）")
+    args = parser.parse_args()
+
+    manifest, projects = load_manifest(args.manifest)
+    if args.scenario:
+        manifest["scenario"] = args.scenario
+        for project in projects:
+            project.pop("scenario", None)
+    if not projects:
+        print("清单中没有需要处理的项目。")
+        return
+    parallel = args.parallel or manifest.get("max_parallel_projects", 1)
+
+    manager, budget, budget_env = serve_global_budget(manifest.get("global_budget"))
+    print(f"共 {len(projects)} 个项目，同时处理 {parallel} 个，全局并发上限 {budget.stats()['max_concurrency']}")
+
+    results = []
+    start = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            futures = {executor.submit(run_project, p, manifest, budget_env, budget): p for p in projects}
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                status = "分析完成" if result["ok"] else f"分析失败（{result['error']}），继续处理其他项目"
+                print(f"项目 {result['name']} {status}，耗时 {result['seconds']:.1f} 秒")
+        wall_time = time.monotonic() - start
+        budget_stats = budget.stats()
+    finally:
+        manager.shutdown()
+
+    order = {p["name"]: i for i, p in enumerate(projects)}
+    results.sort(key=lambda r: order[r["name"]])
+    print_report(results, wall_time, budget_stats)
+
+    report_path = os.path.join(CODE_ROOT, "scan_results",
+                               f"batch_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"wall_seconds": round(wall_time, 2), "global_budget": budget_stats, "projects": results},
+                  f, ensure_ascii=False, indent=4)
+    print(f"汇总报告已保存至 {report_path}")
+    if not all(r["ok"] for r in results):
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
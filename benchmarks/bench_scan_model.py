@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codesense_scan_model import ScanModel
+
+
+def build_synthetic_scan(n_files, files_per_dir=50, dirs_per_dir=8):
+    """
+    构造与 codesense_scanner 输出结构一致的合成扫描结果，共 n_files 个文件。
+    目录按广度优先展开，每个目录最多 files_per_dir 个文件、dirs_per_dir 个子目录。
+    """
+    root = {"type": "dir", "name": "synthetic", "relative_path": "", "children": []}
+    queue = [root]
+    created = 0
+    head = 0
+    while created < n_files:
+        node = queue[head]
+        head += 1
+        for i in range(min(files_per_dir, n_files - created)):
+            rel = os.path.join(node["relative_path"], f"f{i}.py") if node["relative_path"] else f"f{i}.py"
+            node["children"].append({
+                "type": "file",
+                "name": f"f{i}.py",
+                "relative_path": rel,
+                "is_text": True,
+                "character_count": 1000 + (created % 5000),
+                "language": "python",
+                "category": "code",
+                "need_traverse": True,
+                "summaries": {}
+            })
+            created += 1
+        for d in range(dirs_per_dir):
+            rel = os.path.join(node["relative_path"], f"d{d}") if node["relative_path"] else f"d{d}"
+            child = {"type": "dir", "name": f"d{d}", "relative_path": rel, "children": []}
+            node["children"].append(child)
+            queue.append(child)
+    return {"project_name": "synthetic", "structure": root, "need_traverse": True, "summaries": {}}
+
+
+def legacy_char_count(structure, target):
+    """重构前 main() 中 get_file_char_count 的递归搜索实现，作为基准"""
+    def recursive_search(node, target):
+        if node.get("relative_path") == target:
+            return node.get("character_count", 0) or 0
+        if node.get("type") == "dir":
+            for child in node.get("children", []):
+                res = recursive_search(child, target)
+                if res is not None:
+                    return res
+        return None
+    return recursive_search(structure, target)
+
+
+def legacy_update(node, file_rel, summary):
+    """重构前 update_structure_summary 的递归回填实现，作为基准"""
+    if node.get("type") == "file" and node.get("relative_path") == file_rel:
+        node["summaries"] = summary
+        node["need_traverse"] = False
+        return True
+    if node.get("type") == "dir":
+        for child in node.get("children", []):
+            if legacy_update(child, file_rel, summary):
+                return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ScanModel 索引与旧递归搜索的性能对比")
+    parser.add_argument("--files", type=int, default=100000, help="合成文件数量 (默认: 100000)")
+    parser.add_argument("--sample", type=int, default=200, help="旧实现抽样测量的文件数，结果按比例外推")
+    args = parser.parse_args()
+
+    scan_data = build_synthetic_scan(args.files)
+
+    start = time.perf_counter()
+    model = ScanModel(scan_data)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pending = model.collect_pending_files()
+    total_chars = sum(model.get_char_count(fp) for fp in pending)
+    for fp in pending:
+        model.update_summary(fp, {"summary": "x"})
+    new_time = time.perf_counter() - start
+    print(f"文件数：{len(pending)}，总字符数：{total_chars}")
+    print(f"[ScanModel] 建立索引 {build_time * 1000:.1f} ms，查询+回填全部文件 {new_time * 1000:.1f} ms")
+
+    # 旧实现每个文件都是一次整树遍历，整体为 O(N^2)，这里抽样测量后线性外推
+    legacy_data = build_synthetic_scan(args.files)
+    step = max(1, len(pending) // args.sample)
+    sample = pending[::step][:args.sample]
+    start = time.perf_counter()
+    for fp in sample:
+        legacy_char_count(legacy_data["structure"], fp)
+        legacy_update(legacy_data["structure"], fp, {"summary": "x"})
+    legacy_sample_time = time.perf_counter() - start
+    legacy_estimate = legacy_sample_time / len(sample) * len(pending)
+    print(f"[递归搜索] 抽样 {len(sample)} 个文件耗时 {legacy_sample_time * 1000:.1f} ms，"
+          f"外推全部文件约 {legacy_estimate:.1f} s")
+    if new_time + build_time > 0:
+        print(f"加速比约 {legacy_estimate / (new_time + build_time):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codesense_scan_model import ScanModel
+from codesense_scan_store import ScanStore, write_scan_store
+from bench_scan_model import build_synthetic_scan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="project_structure.json 与 .cstore 二进制存储的体积与加载耗时对比")
+    parser.add_argument("--files", type=int, default=100000, help="合成文件数量 (默认: 100000)")
+    args = parser.parse_args()
+
+    scan_data = build_synthetic_scan(args.files)
+    for node in ScanModel(scan_data).iter_files():
+        node["fingerprint"] = {"size": node["character_count"], "mtime_ns": 1700000000000000000, "hash": "0" * 32}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "project_structure.json")
+        store_path = os.path.join(tmp, "project_structure.cstore")
+
+        start = time.perf_counter()
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(scan_data, f, ensure_ascii=False, indent=4)
+        json_write = time.perf_counter() - start
+        start = time.perf_counter()
+        write_scan_store(store_path, scan_data)
+        store_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(json_path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        model = ScanModel(loaded)
+        json_pending = model.collect_pending_files()
+        json_load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = ScanStore(store_path)
+        store_open = time.perf_counter() - start
+        sample = json_pending[len(json_pending) // 2]
+        start = time.perf_counter()
+        count = store.get_char_count(sample)
+        store_lookup = time.perf_counter() - start
+        start = time.perf_counter()
+        store_pending = store.collect_pending_files()
+        store_scan = time.perf_counter() - start
+        start = time.perf_counter()
+        exported = store.to_scan_data()
+        store_export = time.perf_counter() - start
+        store.close()
+
+        assert store_pending == json_pending and count == model.get_char_count(sample)
+        assert exported == loaded, "导出结果与原始 JSON 不一致"
+
+        print(f"文件数：{args.files}")
+        print(f"[JSON]   大小 {os.path.getsize(json_path) / 1e6:.1f} MB，写入 {json_write:.2f} s，"
+              f"加载并收集待处理文件 {json_load:.2f} s")
+        print(f"[cstore] 大小 {os.path.getsize(store_path) / 1e6:.1f} MB，写入 {store_write:.2f} s，"
+              f"打开 {store_open * 1000:.2f} ms，单文件查询 {store_lookup * 1000:.3f} ms，"
+              f"收集待处理文件 {store_scan:.2f} s，完整导出 {store_export:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
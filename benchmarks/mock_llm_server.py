@@ -0,0 +1,187 @@
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 批量摘要提示词中的文件标记，与 summarize_files_batch 的拼接格式一致
+FILE_MARK_PATTERN = re.compile(r"【文件路径：(.*?)】")
+
+
+class MockOptions:
+    """
+    模拟服务的行为参数：
+      - latency：首个 token 前的等待秒数（TTFT）
+      - tokens_per_second：正文输出速率，0 表示不限速
+      - error_rate：请求失败的概率，失败时返回 error_status（429 时带 Retry-After）
+      - reasoning_chars：流式返回中思考过程（reasoning）的字符数
+      - truncate_rate：批量摘要的回答在中途被截断（只返回前一部分 JSON）的概率
+      - chars_per_token：估算 usage 与输出速率时的 字符/token 比例
+    """
+
+    def __init__(self, latency=0.0, tokens_per_second=0.0, error_rate=0.0, error_status=429, retry_after=0.2,
+                 reasoning_chars=0, summary_chars=120, chars_per_token=3.5, truncate_rate=0.0, seed=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.reasoning_chars = reasoning_chars
+        self.summary_chars = summary_chars
+        self.chars_per_token = chars_per_token
+        self.truncate_rate = truncate_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "stream": 0, "truncated": 0}
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in ("latency", "tokens_per_second", "error_rate", "error_status",
+                                               "reasoning_chars", "summary_chars", "chars_per_token",
+                                               "truncate_rate")}
+
+
+def build_answer(prompt, options, truncate=False):
+    """
+    批量摘要请求返回各文件的摘要 JSON，其余请求（目录摘要、最终总结）返回一段文本；
+    truncate 为 True 时批量摘要的 JSON 只返回前 60%
+    """
+    files = FILE_MARK_PATTERN.findall(prompt)
+    filler = "该文件实现了相关功能。" * (options.summary_chars // 10 + 1)
+    if files:
+        summaries = {f: {"functions": [], "summary": f"{f}：{filler[:options.summary_chars]}"} for f in files}
+        answer = json.dumps(summaries, ensure_ascii=False)
+        if truncate:
+            answer = answer[:int(len(answer) * 0.6)]
+        return "```json\n" + answer + "\n```"
+    return "# 项目总结\n" + filler[:options.summary_chars * 4]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = MockOptions()
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, data, extra_headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Trace-ID", f"mock-{time.monotonic_ns()}")
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_event(self, payload):
+        self._send_chunk(("data: " + json.dumps(payload, ensure_ascii=False) + "\n\n").encode("utf-8"))
+
+    def do_POST(self):
+        options = self.options
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+        with options.lock:
+            options.stats["requests"] += 1
+            failed = options.random.random() < options.error_rate
+            if failed:
+                options.stats["errors"] += 1
+            truncate = options.random.random() < options.truncate_rate
+        if failed:
+            headers = {"Retry-After": str(options.retry_after)} if options.error_status == 429 else None
+            self._send_json(options.error_status, {"error": {"message": "mock error"}}, headers)
+            return
+
+        prompt = "".join(m.get("content", "") for m in request.get("messages", []))
+        answer = build_answer(prompt, options, truncate)
+        if truncate and FILE_MARK_PATTERN.search(prompt):
+            with options.lock:
+                options.stats["truncated"] += 1
+        usage = {
+            "prompt_tokens": int(len(prompt) / options.chars_per_token),
+            "completion_tokens": int((len(answer) + options.reasoning_chars) / options.chars_per_token),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if options.latency:
+            time.sleep(options.latency)
+        if not request.get("stream"):
+            self._send_json(200, {"choices": [{"message": {"content": answer}}], "usage": usage})
+            return
+
+        with options.lock:
+            options.stats["stream"] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Trace-ID", f"mock-{time.monotonic_ns()}")
+        self.end_headers()
+        # 每个事件约 4 个 token，按 tokens_per_second 控制事件间隔
+        step = max(1, int(4 * options.chars_per_token))
+        delay = 4 / options.tokens_per_second if options.tokens_per_second else 0
+        reasoning = "分析文件结构，" * (options.reasoning_chars // 7 + 1)
+        for i in range(0, options.reasoning_chars, step):
+            self._send_event({"choices": [{"delta": {"reasoning": reasoning[i:min(i + step, options.reasoning_chars)]}}]})
+            if delay:
+                time.sleep(delay)
+        for i in range(0, len(answer), step):
+            self._send_event({"choices": [{"delta": {"content": answer[i:i + step]}}]})
+            if delay:
+                time.sleep(delay)
+        self._send_event({"choices": [], "usage": usage})
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端进程结束时会直接断开保持中的连接，不视为错误
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_mock_server(options=None, host="127.0.0.1", port=0):
+    """在后台线程中启动模拟服务，返回 (server, base_url)；port 为 0 时自动选择端口，结束时调用 server.shutdown()"""
+    handler = type("BoundMockHandler", (MockHandler,), {"options": options or MockOptions()})
+    server = MockServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 OpenAI 兼容的 /chat/completions 服务（支持 SSE 流式返回）")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口 (默认: 8765)")
+    parser.add_argument("--latency", type=float, default=0.2, help="首个 token 前的等待秒数 (默认: 0.2)")
+    parser.add_argument("--tokens_per_second", type=float, default=0, help="正文输出速率，0 表示不限速")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="请求失败概率 (默认: 0)")
+    parser.add_argument("--error_status", type=int, default=429, help="失败时返回的状态码 (默认: 429)")
+    parser.add_argument("--reasoning_chars", type=int, default=0, help="思考过程字符数 (默认: 0)")
+    parser.add_argument("--truncate_rate", type=float, default=0.0, help="批量摘要回答被截断的概率 (默认: 0)")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    args = parser.parse_args()
+
+    options = MockOptions(latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+                          error_status=args.error_status, reasoning_chars=args.reasoning_chars,
+                          truncate_rate=args.truncate_rate, seed=args.seed)
+    server, url = start_mock_server(options, port=args.port)
+    print(f"模拟服务已启动：{url}（config.ini 中将 url 设置为该地址）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import platform
+import subprocess
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, CODE_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+SCENARIOS = ("scan", "plan", "e2e", "e2e_stream")
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）；每个场景在独立子进程中运行，互不影响"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def load_bench_summarizer_config(overrides=None):
+    """基准使用仓库自带的总结配置，关闭摘要缓存与指标文件输出，保证每次都真正调用（模拟）模型"""
+    with open(os.path.join(CODE_ROOT, "codesense_summarizer_config.json"), "r", encoding="utf-8") as f:
+        conf = json.load(f)
+    conf["summary_cache"] = {"enabled": False}
+    conf["metrics"] = {"enabled": False}
+    conf.update(overrides or {})
+    return conf
+
+
+def bench_scan(repo, files):
+    from codesense_scanner import ScanEngine, load_scan_config
+    from codesense_scan_model import ScanModel
+    config = load_scan_config(repo)
+    start = time.perf_counter()
+    structure = ScanEngine(config).scan(repo)
+    cold = time.perf_counter() - start
+    previous = ScanModel({"structure": structure}).files
+    start = time.perf_counter()
+    ScanEngine(config, previous=previous).scan(repo)
+    warm = time.perf_counter() - start
+    return {"seconds": cold, "files_per_second": files / cold, "incremental_seconds": warm,
+            "incremental_files_per_second": files / warm}
+
+
+def bench_plan(repo, files):
+    from codesense_scanner import ScanEngine, load_scan_config
+    from codesense_scan_model import ScanModel
+    from codesense_batch_planner import build_plan_from_config
+    structure = ScanEngine(load_scan_config(repo)).scan(repo)
+    model = ScanModel({"structure": structure})
+    conf = load_bench_summarizer_config()
+    prompt = conf["scenarios"]["direct"]["batch_summary_prompt"]
+    start = time.perf_counter()
+    pending = model.collect_pending_files()
+    plan = build_plan_from_config(pending, lambda fp: model.get_char_count(fp, repo), conf, prompt, repo)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "files_per_second": len(pending) / seconds if seconds else None,
+            "pending_files": len(pending), "batches": len(plan.batches), "tokens": plan.total_tokens}
+
+
+def bench_e2e(repo, files, api_url, stream, summarizer_overrides=None):
+    import model_api_client
+    import codesense_pipeline
+    from codesense_metrics import get_metrics
+    from codesense_scan_model import ScanModel
+    from codesense_progress_journal import load_scan_json_with_journal
+    model_api_client.configure_model_api(api_key="bench", api_url=api_url, display_llm=False,
+                                         model_name="mock", is_inference_model="false")
+    conf = load_bench_summarizer_config(summarizer_overrides)
+    project = f"bench_{files}_{'stream' if stream else 'e2e'}"
+    output_dir = os.path.join(CODE_ROOT, "scan_results", project)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    try:
+        # 模型客户端会在终端打印 Trace ID 与推理过程，基准运行时丢弃
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            codesense_pipeline.run(repo, project, summarizer_config=conf, stream=stream)
+            seconds = time.perf_counter() - start
+        data = load_scan_json_with_journal(os.path.join(output_dir, "project_structure.json"))
+        summarized = sum(1 for node in ScanModel(data).iter_files() if node.get("summaries"))
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    metrics = get_metrics().to_dict()
+    result = {"seconds": seconds, "files_per_second": summarized / seconds, "summarized_files": summarized,
+              "files_per_minute": summarized / seconds * 60}
+    for h in metrics["histograms"]:
+        if h["name"] == "model_call_seconds" and h["labels"].get("outcome") == "ok":
+            result["model_calls"] = h["count"]
+            result["model_call_p50"] = h["p50"]
+        elif h["name"] == "model_ttft_seconds":
+            result["ttft_p50"] = h["p50"]
+        elif h["name"] == "stage_seconds":
+            result[f"stage_{h['labels']['stage']}_seconds"] = h["sum"]
+    # 重试整批与只重新请求缺失文件的次数（配合 --error_rate / --truncate_rate 观察）
+    for c in metrics["counters"]:
+        if c["name"] in ("scheduler_retries_total", "batch_requeued_files_total", "batch_parse_errors_total"):
+            key = c["name"][:-len("_total")]
+            result[key] = result.get(key, 0) + c["value"]
+    return result
+
+
+def run_child(args):
+    """子进程入口：运行单个场景，最后一行输出 JSON 结果"""
+    overrides = json.loads(args.summarizer_overrides) if args.summarizer_overrides else None
+    if args.child == "scan":
+        result = bench_scan(args.repo, args.files)
+    elif args.child == "plan":
+        result = bench_plan(args.repo, args.files)
+    else:
+        result = bench_e2e(args.repo, args.files, args.api_url, args.child == "e2e_stream", overrides)
+    result.update(scenario=args.child, files=args.files, peak_rss_mb=peak_rss_mb())
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CODE_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=CODE_ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def prepare_repo(workdir, files, seed):
+    """生成（或复用已生成的）合成仓库，目录名包含文件数与种子"""
+    from synthetic_repo import generate_repo
+    repo = os.path.join(workdir, f"repo_{files}_{seed}")
+    marker = os.path.join(workdir, f"repo_{files}_{seed}.done")
+    if not os.path.exists(marker):
+        shutil.rmtree(repo, ignore_errors=True)
+        start = time.perf_counter()
+        generate_repo(repo, files, seed=seed)
+        open(marker, "w").close()
+        print(f"生成 {files} 个文件的合成仓库，耗时 {time.perf_counter() - start:.1f} s")
+    return repo
+
+
+def print_results(results, baseline=None):
+    base = {(r["scenario"], r["files"]): r for r in (baseline or {}).get("results", [])}
+    header = f"{'场景':<12}{'文件数':>9}{'耗时(s)':>11}{'文件/秒':>12}{'峰值内存(MB)':>14}"
+    if base:
+        header += f"{'基线耗时(s)':>13}{'变化':>9}"
+    print(header)
+    for r in results:
+        fps = r.get("files_per_second")
+        line = (f"{r['scenario']:<12}{r['files']:>9}{r['seconds']:>11.3f}"
+                f"{(f'{fps:.1f}' if fps else '-'):>12}{r['peak_rss_mb']:>14.1f}")
+        old = base.get((r["scenario"], r["files"]))
+        if old:
+            change = (r["seconds"] - old["seconds"]) / old["seconds"] * 100 if old["seconds"] else 0
+            line += f"{old['seconds']:>13.3f}{change:>+8.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeSense 离线基准：合成仓库 + 本地模拟模型服务，结果保存为 JSON 便于跨提交对比")
+    parser.add_argument("--sizes", type=str, default="1000,10000", help="合成仓库文件数，逗号分隔 (默认: 1000,10000；可加 100000)")
+    parser.add_argument("--scenarios", type=str, default=",".join(SCENARIOS), help=f"运行的场景 (默认: {','.join(SCENARIOS)})")
+    parser.add_argument("--workdir", type=str, default=os.path.join(BENCH_DIR, ".work"), help="合成仓库存放目录（重复运行时复用）")
+    parser.add_argument("--output_dir", type=str, default=os.path.join(BENCH_DIR, "results"), help="结果保存目录")
+    parser.add_argument("--compare", type=str, default=None, help="与之前保存的结果文件对比")
+    parser.add_argument("--seed", type=int, default=0, help="合成仓库随机种子 (默认: 0)")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务首个 token 延迟 (默认: 0.05 s)")
+    parser.add_argument("--tokens_per_second", type=float, default=0, help="模拟服务输出速率，0 表示不限速")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="模拟服务失败概率 (默认: 0)")
+    parser.add_argument("--reasoning_chars", type=int, default=0, help="模拟服务思考过程字符数 (默认: 0)")
+    parser.add_argument("--truncate_rate", type=float, default=0.0, help="模拟服务截断批量摘要回答的概率 (默认: 0)")
+    parser.add_argument("--summarizer_overrides", type=str, default=None,
+                        help='覆盖总结配置的 JSON，例如 \'{"max_concurrent_requests": 8, "async_requests": true}\'')
+    parser.add_argument("--child", type=str, choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--repo", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--files", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--api_url", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    from mock_llm_server import MockOptions, start_mock_server
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知的场景：{', '.join(sorted(unknown))}")
+    options = MockOptions(latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+                          reasoning_chars=args.reasoning_chars, truncate_rate=args.truncate_rate, seed=args.seed)
+    server, api_url = start_mock_server(options)
+    os.makedirs(args.workdir, exist_ok=True)
+
+    results = []
+    try:
+        for files in sizes:
+            repo = prepare_repo(args.workdir, files, args.seed)
+            for scenario in scenarios:
+                cmd = [sys.executable, os.path.abspath(__file__), "--child", scenario, "--repo", repo,
+                       "--files", str(files), "--api_url", api_url]
+                if args.summarizer_overrides:
+                    cmd += ["--summarizer_overrides", args.summarizer_overrides]
+                proc = subprocess.run(cmd, capture_output=True, text=True, cwd=CODE_ROOT)
+                lines = [l for l in proc.stdout.splitlines() if l.startswith(RESULT_PREFIX)]
+                if proc.returncode != 0 or not lines:
+                    print(f"场景 {scenario}（{files} 个文件）失败：\n{proc.stderr[-2000:]}")
+                    continue
+                result = json.loads(lines[-1][len(RESULT_PREFIX):])
+                results.append(result)
+                print(f"{scenario:<12}{files:>9} 个文件：{result['seconds']:.3f} s，峰值内存 {result['peak_rss_mb']} MB")
+    finally:
+        server.shutdown()
+
+    commit, dirty = git_revision()
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "mock_server": options.to_dict(),
+        "summarizer_overrides": json.loads(args.summarizer_overrides) if args.summarizer_overrides else None,
+        "results": results,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    name = f"bench_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'nogit'}{'_dirty' if dirty else ''}.json"
+    report_path = os.path.join(args.output_dir, name)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n对比基线：{args.compare}（提交 {baseline.get('commit')}）")
+    print()
+    print_results(results, baseline)
+    print(f"\n结果已保存至 {report_path}")
+    if len(results) < len(sizes) * len(scenarios):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
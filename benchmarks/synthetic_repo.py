@@ -0,0 +1,109 @@
+import os
+import random
+import argparse
+
+PY_TEMPLATE = '''import os
+
+
+class {cls}:
+    """{cls} 的示例实现"""
+
+    def __init__(self, value={n}):
+        self.value = value
+
+{methods}
+
+def {func}(items):
+    """处理 items 并返回结果"""
+    result = []
+    for item in items:
+        if item % {mod} == 0:
+            result.append(item * {n})
+    return result
+'''
+
+PY_METHOD = '''    def method_{i}(self, x):
+        total = self.value + x * {i}
+        for k in range({i}):
+            total += k
+        return total
+'''
+
+JS_TEMPLATE = '''export function {func}(items) {{
+  return items.filter((x) => x % {mod} === 0).map((x) => x * {n});
+}}
+
+export class {cls} {{
+  constructor(value = {n}) {{
+    this.value = value;
+  }}
+{methods}}}
+'''
+
+JS_METHOD = '''  method{i}(x) {{
+    return this.value + x * {i};
+  }}
+'''
+
+# (扩展名, 权重)；少量 Markdown 与二进制文件用于覆盖扫描器的分类逻辑
+FILE_KINDS = [(".py", 60), (".js", 25), (".md", 5), (".json", 5), (".png", 5)]
+
+
+def _render(kind, rng, index):
+    n = rng.randint(1, 500)
+    methods = rng.randint(1, 20)
+    names = {"cls": f"Widget{index}", "func": f"process_{index}", "n": n, "mod": rng.randint(2, 9)}
+    if kind == ".py":
+        body = "\n".join(PY_METHOD.format(i=i) for i in range(methods))
+        return PY_TEMPLATE.format(methods=body, **names).encode("utf-8")
+    if kind == ".js":
+        body = "\n".join(JS_METHOD.format(i=i) for i in range(methods))
+        return JS_TEMPLATE.format(methods=body, **names).encode("utf-8")
+    if kind == ".md":
+        return f"# 模块 {index}\n\n本目录包含示例代码，共 {n} 个条目。\n".encode("utf-8")
+    if kind == ".json":
+        return ("{" + ", ".join(f'"key{i}": {i * n}' for i in range(methods)) + "}\n").encode("utf-8")
+    return b"\x89PNG\r\n\x1a\n" + bytes(rng.getrandbits(8) for _ in range(64))
+
+
+def generate_repo(root, n_files, files_per_dir=40, dirs_per_dir=6, seed=0):
+    """
+    在 root 下生成 n_files 个文件的合成仓库：目录按广度优先展开，每个目录最多 files_per_dir 个文件、
+    dirs_per_dir 个子目录；文件类型按 FILE_KINDS 权重抽取，内容为可解析的 Python / JS 代码。
+    相同参数与 seed 生成的内容完全一致。返回生成的文件数。
+    """
+    rng = random.Random(seed)
+    kinds = [k for k, w in FILE_KINDS for _ in range(w)]
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "README.md"), "w", encoding="utf-8") as f:
+        f.write(f"# Synthetic\n\n合成基准仓库，共 {n_files} 个文件。\n")
+    created = 1
+    queue = [root]
+    head = 0
+    while created < n_files:
+        directory = queue[head]
+        head += 1
+        for i in range(min(files_per_dir, n_files - created)):
+            kind = rng.choice(kinds)
+            with open(os.path.join(directory, f"m{created}{kind}"), "wb") as f:
+                f.write(_render(kind, rng, created))
+            created += 1
+        for d in range(dirs_per_dir):
+            sub = os.path.join(directory, f"pkg{d}")
+            os.makedirs(sub, exist_ok=True)
+            queue.append(sub)
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成用于基准测试的合成代码仓库")
+    parser.add_argument("root", type=str, help="输出目录")
+    parser.add_argument("--files", type=int, default=1000, help="文件数量 (默认: 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子 (默认: 0)")
+    args = parser.parse_args()
+    count = generate_repo(args.root, args.files, seed=args.seed)
+    print(f"已在 {args.root} 生成 {count} 个文件")
+
+
+if __name__ == "__main__":
+    main()
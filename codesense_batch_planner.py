@@ -0,0 +1,422 @@
+import os
+import re
+import json
+import math
+import time
+import argparse
+
+# 每个文件在批量提示词中的包装格式，与 summarize_files_batch 保持一致
+FILE_WRAPPER = "【文件路径：{path}】\n【开始】\n\n【结束】\n===FILE_SEPARATOR===\n"
+
+# 超长文件按函数 / 类边界切分时识别的顶层定义行（行首无缩进）
+BOUNDARY_PATTERN = re.compile(
+    r"^(?:async\s+def|def|class|function|export|func|fn|impl|struct|interface|enum|type|module|package|"
+    r"public|private|protected|static|template|namespace)\b|^@"
+)
+
+# 分块文件的标签格式：<相对路径>#L<起始行>-<结束行>
+CHUNK_LABEL_PATTERN = re.compile(r"^(.*)#L(\d+)-(\d+)$")
+
+
+class CharRatioTokenizer:
+    """按固定 字符/token 比例估算 token 数的启发式分词器"""
+
+    name = "chars"
+
+    def __init__(self, chars_per_token=3.5):
+        self.chars_per_token = chars_per_token
+
+    def estimate(self, char_count):
+        """仅根据字符数估算 token 数（扫描结果中只有字符数时使用）"""
+        return int(math.ceil((char_count or 0) / self.chars_per_token))
+
+    def count_text(self, text):
+        return self.estimate(len(text))
+
+
+class MixedScriptTokenizer(CharRatioTokenizer):
+    """
+    区分 ASCII 与非 ASCII 字符的启发式分词器：
+    代码与英文约 chars_per_token 个字符一个 token，中文等非 ASCII 字符按 non_ascii_weight 个 token 计。
+    """
+
+    name = "mixed"
+
+    def __init__(self, chars_per_token=3.5, non_ascii_weight=1.0):
+        super().__init__(chars_per_token)
+        self.non_ascii_weight = non_ascii_weight
+
+    def count_text(self, text):
+        if text.isascii():
+            return self.estimate(len(text))
+        non_ascii = sum(1 for ch in text if ord(ch) > 127)
+        ascii_count = len(text) - non_ascii
+        return int(math.ceil(ascii_count / self.chars_per_token + non_ascii * self.non_ascii_weight))
+
+
+class TiktokenTokenizer(CharRatioTokenizer):
+    """使用 tiktoken 精确计数（需安装 tiktoken）；仅有字符数时仍按比例估算"""
+
+    name = "tiktoken"
+
+    def __init__(self, encoding="cl100k_base", chars_per_token=3.5):
+        super().__init__(chars_per_token)
+        import tiktoken
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def count_text(self, text):
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+TOKENIZERS = {
+    CharRatioTokenizer.name: CharRatioTokenizer,
+    MixedScriptTokenizer.name: MixedScriptTokenizer,
+    TiktokenTokenizer.name: TiktokenTokenizer,
+}
+
+
+def get_tokenizer(name="chars", **options):
+    """按名称创建分词器；可通过 TOKENIZERS 注册自定义实现"""
+    if name not in TOKENIZERS:
+        raise ValueError(f"未知的分词器：{name}，可选：{', '.join(TOKENIZERS)}")
+    return TOKENIZERS[name](**options)
+
+
+def make_chunk_label(path, start_line, end_line):
+    return f"{path}#L{start_line}-{end_line}"
+
+
+def parse_chunk_label(label):
+    """解析分块标签，返回 (相对路径, 起始行, 结束行)；不是分块标签时返回 None"""
+    m = CHUNK_LABEL_PATTERN.match(label)
+    if not m:
+        return None
+    return m.group(1), int(m.group(2)), int(m.group(3))
+
+
+def read_chunk_content(abs_path, start_line, end_line):
+    """读取文件中 [start_line, end_line] 行（从 1 开始，含两端）的内容"""
+    with open(abs_path, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    return "\n".join(lines[start_line - 1:end_line])
+
+
+def chunk_file(abs_path, token_budget, tokenizer):
+    """
+    将超过 token_budget 的文件按顶层函数 / 类定义边界切分为若干块，返回 [(起始行, 结束行, token 数)]。
+    单个定义仍超过预算时按行硬切分。读取失败时返回空列表。
+    """
+    try:
+        with open(abs_path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+    except Exception:
+        return []
+    line_tokens = [tokenizer.count_text(line + "\n") for line in lines]
+
+    # 按边界划分段落：[start, end) 为 0 起始的行区间
+    boundaries = [0] + [i for i in range(1, len(lines)) if BOUNDARY_PATTERN.match(lines[i])]
+    boundaries.append(len(lines))
+    segments = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        seg_tokens = sum(line_tokens[start:end])
+        if seg_tokens <= token_budget:
+            segments.append((start, end, seg_tokens))
+            continue
+        # 单个段落超出预算，按行硬切分
+        cur_start, cur_tokens = start, 0
+        for i in range(start, end):
+            if cur_tokens and cur_tokens + line_tokens[i] > token_budget:
+                segments.append((cur_start, i, cur_tokens))
+                cur_start, cur_tokens = i, 0
+            cur_tokens += line_tokens[i]
+        segments.append((cur_start, end, cur_tokens))
+
+    # 将相邻段落贪心合并为不超过预算的块，保持代码顺序
+    chunks = []
+    cur_start, cur_end, cur_tokens = None, None, 0
+    for start, end, tokens in segments:
+        if cur_start is not None and cur_tokens + tokens > token_budget:
+            chunks.append((cur_start + 1, cur_end, cur_tokens))
+            cur_start, cur_tokens = None, 0
+        if cur_start is None:
+            cur_start = start
+        cur_end = end
+        cur_tokens += tokens
+    if cur_start is not None:
+        chunks.append((cur_start + 1, cur_end, cur_tokens))
+    return chunks
+
+
+def merge_chunk_summaries(parts):
+    """将同一文件各分块的摘要合并为一个文件摘要（函数列表拼接，摘要文本按顺序连接）"""
+    if all(isinstance(p, dict) for p in parts):
+        merged = {"functions": [], "summary": ""}
+        texts = []
+        for p in parts:
+            merged["functions"].extend(p.get("functions", []) or [])
+            if p.get("summary"):
+                texts.append(str(p["summary"]))
+        merged["summary"] = "\n".join(texts)
+        return merged
+    return "\n".join(p if isinstance(p, str) else json.dumps(p, ensure_ascii=False) for p in parts)
+
+
+class _FirstFitTree:
+    """维护各箱剩余容量最大值的线段树，O(log n) 找到最左侧可容纳的箱子（First-Fit）"""
+
+    def __init__(self, n, capacity):
+        self.size = 1
+        while self.size < max(n, 1):
+            self.size *= 2
+        self.tree = [capacity] * (2 * self.size)
+
+    def find(self, need):
+        if self.tree[1] < need:
+            return -1
+        i = 1
+        while i < self.size:
+            i = 2 * i if self.tree[2 * i] >= need else 2 * i + 1
+        return i - self.size
+
+    def update(self, idx, value):
+        i = idx + self.size
+        self.tree[i] = value
+        i //= 2
+        while i:
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+            i //= 2
+
+
+class BatchPlan:
+    """批次划分结果：batches 为标签列表的列表，chunked 记录被切分文件的分块标签"""
+
+    def __init__(self, token_budget):
+        self.token_budget = token_budget
+        self.batches = []
+        self.batch_tokens = []
+        self.chunked = {}
+        self.unreadable = []
+
+    @property
+    def total_tokens(self):
+        return sum(self.batch_tokens)
+
+    def summary_lines(self):
+        n = len(self.batches)
+        lines = [
+            f"预计调用次数：{n}",
+            f"预计输入 token 总数：{self.total_tokens}（单批预算 {self.token_budget}）",
+        ]
+        if n:
+            fill = self.total_tokens / (n * self.token_budget) * 100 if self.token_budget else 0
+            lines.append(f"平均每批文件数：{sum(len(b) for b in self.batches) / n:.1f}，平均填充率：{fill:.1f}%")
+        if self.chunked:
+            lines.append(f"超长文件按函数/类边界切分：{len(self.chunked)} 个文件，"
+                         f"共 {sum(len(v) for v in self.chunked.values())} 块")
+        return lines
+
+
+def plan_batches(pending_files, get_file_char_count, token_budget, tokenizer, project_path=None, keep_locality=True):
+    """
+    将待处理文件划分为批次：
+      1. 用 tokenizer 按字符数估算每个文件的 token 数（含文件包装开销）
+      2. 超出单批预算的文件在 project_path 下读取内容，按函数 / 类边界切分为多个块
+      3. 按 token 数从大到小做 First-Fit-Decreasing 装箱；keep_locality 为 True 时优先放入
+         同目录文件最近所在的批次，使同一目录的文件尽量在一起
+      4. 批次内按原始顺序（树的先序）排列
+    返回 BatchPlan。
+    """
+    plan = BatchPlan(token_budget)
+    items = []  # (token 数, 原始顺序, 标签, 目录)
+    order = 0
+    for fp in pending_files:
+        overhead = tokenizer.count_text(FILE_WRAPPER.format(path=fp))
+        tokens = tokenizer.estimate(get_file_char_count(fp)) + overhead
+        directory = os.path.dirname(fp)
+        if tokens > token_budget and project_path is not None:
+            chunks = chunk_file(os.path.join(project_path, fp), max(1, token_budget - overhead), tokenizer)
+            if len(chunks) > 1:
+                labels = []
+                for start, end, chunk_tokens in chunks:
+                    label = make_chunk_label(fp, start, end)
+                    labels.append(label)
+                    items.append((min(chunk_tokens + overhead, token_budget), order, label, directory))
+                    order += 1
+                plan.chunked[fp] = labels
+                continue
+            if not chunks:
+                plan.unreadable.append(fp)
+        items.append((min(tokens, token_budget), order, fp, directory))
+        order += 1
+
+    items.sort(key=lambda x: (-x[0], x[1]))
+    tree = _FirstFitTree(len(items), token_budget)
+    bins = []
+    remaining = []
+    last_bin_of_dir = {}
+    for tokens, idx, label, directory in items:
+        target = -1
+        if keep_locality:
+            candidate = last_bin_of_dir.get(directory)
+            if candidate is not None and remaining[candidate] >= tokens:
+                target = candidate
+        if target == -1:
+            target = tree.find(tokens)
+        if target >= len(bins):
+            bins.append([])
+            remaining.append(token_budget)
+        bins[target].append((idx, label))
+        remaining[target] -= tokens
+        tree.update(target, remaining[target])
+        last_bin_of_dir[directory] = target
+
+    for b, rest in zip(bins, remaining):
+        b.sort()
+        plan.batches.append([label for _, label in b])
+        plan.batch_tokens.append(token_budget - rest)
+    return plan
+
+
+class StreamingBatcher:
+    """
+    边扫描边装箱的在线批次划分器（扫描与总结重叠执行时使用）：
+      - add() 逐个接收扫描产出的待处理文件，超出预算的文件与 plan_batches 一样按函数 / 类边界切分
+      - 同时保持最多 max_open 个未满的批次，新文件放入第一个放得下的批次（First-Fit）；
+        扫描按目录先序产出文件，同目录文件自然落在同一批次
+      - 批次填充率达到 fill_ratio、打开的批次数超过 max_open 或批次等待超过 max_wait 秒时，
+        立即通过 on_batch(labels, tokens) 交给调度器，不等待扫描结束
+      - finish() 在扫描结束后交出剩余批次
+    plan 记录已交出的批次（BatchPlan），chunked / unreadable 的含义与 plan_batches 相同。
+    """
+
+    def __init__(self, token_budget, tokenizer, on_batch, project_path=None, max_open=4, fill_ratio=0.95,
+                 max_wait=None):
+        self.token_budget = token_budget
+        self.tokenizer = tokenizer
+        self.on_batch = on_batch
+        self.project_path = project_path
+        self.max_open = max(1, max_open)
+        self.fill_ratio = fill_ratio
+        self.max_wait = max_wait
+        self.plan = BatchPlan(token_budget)
+        self._open = []  # [标签列表, 已用 token 数, 创建时间]
+
+    @property
+    def chunked(self):
+        return self.plan.chunked
+
+    def _items(self, fp, char_count):
+        overhead = self.tokenizer.count_text(FILE_WRAPPER.format(path=fp))
+        tokens = self.tokenizer.estimate(char_count) + overhead
+        if tokens > self.token_budget and self.project_path is not None:
+            chunks = chunk_file(os.path.join(self.project_path, fp), max(1, self.token_budget - overhead),
+                                self.tokenizer)
+            if len(chunks) > 1:
+                labels = [make_chunk_label(fp, start, end) for start, end, _ in chunks]
+                self.plan.chunked[fp] = labels
+                return [(label, min(chunk_tokens + overhead, self.token_budget))
+                        for label, (_, _, chunk_tokens) in zip(labels, chunks)]
+            if not chunks:
+                self.plan.unreadable.append(fp)
+        return [(fp, min(tokens, self.token_budget))]
+
+    def _flush(self, index):
+        labels, used, _ = self._open.pop(index)
+        self.plan.batches.append(labels)
+        self.plan.batch_tokens.append(used)
+        self.on_batch(labels, used)
+
+    def add(self, fp, char_count):
+        for label, tokens in self._items(fp, char_count):
+            target = next((i for i, b in enumerate(self._open) if b[1] + tokens <= self.token_budget), None)
+            if target is None:
+                if len(self._open) >= self.max_open:
+                    # 交出最满的批次，为新批次腾出位置
+                    self._flush(max(range(len(self._open)), key=lambda i: self._open[i][1]))
+                self._open.append([[], 0, time.monotonic()])
+                target = len(self._open) - 1
+            batch = self._open[target]
+            batch[0].append(label)
+            batch[1] += tokens
+            if batch[1] >= self.token_budget * self.fill_ratio:
+                self._flush(target)
+        self.flush_expired()
+
+    def flush_expired(self):
+        """交出等待时间超过 max_wait 的未满批次，避免扫描缓慢时模型空闲"""
+        if self.max_wait is None:
+            return
+        now = time.monotonic()
+        for i in range(len(self._open) - 1, -1, -1):
+            if now - self._open[i][2] >= self.max_wait:
+                self._flush(i)
+
+    def finish(self):
+        while self._open:
+            self._flush(0)
+        return self.plan
+
+
+def planner_settings(summarizer_config, prompt_template):
+    """
+    按总结工具配置中的 batch_planner 段返回 (分词器, 单批 token 预算, keep_locality)：
+      - tokenizer / tokenizer_options：分词器名称与参数
+      - batch_token_budget：单批输入 token 预算；未配置时等价于原先 max_context_length / 2 个字符
+      - keep_locality：是否优先保持目录局部性
+    提示词模板本身的 token 数从预算中扣除。
+    """
+    planner_conf = summarizer_config.get("batch_planner", {})
+    tokenizer = get_tokenizer(planner_conf.get("tokenizer", "chars"), **planner_conf.get("tokenizer_options", {}))
+    max_context = summarizer_config.get("max_context_length", 100000)
+    budget = planner_conf.get("batch_token_budget") or tokenizer.estimate(max_context / 2)
+    budget = max(1, int(budget - tokenizer.count_text(prompt_template.replace("{batch_content}", ""))))
+    return tokenizer, budget, planner_conf.get("keep_locality", True)
+
+
+def build_plan_from_config(pending_files, get_file_char_count, summarizer_config, prompt_template, project_path=None):
+    """按总结工具配置划分批次（参数含义见 planner_settings）"""
+    tokenizer, budget, keep_locality = planner_settings(summarizer_config, prompt_template)
+    return plan_batches(pending_files, get_file_char_count, budget, tokenizer, project_path,
+                        keep_locality=keep_locality)
+
+
+def build_streaming_batcher(summarizer_config, prompt_template, on_batch, project_path=None):
+    """按总结工具配置的 batch_planner 与 streaming 段创建 StreamingBatcher"""
+    tokenizer, budget, _ = planner_settings(summarizer_config, prompt_template)
+    conf = summarizer_config.get("streaming", {}) or {}
+    return StreamingBatcher(budget, tokenizer, on_batch, project_path,
+                            max_open=conf.get("max_open_batches", 4),
+                            fill_ratio=conf.get("fill_ratio", 0.95),
+                            max_wait=conf.get("max_batch_wait"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeSense 批次划分预演：输出预计调用次数与 token 数，不调用大模型")
+    parser.add_argument("--scan_json", type=str, required=True, help="扫描结果文件路径（JSON 或 .cstore）")
+    parser.add_argument("--project_path", type=str, default=None, help="项目根目录（用于切分超长文件）")
+    parser.add_argument("--summarizer_config", type=str, default="codesense_summarizer_config.json",
+                        help="总结工具配置文件路径")
+    parser.add_argument("--scenario", type=str, default="direct", help="总结场景（决定批量提示词模板）")
+    args = parser.parse_args()
+
+    from codesense_scan_model import ScanModel
+    from codesense_scan_store import ScanStore, is_scan_store
+    from codesense_progress_journal import journal_path_for, load_scan_json_with_journal
+    if is_scan_store(args.scan_json) and not os.path.exists(journal_path_for(args.scan_json)):
+        # 二进制存储按需读取，只访问待处理文件的标志与字符数列，无需加载整个扫描结果
+        scan_model = ScanStore(args.scan_json)
+    else:
+        scan_model = ScanModel(load_scan_json_with_journal(args.scan_json))
+    with open(args.summarizer_config, "r", encoding="utf-8") as f:
+        summarizer_config = json.load(f)
+    template = summarizer_config.get("scenarios", {}).get(args.scenario, {}).get("batch_summary_prompt", "")
+    pending = scan_model.collect_pending_files()
+    plan = build_plan_from_config(pending, lambda fp: scan_model.get_char_count(fp, args.project_path),
+                                  summarizer_config, template, args.project_path)
+    print(f"待处理文件数量：{len(pending)}")
+    for line in plan.summary_lines():
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
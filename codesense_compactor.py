@@ -0,0 +1,366 @@
+import os
+import re
+import ast
+import threading
+
+from codesense_metrics import get_metrics
+
+# 压缩模式：none 原样发送；light 去掉许可证头并压缩空白；skeleton 在 light 基础上只保留代码骨架
+COMPACTION_MODES = ("none", "light", "skeleton")
+
+LICENSE_PATTERN = re.compile(
+    r"licen[cs]e|copyright|spdx-license-identifier|permission is hereby granted|all rights reserved|"
+    r"版权所有|许可证", re.IGNORECASE)
+COMMENT_LINE_PATTERN = re.compile(r"^\s*(#|//|/\*|\*|\*/|--|;|<!--|-->)")
+# 花括号语言中，以这些关键字开头的块是"容器"（类、命名空间等），其中的成员签名继续保留
+CONTAINER_PATTERN = re.compile(
+    r"\b(class|interface|struct|namespace|enum|impl|trait|object|module|extension|protocol|record|package)\b|"
+    r"extern\s+\"C\"|@interface|@implementation")
+# 去掉字符串与注释后再数花括号
+STRIP_PATTERN = re.compile(
+    r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`|//.*|/\*.*?\*/")
+RUBY_BLOCK_PATTERN = re.compile(r"^(\s*)(def|class|module)\b")
+
+
+def strip_license_header(text):
+    """去掉文件开头（shebang / 编码声明之后）包含许可证或版权声明的连续注释块"""
+    lines = text.split("\n")
+    i = 0
+    while i < len(lines) and (lines[i].startswith("#!") or "coding" in lines[i][:40] and lines[i].startswith("#")):
+        i += 1
+    start = i
+    in_block = False
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+        if in_block:
+            if "*/" in stripped:
+                in_block = False
+            i += 1
+            continue
+        if not stripped:
+            i += 1
+            continue
+        if not COMMENT_LINE_PATTERN.match(line):
+            break
+        if stripped.startswith("/*") and "*/" not in stripped[2:]:
+            in_block = True
+        i += 1
+    header = "\n".join(lines[start:i])
+    if i == start or not LICENSE_PATTERN.search(header):
+        return text
+    return "\n".join(lines[:start] + lines[i:])
+
+
+def collapse_whitespace(text):
+    """去掉行尾空白，连续空行只保留一个"""
+    out = []
+    blank = False
+    for line in text.split("\n"):
+        line = line.rstrip()
+        if not line:
+            if blank or not out:
+                continue
+            blank = True
+        else:
+            blank = False
+        out.append(line)
+    return "\n".join(out).strip("\n")
+
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def python_skeleton(source, body_lines=2, doc_chars=300):
+    """
+    用 ast 生成 Python 代码骨架：保留 import、类与函数签名（含装饰器）、文档字符串的第一段（最多 doc_chars 字符），
+    函数体只保留前 body_lines 行代码，其余以注释标注省略行数；模块级其他语句只保留前 body_lines 行。
+    语法错误时抛出 SyntaxError。
+    """
+    tree = ast.parse(source)
+    lines = source.split("\n")
+    out = []
+
+    def segment(start, end):
+        return lines[start - 1:end]
+
+    def emit_docstring(node, indent):
+        doc = ast.get_docstring(node)
+        if doc and doc_chars > 0:
+            # 只保留第一段
+            doc = _truncate(doc.split("\n\n")[0], doc_chars).replace("\n", "\n" + indent)
+            out.append(f'{indent}"""{doc}"""')
+
+    def emit_truncated(stmts, end_lineno, indent):
+        if not stmts:
+            return
+        # 保留的行中不计空行与注释行
+        body = [l for l in segment(stmts[0].lineno, end_lineno) if l.strip() and not l.lstrip().startswith("#")]
+        out.extend(body[:body_lines])
+        if len(body) > body_lines:
+            out.append(f"{indent}# ...（省略 {len(body) - body_lines} 行）")
+
+    def without_docstring(node):
+        body = node.body
+        if ast.get_docstring(node) is not None:
+            body = body[1:]
+        return body
+
+    def visit(body):
+        for stmt in body:
+            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([d.lineno for d in stmt.decorator_list] + [stmt.lineno])
+                first = stmt.body[0]
+                if first.lineno == stmt.lineno:
+                    # 单行定义（def f(): return 1）
+                    out.extend(segment(start, stmt.end_lineno))
+                    continue
+                out.extend(segment(start, first.lineno - 1))
+                indent = " " * first.col_offset
+                emit_docstring(stmt, indent)
+                rest = without_docstring(stmt)
+                if isinstance(stmt, ast.ClassDef):
+                    visit(rest)
+                else:
+                    emit_truncated(rest, stmt.end_lineno, indent)
+            elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+                out.extend(segment(stmt.lineno, stmt.end_lineno))
+            else:
+                emit_truncated([stmt], stmt.end_lineno, " " * stmt.col_offset)
+
+    emit_docstring(tree, "")
+    visit(without_docstring(tree))
+    return "\n".join(out)
+
+
+def brace_skeleton(source, body_lines=2, doc_lines=5):
+    """
+    花括号语言（JS/TS/Go/Java/C/C++/C#/PHP/Swift/Kotlin/Scala/R/Objective-C）的轻量骨架：
+    逐行去掉字符串与注释后数花括号；类、接口、命名空间等容器块内的成员签名保留，
+    函数体等其他块只保留前 body_lines 行与结束行；块外的连续注释最多保留 doc_lines 行。
+    """
+    out = []
+    stack = []
+    body_start = None
+    kept = omitted = 0
+    in_comment = False
+    comment_run = 0
+    for line in source.split("\n"):
+        code = line
+        if in_comment:
+            end = code.find("*/")
+            if end < 0:
+                code = ""
+            else:
+                code = code[end + 2:]
+                in_comment = False
+        code = STRIP_PATTERN.sub("", code)
+        start = code.find("/*")
+        if start >= 0:
+            code = code[:start]
+            in_comment = True
+        inside = body_start is not None
+        closed = False
+        for ch in code:
+            if ch == "{":
+                if body_start is None and CONTAINER_PATTERN.search(code):
+                    stack.append("container")
+                else:
+                    if body_start is None:
+                        body_start = len(stack)
+                        kept = omitted = 0
+                    stack.append("body")
+            elif ch == "}" and stack:
+                stack.pop()
+                if body_start is not None and len(stack) <= body_start:
+                    body_start = None
+                    closed = True
+        if not inside:
+            if not code.strip() and line.strip():
+                comment_run += 1
+                if comment_run <= doc_lines:
+                    out.append(line)
+                elif comment_run == doc_lines + 1:
+                    out.append(line[:len(line) - len(line.lstrip())] + "// ...")
+            else:
+                comment_run = 0
+                out.append(line)
+        elif closed:
+            if omitted:
+                indent = line[:len(line) - len(line.lstrip())]
+                out.append(f"{indent}    // ...（省略 {omitted} 行）")
+            out.append(line)
+            comment_run = 0
+            if body_start is not None:
+                # "} else {" 之类同时打开了新的块
+                kept = omitted = 0
+        elif line.strip():
+            if kept < body_lines:
+                out.append(line)
+                kept += 1
+            else:
+                omitted += 1
+    return "\n".join(out)
+
+
+def indent_skeleton(source, body_lines=2, doc_lines=5):
+    """
+    Ruby 等以 def ... end 分块的语言：按缩进识别方法体，只保留前 body_lines 行与 end；
+    方法体外的连续注释（RDoc）最多保留 doc_lines 行
+    """
+    out = []
+    body_indent = None
+    kept = omitted = 0
+    comment_run = 0
+    for line in source.split("\n"):
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip())
+        if body_indent is not None:
+            if stripped == "end" and indent == body_indent:
+                if omitted:
+                    out.append(" " * (body_indent + 2) + f"# ...（省略 {omitted} 行）")
+                out.append(line)
+                body_indent = None
+            elif stripped and not stripped.startswith("#"):
+                if kept < body_lines:
+                    out.append(line)
+                    kept += 1
+                else:
+                    omitted += 1
+            continue
+        if stripped.startswith("#"):
+            comment_run += 1
+            if comment_run <= doc_lines:
+                out.append(line)
+            elif comment_run == doc_lines + 1:
+                out.append(line[:indent] + "# ...")
+            continue
+        comment_run = 0
+        out.append(line)
+        m = RUBY_BLOCK_PATTERN.match(line)
+        if m and m.group(2) == "def" and not stripped.endswith(" end") and "=" not in stripped.split(")")[-1]:
+            body_indent = len(m.group(1))
+            kept = omitted = 0
+    return "\n".join(out)
+
+
+class Compactor:
+    """
+    批量摘要提示词的压缩：按场景配置的模式（light / skeleton）缩减每个文件的内容后再放入提示词，
+    languages 为扫描配置中的 语言 -> 扩展名 映射，用于选择骨架提取方式（python 用 ast，ruby 按缩进，
+    其余按花括号）；解析失败或不支持的语言回退为 light。
+    stats 累计压缩前后的字符数，compression_ratio() 为压缩比（压缩前 / 压缩后）。
+    装箱阶段由 measure() 压缩并暂存结果，构造提示词时 compact() 直接取用，每个文件只解析一次；
+    不会经过 compact() 取用的文件（被切分的超长文件、命中摘要缓存的文件）由 discard() 丢弃暂存结果，
+    阶段结束时 clear() 清空其余暂存结果。
+    """
+
+    def __init__(self, mode="skeleton", languages=None, body_lines=2, doc_chars=300, doc_lines=5,
+                 strip_license=True):
+        if mode not in COMPACTION_MODES:
+            raise ValueError(f"未知的压缩模式：{mode}（可选 {', '.join(COMPACTION_MODES)}）")
+        self.mode = mode
+        self.body_lines = body_lines
+        self.doc_chars = doc_chars
+        self.doc_lines = doc_lines
+        self.strip_license = strip_license
+        if languages is None:
+            from codesense_scanner import DEFAULT_CONFIG
+            languages = DEFAULT_CONFIG["languages"]
+        self.ext_language = {}
+        for lang, exts in languages.items():
+            for ext in exts:
+                self.ext_language.setdefault(ext, lang)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.stats = {"files": 0, "input_chars": 0, "output_chars": 0, "fallback": 0}
+
+    @classmethod
+    def from_config(cls, summarizer_config, scenario):
+        """
+        场景配置中的 "compaction"（none / light / skeleton）决定模式，全局 "compaction" 段给出参数；
+        模式为 none 时返回 None
+        """
+        scenario_conf = summarizer_config.get("scenarios", {}).get(scenario, {})
+        mode = scenario_conf.get("compaction", "none")
+        if mode == "none":
+            return None
+        conf = summarizer_config.get("compaction", {}) or {}
+        return cls(mode, conf.get("languages"), conf.get("body_lines", 2), conf.get("doc_chars", 300),
+                   conf.get("doc_lines", 5), conf.get("strip_license", True))
+
+    @property
+    def cache_tag(self):
+        """摘要缓存键中区分压缩模式与参数的标记"""
+        return f"{self.mode}:{self.body_lines}:{self.doc_chars}:{self.doc_lines}:{int(self.strip_license)}"
+
+    def skeleton(self, rel, text):
+        language = self.ext_language.get(os.path.splitext(rel)[1].lower())
+        if language == "python":
+            return python_skeleton(text, self.body_lines, self.doc_chars)
+        if language == "ruby":
+            return indent_skeleton(text, self.body_lines, self.doc_lines)
+        if language is not None:
+            return brace_skeleton(text, self.body_lines, self.doc_lines)
+        return None
+
+    def measure(self, rel, content):
+        """装箱估算用：返回压缩后的字符数，压缩结果暂存到该文件进入批次时使用"""
+        if not content:
+            return 0
+        text, fallback = self._compact(rel, content, False)
+        with self._lock:
+            self._pending[rel] = (len(content), hash(content), text, fallback)
+        return len(text)
+
+    def compact(self, rel, content, partial=False):
+        """返回压缩后的内容；partial 为 True（超长文件的行区间分块）时只做 light 压缩"""
+        if not content:
+            return content
+        with self._lock:
+            stored = self._pending.pop(rel, None) if not partial else None
+        if stored is not None and stored[:2] == (len(content), hash(content)):
+            text, fallback = stored[2:]
+        else:
+            text, fallback = self._compact(rel, content, partial)
+        with self._lock:
+            self.stats["files"] += 1
+            self.stats["input_chars"] += len(content)
+            self.stats["output_chars"] += len(text)
+            self.stats["fallback"] += fallback
+        metrics = get_metrics()
+        metrics.inc("compaction_chars_total", len(content), stage="input")
+        metrics.inc("compaction_chars_total", len(text), stage="output")
+        return text
+
+    def discard(self, rel):
+        """丢弃 measure() 为该文件暂存的压缩结果"""
+        with self._lock:
+            self._pending.pop(rel, None)
+
+    def clear(self):
+        """丢弃全部暂存的压缩结果（总结阶段结束，或协调者不在本进程构造提示词时）"""
+        with self._lock:
+            self._pending.clear()
+
+    def _compact(self, rel, content, partial):
+        """返回 (压缩后的内容, 是否因解析失败回退为 light)"""
+        text = strip_license_header(content) if self.strip_license else content
+        fallback = False
+        if self.mode == "skeleton" and not partial:
+            try:
+                skeleton = self.skeleton(rel, text)
+            except (SyntaxError, ValueError, RecursionError):
+                skeleton, fallback = None, True
+            if skeleton is not None:
+                text = skeleton
+        return collapse_whitespace(text), fallback
+
+    def compression_ratio(self):
+        return self.stats["input_chars"] / self.stats["output_chars"] if self.stats["output_chars"] else 1.0
+
+    def summary_line(self):
+        s = self.stats
+        return (f"提示词压缩（{self.mode}）：{s['files']} 个文件，{s['input_chars']} -> {s['output_chars']} 字符，"
+                f"压缩比 {self.compression_ratio():.2f}x，{s['fallback']} 个文件解析失败回退为 light")
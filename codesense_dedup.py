@@ -0,0 +1,181 @@
+import os
+import copy
+import hashlib
+import logging
+import threading
+
+from codesense_metrics import get_metrics
+
+_EMPTY_BIN = (1 << 64) - 1
+_MASK64 = (1 << 64) - 1
+
+
+def shingle_hashes(text, k=5):
+    """
+    按空白切分为 token（忽略缩进与换行差异），每连续 k 个 token 为一个 shingle，
+    返回 (shingle 哈希的集合, token 数)
+    """
+    tokens = text.split()
+    if len(tokens) < k:
+        return ({hash(tuple(tokens))} if tokens else set()), len(tokens)
+    return set(map(hash, zip(*(tokens[i:] for i in range(k))))), len(tokens)
+
+
+def minhash_signature(hashes, num_bins=64):
+    """
+    单次置换 MinHash（one permutation hashing）：按哈希值分到 num_bins 个桶，每个桶保留最小值，
+    只需遍历一次 shingle 集合；空桶记为 _EMPTY_BIN。两个签名中对应桶相等的比例估计 Jaccard 相似度。
+    """
+    mins = [_EMPTY_BIN] * num_bins
+    for h in hashes:
+        # 乘法散列打散低位，避免 Python 对小整数 / 元组哈希的规律性影响分桶
+        h = (h * 0x9E3779B97F4A7C15) & _MASK64
+        i = h % num_bins
+        if h < mins[i]:
+            mins[i] = h
+    return mins
+
+
+def estimate_similarity(sig_a, sig_b):
+    same = both_empty = 0
+    for a, b in zip(sig_a, sig_b):
+        if a == b:
+            if a == _EMPTY_BIN:
+                both_empty += 1
+            else:
+                same += 1
+    total = len(sig_a) - both_empty
+    return same / total if total else 0.0
+
+
+def annotate_variant(summary, representative, similarity):
+    """变体文件的摘要：复用代表文件的摘要，并注明"是 X 的变体"与相似度"""
+    if isinstance(summary, dict):
+        annotated = copy.deepcopy(summary)
+        annotated["variant_of"] = representative
+        annotated["similarity"] = round(similarity, 3)
+        return annotated
+    return f"【{representative} 的变体，相似度 {similarity:.2f}】{summary}"
+
+
+class DedupIndex:
+    """
+    待总结文件的去重索引（线程安全，可在扫描过程中在线加入）：
+      - 内容完全相同的文件按内容哈希归为一组
+      - 近似重复的文件用 MinHash 签名做 LSH 分段（bands 段，每段 num_bins / bands 个桶），
+        任一段完全相同即为候选，再用签名估计的相似度不低于 threshold 确认；只在扩展名相同的文件之间比较
+      - 每组只有第一个加入的文件（代表文件）发送给模型，其余为变体，代表文件的摘要完成后由 complete() 分发
+    token 数少于 min_tokens 的文件只做完全重复判断，避免短文件误判。
+    """
+
+    def __init__(self, threshold=0.9, min_tokens=50, num_bins=64, bands=8, max_chars=200000):
+        self.threshold = threshold
+        self.min_tokens = min_tokens
+        self.num_bins = num_bins
+        self.bands = bands
+        self.rows = num_bins // bands
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._buckets = {}
+        self._signatures = {}
+        self._variants = {}
+        self._done = {}
+        self._ready = {}
+        self.stats = {"representatives": 0, "exact": 0, "near": 0}
+
+    @classmethod
+    def from_config(cls, conf):
+        """由总结配置中的 "dedup" 构造；enabled 为 False 时返回 None"""
+        conf = conf or {}
+        if not conf.get("enabled", True):
+            return None
+        return cls(threshold=conf.get("threshold", 0.9), min_tokens=conf.get("min_tokens", 50),
+                   num_bins=conf.get("num_bins", 64), bands=conf.get("bands", 8),
+                   max_chars=conf.get("max_chars", 200000))
+
+    def add(self, rel, content):
+        """
+        加入一个待总结文件，返回 None（rel 作为代表文件，需要发送给模型）或 (代表文件, 相似度)。
+        若代表文件的摘要此时已经完成，变体的摘要可通过 take_ready(rel) 立即取得。
+        """
+        if not content or not content.strip():
+            with self._lock:
+                self.stats["representatives"] += 1
+            return None
+        digest = hashlib.blake2b(content.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        ext = os.path.splitext(rel)[1].lower()
+        signature = None
+        hashes, token_count = shingle_hashes(content[:self.max_chars])
+        if token_count >= self.min_tokens:
+            signature = minhash_signature(hashes, self.num_bins)
+        with self._lock:
+            representative = self._exact.get(digest)
+            similarity = 1.0
+            kind = "exact"
+            if representative is None and signature is not None:
+                representative, similarity = self._find_near(ext, signature)
+                kind = "near"
+            if representative is None:
+                self._exact[digest] = rel
+                if signature is not None:
+                    self._signatures[rel] = signature
+                    for band in range(self.bands):
+                        key = (ext, band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                        self._buckets.setdefault(key, rel)
+                self.stats["representatives"] += 1
+                return None
+            self.stats[kind] += 1
+            if representative in self._done:
+                self._ready[rel] = annotate_variant(self._done[representative], representative, similarity)
+            else:
+                self._variants.setdefault(representative, []).append((rel, similarity))
+        get_metrics().inc("dedup_variants_total", kind=kind)
+        return representative, similarity
+
+    def _find_near(self, ext, signature):
+        best, best_similarity = None, 0.0
+        seen = set()
+        for band in range(self.bands):
+            key = (ext, band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+            candidate = self._buckets.get(key)
+            if candidate is None or candidate in seen:
+                continue
+            seen.add(candidate)
+            similarity = estimate_similarity(signature, self._signatures[candidate])
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        return best, best_similarity
+
+    def take_ready(self, rel):
+        with self._lock:
+            return self._ready.pop(rel, None)
+
+    def complete(self, representative, summary):
+        """代表文件的摘要完成，返回其变体的 [(相对路径, 带标注的摘要)]"""
+        with self._lock:
+            self._done[representative] = summary
+            variants = self._variants.pop(representative, [])
+        return [(rel, annotate_variant(summary, representative, similarity)) for rel, similarity in variants]
+
+    def summary_line(self):
+        return (f"近似重复检测：代表文件 {self.stats['representatives']} 个，完全重复 {self.stats['exact']} 个，"
+                f"近似重复 {self.stats['near']} 个（复用代表文件的摘要，不再调用模型）")
+
+
+def read_text(abs_path):
+    try:
+        with open(abs_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except Exception:
+        return None
+
+
+def dedupe_pending(pending_files, project_path, index):
+    """对待总结文件去重，返回需要发送给模型的代表文件列表（保持原有顺序）"""
+    representatives = []
+    for rel in pending_files:
+        if index.add(rel, read_text(os.path.join(project_path, rel))) is None:
+            representatives.append(rel)
+    logging.info(index.summary_line())
+    return representatives
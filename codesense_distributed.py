@@ -0,0 +1,265 @@
+import os
+import sys
+import time
+import random
+import socket
+import argparse
+import logging
+import threading
+
+import codesense_pipeline
+import codesense_project_summarizer as summarizer
+from model_api_client import configure_model_api, is_retryable_error
+from codesense_work_queue import WorkQueue
+from codesense_request_scheduler import TokenBucket
+from codesense_summary_cache import open_summary_cache
+from codesense_compactor import Compactor
+from codesense_model_router import ModelRouter
+
+CODE_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class RunContext:
+    """worker 执行某次运行（run）的批次所需的状态：提示词、压缩、摘要缓存、模型路由与本 worker 的限流令牌桶"""
+
+    def __init__(self, context, project_path, requests_per_minute=None, tokens_per_minute=None):
+        conf = context["summarizer_config"]
+        self.project_name = context.get("project_name")
+        self.project_path = project_path
+        self.scenario = context["scenario"]
+        self.prompt = summarizer.scenario_prompts(conf, self.scenario)[0]
+        self.compactor = Compactor.from_config(conf, self.scenario)
+        self.cache = open_summary_cache(conf.get("summary_cache"))
+        self.router = ModelRouter.from_config(conf.get("model_routing"))
+        self.incremental = (conf.get("incremental_parse", {}) or {}).get("enabled", True)
+        scheduler_conf = conf.get("scheduler", {}) or {}
+        self.bucket = TokenBucket(requests_per_minute or scheduler_conf.get("requests_per_minute"),
+                                  tokens_per_minute or scheduler_conf.get("tokens_per_minute"))
+        self.base_delay = scheduler_conf.get("base_delay", 1.0)
+        self.max_delay = scheduler_conf.get("max_delay", 60.0)
+
+    def endpoint(self, item):
+        if self.router is None:
+            return None
+        return self.router.endpoint(self.router.classify(item.payload, lambda labels: item.tokens))
+
+    def close(self):
+        if self.cache:
+            self.cache.close()
+            self.cache = None
+
+
+class SummaryWorker:
+    """
+    分布式总结的 worker：从 WorkQueue 领取批次，用本机的模型配置（各自的 API Key 与额度）调用 summarize_files_batch，
+    把结果写回队列，由协调者合并。
+      - concurrency 个线程各自循环领取与执行批次，主线程每 lease_seconds / 3 秒为执行中的批次续租
+      - 可重试的失败（429、5xx、网络与超时异常、响应无法解析）按指数退避重新排队，Retry-After 优先；
+        其余失败（4xx、配置缺项等程序或配置错误）直接标记为失败
+      - 开启增量解析时，截断响应中已解析的文件照常返回，缺失的文件由协调者重新排队
+      - project_paths 为 {项目名: 本机路径}（"*" 对所有项目生效），项目在各机器上的路径不同时使用
+      - idle_exit 秒内没有可领取的批次时退出，为 None 时一直等待新的运行
+    """
+
+    def __init__(self, work_queue, worker_id=None, concurrency=4, lease_seconds=300.0, poll_interval=2.0,
+                 idle_exit=None, project_paths=None, requests_per_minute=None, tokens_per_minute=None):
+        self.queue = work_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.idle_exit = idle_exit
+        self.project_paths = project_paths or {}
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.stats = {"done": 0, "retried": 0, "failed": 0}
+        self._contexts = {}
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self):
+        """执行到所有线程退出（idle_exit）或被中断，返回统计信息"""
+        logging.info(f"worker {self.worker_id} 启动：并发 {self.concurrency}，租约 {self.lease_seconds} 秒，"
+                     f"队列 {self.queue.db_path}")
+        threads = [threading.Thread(target=self._loop, name=f"codesense-worker-{i}", daemon=True)
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=self.lease_seconds / 3 / len(threads))
+                with self._lock:
+                    active = list(self._active)
+                self.queue.heartbeat(active, self.worker_id, self.lease_seconds)
+        except KeyboardInterrupt:
+            logging.warning(f"worker {self.worker_id} 被中断，执行中的批次在租约过期后由其他 worker 重新领取")
+            self._stop.set()
+        for context in self._contexts.values():
+            context.close()
+        logging.info(f"worker {self.worker_id} 退出：完成 {self.stats['done']} 个批次，重新排队 {self.stats['retried']} 次，"
+                     f"失败 {self.stats['failed']} 个")
+        return self.stats
+
+    def _context(self, run_id):
+        with self._lock:
+            context = self._contexts.get(run_id)
+            if context is None:
+                data = self.queue.context(run_id)
+                name = data.get("project_name")
+                project_path = self.project_paths.get(name) or self.project_paths.get("*") or data["project_path"]
+                context = RunContext(data, project_path, self.requests_per_minute, self.tokens_per_minute)
+                self._contexts[run_id] = context
+        return context
+
+    def _loop(self):
+        idle_since = None
+        while not self._stop.is_set():
+            item = self.queue.lease(self.worker_id, self.lease_seconds)
+            if item is None:
+                idle_since = idle_since or time.monotonic()
+                if self.idle_exit is not None and time.monotonic() - idle_since >= self.idle_exit:
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            idle_since = None
+            self._execute(item)
+
+    def _execute(self, item):
+        context = self._context(item.run_id)
+        with self._lock:
+            self._active.add(item.id)
+        try:
+            wait = context.bucket.reserve(item.tokens)
+            if wait > 0:
+                time.sleep(wait)
+            # 增量解析时传入空回调，使截断的响应返回已解析的部分（协调者负责合并与重新排队）
+            result = summarizer.summarize_files_batch(
+                item.payload, context.project_path, context.prompt, context.scenario, context.cache,
+                raise_on_error=True, compactor=context.compactor,
+                on_entry=(lambda key, value: None) if context.incremental else None,
+                endpoint=context.endpoint(item))
+        except Exception as e:
+            delay = None
+            if is_retryable_error(e):
+                delay = getattr(e, "retry_after", None) or random.uniform(
+                    0, min(context.max_delay, context.base_delay * (2 ** item.attempts)))
+            requeued = self.queue.fail(item.id, self.worker_id, e, delay)
+            with self._lock:
+                self.stats["retried" if requeued else "failed"] += 1
+            if requeued:
+                logging.warning(f"批次 {item.id} 第 {item.attempts} 次执行失败（{e}），{delay:.1f} 秒后重新排队")
+            else:
+                logging.error(f"批次 {item.id} 执行失败（{e}），不再重试")
+        else:
+            if self.queue.complete(item.id, self.worker_id, result):
+                with self._lock:
+                    self.stats["done"] += 1
+            else:
+                logging.info(f"批次 {item.id} 已由其他 worker 完成或已被协调者按失败处理，丢弃本次结果")
+        finally:
+            with self._lock:
+                self._active.discard(item.id)
+
+
+def parse_project_paths(values):
+    """--project_path 的取值：NAME=PATH 指定某个项目在本机的路径，单独的 PATH 对所有项目生效"""
+    paths = {}
+    for value in values or []:
+        name, sep, path = value.partition("=")
+        if sep and not os.path.isdir(value):
+            paths[name] = path
+        else:
+            paths["*"] = value
+    return paths
+
+
+def run_coordinator(args):
+    """扫描项目并作为协调者执行总结：批次交给 worker，本进程合并摘要、执行目录归约与最终总结"""
+    if args.model_config:
+        configure_model_api(config_file=args.model_config)
+    scan_data = codesense_pipeline.scan(args.project_path, args.project_name, args.config, output=args.output)
+    work_queue = WorkQueue(args.queue, wal=args.wal)
+    try:
+        _, final_report = codesense_pipeline.summarize(scan_data, args.project_path, args.project_name, args.scenario,
+                                                       args.summarizer_config, output=args.output,
+                                                       final_summary=args.final_summary, work_queue=work_queue)
+    finally:
+        work_queue.close()
+    logging.info(f"最终总结报告：{final_report}")
+
+
+def run_worker(args):
+    if args.model_config:
+        configure_model_api(config_file=args.model_config)
+    summarizer.BIG_MODEL_LOG = os.path.join(args.log_dir, "big_model_calls.log")
+    work_queue = WorkQueue(args.queue, wal=args.wal)
+    try:
+        SummaryWorker(work_queue, args.worker_id, args.concurrency, args.lease_seconds, args.poll_interval,
+                      args.idle_exit, parse_project_paths(args.project_path), args.requests_per_minute,
+                      args.tokens_per_minute).run()
+    finally:
+        work_queue.close()
+
+
+def show_status(args):
+    work_queue = WorkQueue(args.queue, wal=args.wal)
+    counts = work_queue.counts()
+    work_queue.close()
+    print(f"待领取 {counts['pending']}，执行中 {counts['leased']}，已完成 {counts['done']}，失败 {counts['failed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeSense 分布式总结：协调者发布批次，多台机器上的 worker 领取执行")
+    sub = parser.add_subparsers(dest="command", required=True)
+    default_project_path = CODE_ROOT
+
+    p_coord = sub.add_parser("coordinator", help="扫描项目、发布批次并合并 worker 的结果，最后生成总结报告")
+    p_coord.add_argument("--project_name", type=str, default=os.path.basename(default_project_path), help="项目名称")
+    p_coord.add_argument("--project_path", type=str, default=default_project_path, help="待扫描项目根目录路径")
+    p_coord.add_argument("--config", type=str, default="codesense_config.json", help="全局扫描配置文件路径")
+    p_coord.add_argument("--output", type=str, default="project_structure.json", help="扫描结果文件名称（.json 或 .cstore）")
+    p_coord.add_argument("--summarizer_config", type=str, default="codesense_summarizer_config.json",
+                         help="项目总结配置文件路径（随批次发布给 worker）")
+    p_coord.add_argument("--final_summary", type=str, default="final_project_summary.md", help="最终项目总结报告输出文件名称")
+    p_coord.add_argument("--scenario", type=str, choices=["direct", "correct", "usage", "custom"], default="direct",
+                         help="选择总结场景")
+
+    p_worker = sub.add_parser("worker", help="领取并执行批次（可在多台机器上各启动若干个）")
+    p_worker.add_argument("--worker_id", type=str, help="worker 名称，默认为 主机名-进程号")
+    p_worker.add_argument("--concurrency", type=int, default=4, help="同时执行的批次数")
+    p_worker.add_argument("--lease_seconds", type=float, default=300.0, help="批次租约时长（秒），worker 失联超过该时长后批次被重新领取")
+    p_worker.add_argument("--poll_interval", type=float, default=2.0, help="没有可领取的批次时的轮询间隔（秒）")
+    p_worker.add_argument("--idle_exit", type=float, help="连续多少秒没有可领取的批次时退出，默认一直等待")
+    p_worker.add_argument("--project_path", action="append",
+                          help="项目在本机的路径：NAME=PATH 或 PATH（对所有项目生效），默认使用协调者发布的路径")
+    p_worker.add_argument("--requests_per_minute", type=float, help="本 worker 的每分钟请求数上限，默认取总结配置 scheduler 段")
+    p_worker.add_argument("--tokens_per_minute", type=float, help="本 worker 的每分钟 token 数上限，默认取总结配置 scheduler 段")
+    p_worker.add_argument("--log_dir", type=str, default=os.path.join(CODE_ROOT, "logs", "worker"), help="日志目录")
+
+    p_status = sub.add_parser("status", help="查看队列中未结束运行的批次状态")
+    for p in (p_coord, p_worker):
+        p.add_argument("--model_config", type=str, help="本进程使用的模型 API 配置文件（默认 config.ini），各 worker 可使用各自的 API Key")
+    for p in (p_coord, p_worker, p_status):
+        p.add_argument("--queue", type=str, required=True, help="工作队列 SQLite 文件路径（各机器共享的存储上）")
+        p.add_argument("--wal", action="store_true", help="队列使用 WAL 模式（仅当所有进程在同一台机器上时）")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        show_status(args)
+        return
+    log_dir = args.log_dir if args.command == "worker" else os.path.join(CODE_ROOT, "scan_results", args.project_name)
+    summarizer.setup_logging(log_dir)
+    try:
+        if args.command == "coordinator":
+            run_coordinator(args)
+        else:
+            run_worker(args)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import fnmatch
+
+# 跳过原因代码，写入文件节点的 skip_reason 字段
+SKIP_TOO_LARGE = "too_large"          # 超过 max_file_bytes，不读取
+SKIP_BINARY = "binary"                # 开头若干字节中含 NUL
+SKIP_ENCODING = "encoding"            # 不是 UTF-8 文本（含 UTF-16/32 BOM），总结阶段无法读取
+SKIP_MINIFIED = "minified"            # 压缩后的代码（超长行）
+SKIP_GENERATED = "generated"          # 生成代码（文件名模式或文件头标记）
+SKIP_LOCKFILE = "lockfile"            # 依赖锁文件
+SKIP_VENDORED = "vendored"            # 位于第三方代码目录
+SKIP_DATA = "data"                    # 较大的数据文件
+SKIP_NOTEBOOK = "notebook"            # 含大量输出的 Notebook
+
+# 只依据文件大小判断、不读取内容的原因
+SIZE_SKIP_REASONS = (SKIP_TOO_LARGE, SKIP_DATA, SKIP_NOTEBOOK)
+
+# 默认分诊配置，可在 codesense_config.json 的 "triage" 中逐项覆盖
+DEFAULT_TRIAGE = {
+    "enabled": True,
+    "sniff_bytes": 8192,
+    "max_file_bytes": 1048576,
+    "max_line_length": 1000,
+    "min_avg_line_length": 200,
+    "generated_markers": [
+        "@generated", "do not edit", "code generated by", "generated by the protocol buffer compiler",
+        "autogenerated", "auto-generated"
+    ],
+    "generated_patterns": [
+        "*.min.js", "*.min.css", "*.map", "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.pb.cc", "*.pb.h",
+        "*.g.dart", "*.designer.cs"
+    ],
+    "lockfiles": [
+        "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock", "Cargo.lock",
+        "Gemfile.lock", "composer.lock", "go.sum"
+    ],
+    "vendored_dirs": ["vendor", "third_party", "third-party", "3rdparty", "bower_components", "site-packages"],
+    "data_extensions": [".csv", ".tsv", ".jsonl", ".parquet", ".npy", ".npz", ".pkl", ".h5", ".sqlite", ".db"],
+    "max_data_bytes": 65536,
+    "max_notebook_bytes": 262144
+}
+
+_UTF16_32_BOMS = (b"\xff\xfe", b"\xfe\xff")
+
+
+class FileTriage:
+    """
+    扫描阶段的文件分诊：在调用模型之前剔除不值得（或无法）总结的文件，命中时返回原因代码。
+      - classify_path：只看文件名与路径（锁文件、生成代码文件名、第三方目录），不需要任何 IO
+      - classify_size：只看 stat 得到的大小（超大文件、较大的数据文件与 Notebook），不读取内容
+      - classify_content：对已读取的内容做廉价检查（NUL 字节、编码、超长行、生成代码标记），
+        只检查开头 sniff_bytes 字节
+    """
+
+    def __init__(self, conf=None):
+        conf = dict(DEFAULT_TRIAGE, **(conf or {}))
+        self.sniff_bytes = conf["sniff_bytes"]
+        self.max_file_bytes = conf["max_file_bytes"]
+        self.max_line_length = conf["max_line_length"]
+        self.min_avg_line_length = conf["min_avg_line_length"]
+        self.generated_markers = [m.lower().encode("utf-8") for m in conf["generated_markers"]]
+        self.generated_patterns = list(conf["generated_patterns"])
+        self.lockfiles = set(conf["lockfiles"])
+        self.vendored_dirs = set(conf["vendored_dirs"])
+        self.data_extensions = set(conf["data_extensions"])
+        self.max_data_bytes = conf["max_data_bytes"]
+        self.max_notebook_bytes = conf["max_notebook_bytes"]
+
+    @classmethod
+    def from_config(cls, config):
+        """由扫描配置构造；"triage" 中 enabled 为 False 时返回 None"""
+        conf = config.get("triage") or {}
+        if not conf.get("enabled", True):
+            return None
+        return cls(conf)
+
+    def classify_path(self, rel_path, name):
+        if name in self.lockfiles:
+            return SKIP_LOCKFILE
+        lower = name.lower()
+        for pattern in self.generated_patterns:
+            if fnmatch.fnmatchcase(lower, pattern):
+                return SKIP_GENERATED
+        parts = rel_path.replace("\\", "/").split("/")[:-1]
+        if self.vendored_dirs.intersection(parts):
+            return SKIP_VENDORED
+        return None
+
+    def classify_size(self, name, size):
+        if self.max_file_bytes and size > self.max_file_bytes:
+            return SKIP_TOO_LARGE
+        ext = os.path.splitext(name)[1].lower()
+        if ext in self.data_extensions and size > self.max_data_bytes:
+            return SKIP_DATA
+        if ext == ".ipynb" and size > self.max_notebook_bytes:
+            return SKIP_NOTEBOOK
+        return None
+
+    def classify_content(self, data, char_count):
+        """data 为文件内容，char_count 为 count_characters_in_bytes 的结果（解码失败时为 None）"""
+        head = data[:self.sniff_bytes]
+        if head.startswith(_UTF16_32_BOMS):
+            return SKIP_ENCODING
+        if b"\x00" in head:
+            return SKIP_BINARY
+        if char_count is None:
+            return SKIP_ENCODING
+        lines = head.split(b"\n")
+        # 只看开头部分：行数很少且存在超长行时视为压缩代码
+        if len(head) > self.max_line_length and max(len(l) for l in lines) > self.max_line_length \
+                and len(head) / len(lines) > self.min_avg_line_length:
+            return SKIP_MINIFIED
+        lowered = head[:2048].lower()
+        for marker in self.generated_markers:
+            if marker in lowered:
+                return SKIP_GENERATED
+        return None
@@ -0,0 +1,165 @@
+import os
+import time
+import logging
+import uuid
+import threading
+from multiprocessing.managers import BaseManager
+
+from codesense_request_scheduler import TokenBucket
+
+# 批量编排器启动预算服务后，通过环境变量把地址与密钥传给各个子进程
+BUDGET_ADDRESS_ENV = "CODESENSE_BUDGET_ADDRESS"
+BUDGET_AUTHKEY_ENV = "CODESENSE_BUDGET_AUTHKEY"
+BUDGET_CLIENT_ENV = "CODESENSE_BUDGET_CLIENT"
+
+
+class GlobalBudget:
+    """
+    跨进程共享的请求预算：所有项目的模型请求共用一个并发上限与一个令牌桶（每分钟请求数 / token 数）。
+    运行在预算服务进程中，子进程通过 BudgetManager 的代理调用；acquire() 在没有空闲并发槽时阻塞，
+    返回调用方还需等待的限流秒数（由调用方自行 sleep，避免占用服务端线程）。
+    并发槽按 client（每个项目子进程一个标识）记录，子进程退出（超时被终止或崩溃）后由编排器调用
+    release_client() 收回其未释放的并发槽，之后该 client 迟到的 acquire / release 不再占用或归还并发槽。
+    """
+
+    def __init__(self, max_concurrency=32, requests_per_minute=None, tokens_per_minute=None):
+        self.max_concurrency = max(1, max_concurrency)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._bucket = TokenBucket(requests_per_minute, tokens_per_minute)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._grants = {}
+        self._closed = set()
+        self._stats = {"granted": 0, "tokens": 0, "peak_in_flight": 0, "slot_wait": 0.0, "rate_wait": 0.0,
+                       "reclaimed": 0}
+
+    def acquire(self, tokens=0, client=None):
+        start = time.monotonic()
+        self._slots.acquire()
+        waited = time.monotonic() - start
+        with self._lock:
+            if client in self._closed:
+                # 等待期间该 client 已退出并被收回，立即归还刚取得的并发槽
+                self._slots.release()
+                return 0.0
+            self._grants[client] = self._grants.get(client, 0) + 1
+            self._in_flight += 1
+            self._stats["granted"] += 1
+            self._stats["tokens"] += tokens
+            self._stats["slot_wait"] += waited
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+        wait = self._bucket.reserve(tokens)
+        with self._lock:
+            self._stats["rate_wait"] += wait
+        return wait
+
+    def release(self, client=None):
+        with self._lock:
+            if not self._grants.get(client):
+                return
+            self._grants[client] -= 1
+            self._in_flight -= 1
+        self._slots.release()
+
+    def release_client(self, client):
+        """收回 client 仍持有的全部并发槽（子进程已退出），返回收回的数量"""
+        with self._lock:
+            count = self._grants.pop(client, 0)
+            self._closed.add(client)
+            self._in_flight -= count
+            self._stats["reclaimed"] += count
+        for _ in range(count):
+            self._slots.release()
+        if count:
+            logging.warning(f"子进程 {client} 退出时仍持有 {count} 个全局并发槽，已收回")
+        return count
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=self._in_flight, max_concurrency=self.max_concurrency)
+
+
+# 预算服务进程中的 GlobalBudget 实例；BudgetManager 与 get_budget 均定义在模块级，
+# spawn 启动方式（macOS / Windows 默认）下服务进程可以按名称导入，无需序列化闭包
+_served_budget = None
+
+
+def _init_budget_server(budget_conf):
+    global _served_budget
+    conf = budget_conf or {}
+    _served_budget = GlobalBudget(conf.get("max_concurrency", 32), conf.get("requests_per_minute"),
+                                  conf.get("tokens_per_minute"))
+
+
+def _get_served_budget():
+    return _served_budget
+
+
+class BudgetManager(BaseManager):
+    pass
+
+
+BudgetManager.register("get_budget", callable=_get_served_budget)
+
+
+def serve_global_budget(budget_conf):
+    """
+    启动预算服务进程（仅监听本机），返回 (manager, budget 代理, 子进程环境变量)。
+    budget_conf 为清单中的 global_budget 段：max_concurrency / requests_per_minute / tokens_per_minute。
+    各项目子进程另由 new_budget_client() 分配 client 标识，以便退出后收回其并发槽。
+    """
+    authkey = os.urandom(16)
+    manager = BudgetManager(address=("127.0.0.1", 0), authkey=authkey)
+    manager.start(initializer=_init_budget_server, initargs=(budget_conf,))
+    host, port = manager.address
+    env = {BUDGET_ADDRESS_ENV: f"{host}:{port}", BUDGET_AUTHKEY_ENV: authkey.hex()}
+    return manager, manager.get_budget(), env
+
+
+def new_budget_client():
+    """为一个项目子进程分配预算 client 标识，通过环境变量 BUDGET_CLIENT_ENV 传给子进程"""
+    return uuid.uuid4().hex
+
+
+class _BudgetClient:
+    """子进程中的预算代理：acquire / release 时带上本进程的 client 标识"""
+
+    def __init__(self, proxy, client):
+        self._proxy = proxy
+        self._client = client
+
+    def acquire(self, tokens=0):
+        return self._proxy.acquire(tokens, self._client)
+
+    def release(self):
+        self._proxy.release(self._client)
+
+    def stats(self):
+        return self._proxy.stats()
+
+
+_client_budget = None
+_client_lock = threading.Lock()
+
+
+def connect_global_budget():
+    """
+    子进程中连接编排器的预算服务；未设置环境变量（单独运行）或连接失败时返回 None，此时只使用本进程的调度限制。
+    """
+    global _client_budget
+    address = os.environ.get(BUDGET_ADDRESS_ENV)
+    if not address:
+        return None
+    with _client_lock:
+        if _client_budget is None:
+            host, port = address.rsplit(":", 1)
+            try:
+                manager = BudgetManager(address=(host, int(port)),
+                                        authkey=bytes.fromhex(os.environ.get(BUDGET_AUTHKEY_ENV, "")))
+                manager.connect()
+                _client_budget = _BudgetClient(manager.get_budget(), os.environ.get(BUDGET_CLIENT_ENV))
+                logging.info(f"已连接全局请求预算服务：{address}")
+            except Exception as e:
+                logging.error(f"连接全局请求预算服务失败，仅使用本进程的并发与限流设置：{e}")
+                return None
+    return _client_budget
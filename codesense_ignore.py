@@ -0,0 +1,193 @@
+import os
+import re
+import logging
+
+
+def _translate(pattern):
+    """将一条 gitignore 通配模式转换为正则（不含首尾锚定），路径分隔符统一为 /"""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            j = i
+            while j < n and pattern[j] == "*":
+                j += 1
+            at_segment_start = i == 0 or pattern[i - 1] == "/"
+            if j - i >= 2 and at_segment_start and (j == n or pattern[j] == "/"):
+                if j == n:
+                    # 结尾的 "/**" 匹配目录下的所有内容
+                    out.append(".*")
+                    i = j
+                else:
+                    # "**/" 匹配零或多级目录
+                    out.append("(?:.*/)?")
+                    i = j + 1
+                continue
+            out.append("[^/]*")
+            i = j
+            continue
+        if c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i + 1
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:
+                out.append("\\[")
+            else:
+                body = pattern[i + 1:j]
+                if body[:1] in ("!", "^"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def parse_pattern(line):
+    """
+    解析一行 gitignore 规则，返回 (正则, negate, dir_only, anchored)；空行与注释返回 None。
+      - "!" 开头为反向规则（重新包含）；"\\!"、"\\#" 为转义
+      - "/" 结尾只匹配目录
+      - 含 "/"（结尾的除外）的模式相对于 .gitignore 所在目录锚定，否则匹配任意层级的文件名
+    """
+    line = line.rstrip("\r\n")
+    if not line or line.startswith("#"):
+        return None
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith(("\\!", "\\#")):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    anchored = "/" in line
+    return _translate(line.lstrip("/")), negate, dir_only, anchored
+
+
+class IgnoreRules:
+    """
+    一个 .gitignore 文件（或一组配置模式）编译后的规则，base 为其所在目录的相对路径。
+    没有反向规则时，按 (文件名 / 相对路径) × (任意 / 仅目录) 合并为至多四个正则，每个路径只需几次匹配；
+    有反向规则时按"最后一条匹配的规则生效"逐条倒序判断。
+    """
+
+    def __init__(self, base, lines, source=None):
+        self.base = base
+        self.source = source
+        self.rules = []
+        for line in lines:
+            parsed = parse_pattern(line)
+            if parsed is not None:
+                regex, negate, dir_only, anchored = parsed
+                self.rules.append((re.compile(regex), negate, dir_only, anchored))
+        self.has_negation = any(r[1] for r in self.rules)
+        self.combined = {}
+        if not self.has_negation:
+            groups = {}
+            for regex, _, dir_only, anchored in self.rules:
+                groups.setdefault((anchored, dir_only), []).append(f"(?:{regex.pattern})")
+            self.combined = {k: re.compile("|".join(v)) for k, v in groups.items()}
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    @classmethod
+    def from_file(cls, path, base):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return cls(base, f.read().splitlines(), path)
+        except OSError as e:
+            logging.warning(f"读取忽略规则失败：{path}（{e}）")
+            return None
+
+    def match(self, rel, name, is_dir):
+        """返回 True（忽略）、False（被反向规则重新包含）或 None（没有规则匹配）"""
+        if self.base:
+            if not rel.startswith(self.base + "/"):
+                return None
+            rel = rel[len(self.base) + 1:]
+        if not self.has_negation:
+            for (anchored, dir_only), regex in self.combined.items():
+                if dir_only and not is_dir:
+                    continue
+                if regex.fullmatch(rel if anchored else name):
+                    return True
+            return None
+        for regex, negate, dir_only, anchored in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(rel if anchored else name):
+                return not negate
+        return None
+
+
+class IgnoreMatcher:
+    """
+    扫描时的忽略判断，在进入目录时剪枝，被忽略的目录不会被列出：
+      - 配置中的 exclude（gitignore 语法，相对项目根目录）优先级最高
+      - use_gitignore 为 True 时遵循各级 .gitignore（深层目录的规则优先）与 .git/info/exclude
+      - 配置中的 include 非空时，只保留匹配其中任一模式的文件（目录不受 include 限制）
+    各目录的规则以元组沿目录栈传递：rules_for_dir() 返回进入某目录后生效的规则。
+    """
+
+    def __init__(self, root, use_gitignore=True, include=None, exclude=None):
+        self.root = root
+        self.use_gitignore = use_gitignore
+        self.exclude = IgnoreRules("", exclude or [])
+        self.include = IgnoreRules("", include or [])
+        self.root_rules = ()
+        if use_gitignore:
+            info_exclude = os.path.join(root, ".git", "info", "exclude")
+            if os.path.isfile(info_exclude):
+                rules = IgnoreRules.from_file(info_exclude, "")
+                if rules:
+                    self.root_rules = (rules,)
+
+    @classmethod
+    def from_config(cls, root, config):
+        """由扫描配置构造；既不使用 .gitignore 也没有 include / exclude 时返回 None"""
+        use_gitignore = config.get("use_gitignore", True)
+        include = config.get("include") or []
+        exclude = config.get("exclude") or []
+        if not (use_gitignore or include or exclude):
+            return None
+        return cls(root, use_gitignore, include, exclude)
+
+    def rules_for_dir(self, dir_path, rel, names, parent_rules):
+        """names 为目录下的条目名称；目录中有 .gitignore 时在父目录规则之后追加"""
+        if self.use_gitignore and ".gitignore" in names:
+            rules = IgnoreRules.from_file(os.path.join(dir_path, ".gitignore"), rel.replace(os.sep, "/"))
+            if rules:
+                return parent_rules + (rules,)
+        return parent_rules
+
+    def is_ignored(self, rel, name, is_dir, rules):
+        rel = rel.replace(os.sep, "/") if os.sep != "/" else rel
+        if self.exclude and self.exclude.match(rel, name, is_dir):
+            return True
+        for ruleset in reversed(rules):
+            result = ruleset.match(rel, name, is_dir)
+            if result is not None:
+                if result:
+                    return True
+                break
+        if self.include and not is_dir:
+            return not self.include.match(rel, name, False)
+        return False
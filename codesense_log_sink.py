@@ -0,0 +1,156 @@
+import queue
+import time
+import uuid
+import atexit
+import logging
+import threading
+
+
+class RequestLog:
+    """单次模型调用的日志句柄：写入内容由 BigModelLogSink 按请求标记后统一落盘"""
+
+    def __init__(self, sink, path, request_id):
+        self.sink = sink
+        self.path = path
+        self.request_id = request_id
+
+    def write(self, text):
+        if text:
+            self.sink.write(self.path, self.request_id, text)
+
+    def close(self):
+        self.sink.close_request(self.path, self.request_id)
+
+
+class BigModelLogSink:
+    """
+    大模型调用日志（big_model_calls.log）的后台写入器：
+      - 调用方把文本放入有界队列即返回，队列满时阻塞（背压），不再逐 token 打开/关闭文件
+      - 写入线程为每个请求维护未完成行的缓冲，只写出完整的行，每行以 [请求 ID] 开头，
+        多个并发请求的内容不会在行中间交错
+      - 文件句柄常驻，缓冲达到 flush_bytes 或距上次落盘超过 flush_interval 秒时 flush
+      - 请求结束时写出剩余的不完整行
+    """
+
+    def __init__(self, max_queue=10000, flush_bytes=64 * 1024, flush_interval=0.5):
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._files = {}
+        self._partial = {}
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="big-model-log-sink", daemon=True)
+        self._thread.start()
+
+    def open_request(self, path, request_id=None):
+        return RequestLog(self, path, request_id or uuid.uuid4().hex[:8])
+
+    def write(self, path, request_id, text):
+        if self._closed:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("".join(f"[{request_id}] {line}\n" for line in text.splitlines()))
+            return
+        self._queue.put(("write", path, request_id, text))
+
+    def close_request(self, path, request_id):
+        if not self._closed:
+            self._queue.put(("close", path, request_id, None))
+
+    def flush(self):
+        """阻塞直到队列中已有的记录全部写出并落盘"""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(("flush", None, None, done))
+        done.wait()
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._queue.put(("stop", None, None, None))
+        self._thread.join()
+        self._closed = True
+
+    def _file(self, path):
+        f = self._files.get(path)
+        if f is None:
+            f = open(path, "a", encoding="utf-8")
+            self._files[path] = f
+        return f
+
+    def _emit(self, path, request_id, text, final):
+        """将请求缓冲中的完整行（final 时包括剩余部分）带上请求 ID 写入文件缓冲"""
+        key = (path, request_id)
+        buffered = self._partial.pop(key, "") + (text or "")
+        if not final:
+            cut = buffered.rfind("\n")
+            if cut == -1:
+                if buffered:
+                    self._partial[key] = buffered
+                return
+            buffered, rest = buffered[:cut], buffered[cut + 1:]
+            if rest:
+                self._partial[key] = rest
+        elif not buffered:
+            return
+        out = "".join(f"[{request_id}] {line}\n" for line in buffered.split("\n"))
+        self._file(path).write(out)
+        self._unflushed += len(out)
+
+    def _flush_files(self):
+        for f in self._files.values():
+            f.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def _run(self):
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - self._last_flush))
+            try:
+                kind, path, request_id, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                if self._unflushed:
+                    self._flush_files()
+                else:
+                    self._last_flush = time.monotonic()
+                continue
+            try:
+                if kind == "write":
+                    self._emit(path, request_id, payload, final=False)
+                elif kind == "close":
+                    self._emit(path, request_id, None, final=True)
+                elif kind == "flush":
+                    self._flush_files()
+                    payload.set()
+                elif kind == "stop":
+                    for (p, rid) in list(self._partial):
+                        self._emit(p, rid, None, final=True)
+                    self._flush_files()
+                    for f in self._files.values():
+                        f.close()
+                    self._files.clear()
+                    return
+            except Exception as e:
+                logging.error(f"写入大模型调用日志失败：{e}")
+                if kind == "flush":
+                    payload.set()
+            if self._unflushed >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_files()
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_log_sink():
+    """返回进程内共享的日志写入器，进程退出时自动写出剩余内容"""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = BigModelLogSink()
+                atexit.register(_sink.close)
+    return _sink
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+from contextlib import contextmanager
+
+# 延迟类指标（秒）的默认分桶，覆盖从毫秒级到数分钟的模型调用
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+# 计数类指标（字符数、token 数、文件数）的默认分桶
+SIZE_BUCKETS = (1, 10, 100, 1000, 4000, 16000, 64000, 256000, 1000000)
+
+# 指标说明，导出 Prometheus 文本时作为 HELP 行
+METRIC_HELP = {
+    "model_call_seconds": "模型调用总耗时",
+    "model_ttft_seconds": "流式调用的首个 token 延迟",
+    "model_calls_total": "模型调用次数",
+    "model_errors_total": "模型调用失败次数",
+    "model_stream_chars_total": "流式返回的字符数",
+    "model_stream_events_total": "流式返回的事件数",
+    "model_output_chars_per_second": "单次调用的输出速率（字符/秒）",
+    "model_usage_tokens_total": "接口返回的 usage token 数",
+    "model_endpoint_calls_total": "各模型端点的调用次数",
+    "model_route_calls_total": "多模型路由中各调用类别的文件摘要批次数",
+    "batch_seconds": "文件摘要批次耗时（含缓存查询与解析）",
+    "batch_files": "每个批次发送给模型的文件数",
+    "batch_input_chars": "每个批次的提示词字符数",
+    "batch_cache_hits_total": "批次中命中摘要缓存的文件数",
+    "batch_parse_errors_total": "批次返回内容无法解析的次数",
+    "scheduler_queue_wait_seconds": "批次从入队到开始执行的等待时间",
+    "scheduler_retries_total": "批次重试次数",
+    "scheduler_failed_total": "重试后仍失败的批次数",
+    "scheduler_concurrency_limit": "自适应并发上限（最近一次调度结束时）",
+    "scheduler_pool_concurrency_limit": "各并发池的自适应并发上限（最近一次调度结束时）",
+    "scan_files_total": "扫描到的文件数",
+    "scan_files_read_total": "扫描时读取内容的文件数",
+    "scan_files_reused_total": "复用上次指纹的文件数",
+    "reduce_dirs_total": "目录归约处理的目录数",
+    "reduce_level_seconds": "目录归约每一层的耗时",
+    "search_index_docs_total": "检索索引中新增、更新与删除的文件数",
+    "work_queue_lease_expired_total": "工作队列中租约过期后被重新领取的批次数",
+    "stage_seconds": "各阶段耗时",
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key, extra=None):
+    items = list(label_key) + list(extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """固定分桶直方图：记录各桶计数、总和、最小 / 最大值，分位数按桶内线性插值估算"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lower = self.buckets[i - 1] if i > 0 else (self.min or 0.0)
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * ((rank - seen) / c)
+            seen += c
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {str(b): c for b, c in zip(list(self.buckets) + ["+Inf"], self.counts)},
+        }
+
+
+class MetricsRegistry:
+    """
+    进程内的指标登记表（线程安全）：计数器、仪表值与直方图均按 (名称, 标签) 区分。
+    模型客户端、批次处理、调度器、扫描与归约各自记录，运行结束时由 write_metrics_report
+    导出为 JSON 报告与 Prometheus textfile。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    @contextmanager
+    def stage(self, name):
+        """记录一个阶段（scan / summarize / reduce / final）的耗时"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.monotonic() - start, stage=name)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def to_dict(self):
+        """机器可读的指标快照：counters / gauges / histograms 各为 [{name, labels, value}] 列表"""
+        with self._lock:
+            return {
+                "started": datetime.datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.counters.items())],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.gauges.items())],
+                "histograms": [{"name": n, "labels": dict(l), **h.to_dict()}
+                               for (n, l), h in sorted(self.histograms.items())],
+            }
+
+    def to_prometheus(self, prefix="codesense_", const_labels=None):
+        """Prometheus 文本格式（node_exporter textfile collector 可直接采集）"""
+        extra = _label_key(const_labels or {})
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {prefix}{name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {prefix}{name} {kind}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                describe(name, "counter")
+                lines.append(f"{prefix}{name}{_format_labels(labels, extra)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                describe(name, "gauge")
+                lines.append(f"{prefix}{name}{_format_labels(labels, extra)} {value}")
+            for (name, labels), hist in sorted(self.histograms.items()):
+                describe(name, "histogram")
+                cumulative = 0
+                for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                    cumulative += count
+                    le = (("le", bound if bound == "+Inf" else repr(float(bound))),)
+                    lines.append(f"{prefix}{name}_bucket{_format_labels(labels + le, extra)} {cumulative}")
+                lines.append(f"{prefix}{name}_sum{_format_labels(labels, extra)} {hist.sum}")
+                lines.append(f"{prefix}{name}_count{_format_labels(labels, extra)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """返回进程内共享的指标登记表"""
+    return _registry
+
+
+def size_class(chars):
+    """按提示词字符数划分批次规模，用于对比不同规模批次的延迟"""
+    for bound in (4000, 16000, 64000, 256000):
+        if chars <= bound:
+            return f"<={bound}"
+    return ">256000"
+
+
+def write_metrics_report(output_dir, project_name=None, metrics_conf=None, registry=None):
+    """
+    将指标写入 output_dir/metrics_<时间>.json，并将 Prometheus 文本原子写入
+    metrics_conf["prometheus_textfile"]（未配置时为 output_dir/codesense.prom）。
+    metrics_conf["enabled"] 为 False 时不输出。返回 JSON 报告路径。
+    """
+    conf = metrics_conf or {}
+    if not conf.get("enabled", True):
+        return None
+    registry = registry or _registry
+    os.makedirs(output_dir, exist_ok=True)
+    report = registry.to_dict()
+    report["project_name"] = project_name
+    report["finished"] = datetime.datetime.now().isoformat(timespec="seconds")
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_path = os.path.join(output_dir, f"metrics_{timestamp}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+
+    prom_path = conf.get("prometheus_textfile") or os.path.join(output_dir, "codesense.prom")
+    # textfile collector 可能随时读取，先写临时文件再重命名
+    tmp_path = f"{prom_path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.to_prometheus(const_labels={"project": project_name} if project_name else None))
+    os.replace(tmp_path, prom_path)
+    logging.info(f"性能指标已保存至 {report_path}（Prometheus 文本：{prom_path}）")
+    return report_path
+
+
+def summary_lines(registry=None):
+    """关键指标的一行式摘要，便于在日志中快速查看"""
+    registry = registry or _registry
+    data = registry.to_dict()
+    lines = []
+    for h in data["histograms"]:
+        if h["name"] in ("stage_seconds", "model_call_seconds", "model_ttft_seconds", "scheduler_queue_wait_seconds"):
+            labels = ",".join(f"{k}={v}" for k, v in h["labels"].items())
+            lines.append(f"{h['name']}[{labels}] 次数 {h['count']}，合计 {h['sum']:.2f} s，"
+                         f"p50 {h['p50'] or 0:.3f} s，p90 {h['p90'] or 0:.3f} s")
+    return lines
@@ -0,0 +1,59 @@
+import logging
+
+from model_api_client import get_model_endpoint
+from codesense_batch_planner import parse_chunk_label
+from codesense_metrics import get_metrics
+
+CALL_CLASSES = ("batch", "large_file", "reduce")
+
+
+class ModelRouter:
+    """
+    多模型路由（总结配置中的 model_routing 段）：按调用类别选择模型端点与并发池。
+      - batch：由普通文件组成的批次
+      - large_file：超长文件的分块，或预估 token 数不少于 large_file_tokens 的单文件批次
+      - reduce：目录归约与最终总结
+    routes 中每个类别的 endpoint 为 config.ini 中 [model.<名称>] 段的名称（未给出的项沿用 [step_api_prod]），
+    不填时使用默认配置；max_concurrent_requests / max_concurrency / requests_per_minute / tokens_per_minute
+    作为该类别在 RequestScheduler 中的并发池参数，各类别的并发与限流互不挤占。
+    """
+
+    def __init__(self, routes, large_file_tokens=8000):
+        unknown = set(routes) - set(CALL_CLASSES)
+        if unknown:
+            raise ValueError(f"未知的调用类别：{', '.join(sorted(unknown))}，可选：{', '.join(CALL_CLASSES)}")
+        self.routes = {name: dict(route or {}) for name, route in routes.items()}
+        self.large_file_tokens = large_file_tokens
+
+    @classmethod
+    def from_config(cls, conf):
+        """由总结配置中的 "model_routing" 构造；enabled 为 False 时返回 None。端点不存在时立即抛出 ValueError"""
+        conf = conf or {}
+        if not conf.get("enabled", False):
+            return None
+        router = cls(conf.get("routes", {}) or {}, conf.get("large_file_tokens", 8000))
+        for name in CALL_CLASSES:
+            endpoint = router.endpoint(name)
+            config = get_model_endpoint(endpoint)
+            logging.info(f"调用类别 {name}：端点 {endpoint or '默认'}，模型 {config.model_name}，"
+                         f"初始并发 {router.routes.get(name, {}).get('max_concurrent_requests', '默认')}")
+        return router
+
+    def endpoint(self, call_class):
+        return self.routes.get(call_class, {}).get("endpoint")
+
+    def pools(self):
+        """传给 RequestScheduler 的并发池配置：每个配置了路由的类别一个池"""
+        return {name: route for name, route in self.routes.items()}
+
+    def classify(self, labels, estimate_tokens):
+        """文件摘要批次的调用类别；estimate_tokens(labels) 返回批次的预估 token 数"""
+        if any(parse_chunk_label(label) for label in labels):
+            return "large_file"
+        if len(labels) == 1 and estimate_tokens(labels) >= self.large_file_tokens:
+            return "large_file"
+        return "batch"
+
+    @staticmethod
+    def record(call_class):
+        get_metrics().inc("model_route_calls_total", route=call_class)
@@ -0,0 +1,88 @@
+import os
+import json
+import logging
+
+CODE_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SUMMARIZER_CONFIG = os.path.join(CODE_ROOT, "codesense_summarizer_config.json")
+
+# 扫描与总结模块（以及 requests / aiohttp 等依赖）在第一次调用时才导入，
+# `import codesense_pipeline` 本身不读取任何配置文件
+
+
+def _load_summarizer_config(summarizer_config):
+    """summarizer_config 可以是已加载的字典，也可以是配置文件路径（None 表示默认配置文件）"""
+    if isinstance(summarizer_config, dict):
+        return summarizer_config
+    path = summarizer_config or DEFAULT_SUMMARIZER_CONFIG
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    logging.info(f"加载总结工具配置文件：{path}")
+    return config
+
+
+def streaming_enabled(summarizer_config):
+    """总结配置中是否开启了边扫描边总结（streaming.enabled）"""
+    return bool((_load_summarizer_config(summarizer_config).get("streaming", {}) or {}).get("enabled", False))
+
+
+def scan(project_path, project_name=None, config=None, output="project_structure.json",
+         file_list_output="project_files.txt", workers=None):
+    """
+    扫描项目，返回合并了上次摘要的扫描结果字典（同时写入 scan_results/<project_name>/<output>）。
+    config 可以是已加载的扫描配置字典、配置文件路径或 None（默认配置 + 项目级配置）。
+    """
+    from codesense_scanner import load_scan_config, scan_project
+    project_name = project_name or os.path.basename(os.path.abspath(project_path))
+    if not isinstance(config, dict):
+        config = load_scan_config(project_path, config)
+    scan_data, _ = scan_project(project_path, project_name, config, output=output,
+                                file_list_output=file_list_output, workers=workers)
+    return scan_data
+
+
+def summarize(scan_data, project_path, project_name=None, scenario="direct", summarizer_config=None,
+              output="project_structure.json", final_summary="final_project_summary.md", dry_run=False,
+              work_queue=None):
+    """
+    对内存中的扫描结果生成文件摘要与最终总结报告，摘要原地回填到 scan_data，
+    进度日志与报告写在 scan_results/<project_name>/ 下。返回 (最终总结文本, 报告文件路径)。
+    传入 work_queue（codesense_work_queue.WorkQueue）时文件摘要批次交给 worker 执行（见 codesense_distributed）。
+    """
+    import codesense_project_summarizer as summarizer
+    project_name = project_name or scan_data.get("project_name") or os.path.basename(os.path.abspath(project_path))
+    output_dir = os.path.join(CODE_ROOT, "scan_results", project_name)
+    os.makedirs(output_dir, exist_ok=True)
+    summarizer.BIG_MODEL_LOG = os.path.join(output_dir, "big_model_calls.log")
+    return summarizer.summarize_project(scan_data, project_path, os.path.join(output_dir, output),
+                                        _load_summarizer_config(summarizer_config), scenario=scenario,
+                                        output=final_summary, dry_run=dry_run, work_queue=work_queue)
+
+
+def run(project_path, project_name=None, scenario="direct", config=None, summarizer_config=None,
+        output="project_structure.json", file_list_output="project_files.txt",
+        final_summary="final_project_summary.md", workers=None, dry_run=False, stream=None):
+    """
+    在当前进程中依次执行扫描与总结：扫描得到的字典直接交给总结阶段，不再重新读取扫描结果文件。
+    stream 为 True（None 时取总结配置 streaming.enabled）时扫描与文件摘要重叠执行，
+    扫描过程中装满的批次立即开始调用模型；dry_run 时总是先扫描再预演。
+    返回 (最终总结文本, 报告文件路径)。不修改日志配置，嵌入其他程序时由调用方自行配置 logging。
+    """
+    project_name = project_name or os.path.basename(os.path.abspath(project_path))
+    summarizer_config = _load_summarizer_config(summarizer_config)
+    if stream is None:
+        stream = streaming_enabled(summarizer_config)
+    if stream and not dry_run:
+        from codesense_scanner import load_scan_config
+        import codesense_project_summarizer as summarizer
+        if not isinstance(config, dict):
+            config = load_scan_config(project_path, config)
+        output_dir = os.path.join(CODE_ROOT, "scan_results", project_name)
+        os.makedirs(output_dir, exist_ok=True)
+        summarizer.BIG_MODEL_LOG = os.path.join(output_dir, "big_model_calls.log")
+        return summarizer.summarize_streaming(project_path, project_name, config, summarizer_config, scenario,
+                                              output=output, file_list_output=file_list_output,
+                                              final_output=final_summary, workers=workers)
+    scan_data = scan(project_path, project_name, config, output=output,
+                     file_list_output=file_list_output, workers=workers)
+    return summarize(scan_data, project_path, project_name, scenario, summarizer_config,
+                     output=output, final_summary=final_summary, dry_run=dry_run)
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from codesense_scan_model import ScanModel
+from codesense_scan_store import is_scan_store, load_scan_store, write_scan_store
+
+
+def journal_path_for(scan_json_path):
+    """扫描结果对应的进度日志路径：与 project_structure.json 同目录，追加 .journal 后缀"""
+    return scan_json_path + ".journal"
+
+
+def atomic_write_json(path, data, indent=4):
+    """先写入同目录下的临时文件并 fsync，再用 os.replace 原子替换，写入中途崩溃不会损坏原文件"""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_path = os.path.dirname(os.path.abspath(path))
+    try:
+        # 目录项落盘，保证 rename 在断电后仍然可见（部分平台不支持打开目录，忽略即可）
+        dir_fd = os.open(dir_path, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+
+def write_scan_data(path, data):
+    """按扩展名原子写入扫描结果：.cstore 写为二进制列式存储，其余写为 JSON"""
+    if is_scan_store(path):
+        write_scan_store(path, data)
+    else:
+        atomic_write_json(path, data)
+
+
+def read_journal(journal_path):
+    """逐行读取进度日志；最后一行可能因崩溃只写了一半，无法解析的行直接跳过"""
+    records = []
+    if not os.path.exists(journal_path):
+        return records
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logging.warning(f"进度日志 {journal_path} 第 {line_no} 行不完整，已跳过")
+    return records
+
+
+def replay_journal(scan_data, journal_path, scan_model=None):
+    """
+    将进度日志中的记录按顺序重放到 scan_data：
+      - {"op": "file", "path": ..., "summary": ...}：文件摘要，同时回填结构节点并将 need_traverse 设为 False
+      - {"op": "dir", "path": ..., "dir_summary": ...}：目录摘要缓存
+    记录是幂等的，快照已包含的记录重复重放不影响结果。返回重放的记录数。
+    """
+    records = read_journal(journal_path)
+    if not records:
+        return 0
+    model = scan_model or ScanModel(scan_data)
+    applied = 0
+    for record in records:
+        op = record.get("op")
+        rel = record.get("path")
+        if op == "file":
+            scan_data["summaries"][rel] = record.get("summary")
+            node = model.get_file(rel)
+            if node is not None:
+                node["summaries"] = record.get("summary")
+                node["need_traverse"] = False
+            applied += 1
+        elif op == "dir":
+            node = model.dirs.get(rel)
+            if node is not None:
+                node["dir_summary"] = record.get("dir_summary")
+            applied += 1
+    logging.info(f"从进度日志 {journal_path} 重放 {applied} 条记录")
+    return applied
+
+
+def load_scan_json_with_journal(scan_json_path):
+    """
+    加载扫描结果（JSON 或 .cstore）并重放未压实的进度日志，中断的运行可以从停止处继续；文件不存在时返回 None
+    """
+    if not os.path.exists(scan_json_path):
+        return None
+    if is_scan_store(scan_json_path):
+        data = load_scan_store(scan_json_path)
+    else:
+        with open(scan_json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    if data.get("summaries") is None:
+        data["summaries"] = {}
+    replay_journal(data, journal_path_for(scan_json_path))
+    return data
+
+
+class ProgressJournal:
+    """
+    总结进度的追加式日志（JSONL）：
+      - 每完成一个文件 / 目录摘要追加一行记录，并 flush + fsync，崩溃后最多丢失正在写入的一行
+      - 记录数达到 compact_every 或距上次压实超过 compact_interval 秒时，将内存中的 scan_data
+        原子写入 project_structure.json 或 .cstore（临时文件 + rename），然后清空日志
+      - 启动时由 load_scan_json 重放日志，无需每个批次都重写整个扫描结果
+    """
+
+    def __init__(self, scan_json_path, scan_data, compact_every=200, compact_interval=60.0):
+        self.scan_json_path = scan_json_path
+        self.journal_path = journal_path_for(scan_json_path)
+        self.scan_data = scan_data
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_compact = time.monotonic()
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        if self._file.tell() > 0:
+            # 上次崩溃时最后一行可能只写了一半，补一个换行，避免与新记录拼接成一行
+            with open(self.journal_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    @classmethod
+    def from_config(cls, scan_json_path, scan_data, journal_conf):
+        conf = journal_conf or {}
+        return cls(scan_json_path, scan_data,
+                   compact_every=conf.get("compact_every", 200),
+                   compact_interval=conf.get("compact_interval", 60.0))
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending += 1
+
+    def record_file(self, file_rel, summary):
+        self._append({"op": "file", "path": file_rel, "summary": summary})
+
+    def record_dir(self, dir_rel, dir_summary):
+        self._append({"op": "dir", "path": dir_rel, "dir_summary": dir_summary})
+
+    def maybe_compact(self):
+        """达到记录数或时间阈值时压实，返回是否执行了压实"""
+        if self._pending >= self.compact_every or (
+                self._pending and time.monotonic() - self._last_compact >= self.compact_interval):
+            self.compact()
+            return True
+        return False
+
+    def compact(self):
+        """
+        将当前 scan_data 原子写入扫描结果文件后截断日志。
+        两步之间崩溃时日志中的记录已包含在快照里，重放是幂等的，不会出错。
+        """
+        with self._lock:
+            write_scan_data(self.scan_json_path, self.scan_data)
+            self._file.truncate(0)
+            self._file.seek(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            logging.info(f"压实进度日志：{self._pending} 条记录写入 {self.scan_json_path}")
+            self._pending = 0
+            self._last_compact = time.monotonic()
+
+    def close(self):
+        """压实剩余记录并删除日志文件"""
+        if self._file is None:
+            return
+        self.compact()
+        with self._lock:
+            self._file.close()
+            self._file = None
+            try:
+                os.remove(self.journal_path)
+            except OSError:
+                pass
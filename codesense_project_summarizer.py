@@ -4,12 +4,32 @@ import argparse
 import logging
 import sys
 import time
+import threading
 import configparser
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import math
 
-from model_api_client import call_model_api
+from model_api_client import (
+    call_model_api, call_model_api_async, async_client_available, configure_async_client, close_async_client,
+    get_model_endpoint, get_json_loads, ModelAPIError
+)
+from codesense_scan_model import ScanModel
+from codesense_scanner import content_hash
+from codesense_summary_cache import SummaryCache, open_summary_cache, prompt_template_hash
+from codesense_request_scheduler import RequestScheduler, JobQueue
+from codesense_global_budget import connect_global_budget
+from codesense_batch_planner import (
+    build_plan_from_config, build_streaming_batcher, parse_chunk_label, read_chunk_content, merge_chunk_summaries,
+    planner_settings
+)
+from codesense_tree_reduce import TreeReducer, format_entry, pack_entries
+from codesense_progress_journal import ProgressJournal, write_scan_data, load_scan_json_with_journal
+from codesense_metrics import get_metrics, size_class, write_metrics_report, summary_lines
+from codesense_dedup import DedupIndex, dedupe_pending, read_text
+from codesense_compactor import Compactor
+from codesense_stream_json import StreamingObjectParser
+from codesense_model_router import ModelRouter
+from codesense_search_index import update_search_index
 
 # 全局变量，默认大模型调用日志文件路径，后续在 main_wrapper 中会更新
 BIG_MODEL_LOG = "big_model_calls.log"
@@ -39,14 +59,13 @@ def setup_logging(log_dir):
     logging.debug(f"日志系统初始化完成，日志文件：{log_file}")
 
 def save_scan_json(scan_json_path, data):
-    with open(scan_json_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    write_scan_data(scan_json_path, data)
     logging.info(f"保存扫描结果至 {scan_json_path}")
 
 def load_scan_json(scan_json_path):
+    """加载扫描结果，并重放上次运行中断时尚未压实的进度日志"""
     if os.path.exists(scan_json_path):
-        with open(scan_json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = load_scan_json_with_journal(scan_json_path)
         logging.info(f"成功加载扫描结果 {scan_json_path}")
         return data
     logging.error(f"扫描结果文件 {scan_json_path} 不存在")
@@ -93,7 +112,8 @@ def clean_response_text(text):
         text = "\n".join(lines).strip()
     return text
 
-def summarize_files_batch(file_paths, project_path, prompt_template):
+def summarize_files_batch(file_paths, project_path, prompt_template, scenario=None, cache=None, raise_on_error=False,
+                          compactor=None, on_entry=None, endpoint=None):
     """
     针对一批代码文件生成摘要（不包含 .md 文件）。
     拼接时采用格式：
@@ -104,59 +124,223 @@ def summarize_files_batch(file_paths, project_path, prompt_template):
       ===FILE_SEPARATOR===
     将所有文本填入 prompt_template 的 {batch_content} 部分，调用大模型生成摘要。
     大模型调用详情写入 BIG_MODEL_LOG 文件，Trace ID 总在终端显示。
+    若提供 cache（SummaryCache），则先按 (内容哈希, 场景, 模板哈希, 模型) 查询缓存，
+    仅将未命中的文件发送给大模型，生成的摘要写回缓存。
+    若提供 compactor（Compactor），文件内容按场景配置的压缩模式缩减后再放入提示词。
+    raise_on_error 为 True 时，请求失败或返回内容无法解析均抛出 ModelAPIError，交由 RequestScheduler 重试。
+    传入 on_entry(file_path, summary) 时边接收边解析：缓存命中的摘要与模型返回的每个文件的摘要一经完整即回调，
+    返回值只包含成功解析的文件，截断或无法解析的文件由调用方单独重新排队；
+    响应中途出错时保留已解析的部分，只有一个文件也没有解析出来时才抛出异常整批重试。
+    endpoint 为多模型路由选定的命名端点，缓存键中的模型随之变化。
     """
+    started = time.monotonic()
+    batch_summary, miss_keys, messages = prepare_batch(file_paths, project_path, prompt_template, scenario, cache,
+                                                       compactor, endpoint)
+    parser = start_incremental(batch_summary, miss_keys, cache, on_entry) if on_entry is not None else None
+    if messages is None:
+        record_batch_metrics(len(file_paths), len(batch_summary), None, started)
+        return batch_summary
+    cache_hits = len(batch_summary)
+    response = error = None
+    try:
+        response = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG,
+                                  raise_on_error=raise_on_error, on_content=parser.feed if parser else None,
+                                  endpoint=endpoint)
+    except ModelAPIError as e:
+        if parser is None or not parser.entries:
+            raise
+        error = e
+    try:
+        if parser is not None:
+            return finish_incremental(batch_summary, parser, response, error, raise_on_error)
+        return finish_batch(batch_summary, miss_keys, response, cache, raise_on_error)
+    finally:
+        record_batch_metrics(len(file_paths), cache_hits, messages, started)
+
+async def summarize_files_batch_async(file_paths, project_path, prompt_template, scenario=None, cache=None,
+                                      raise_on_error=False, compactor=None, on_entry=None, endpoint=None):
+    """
+    summarize_files_batch 的异步版本：读取文件与查询缓存在线程中完成，
+    模型调用使用 call_model_api_async，所有批次共享一个事件循环与连接池。
+    """
+    import asyncio
+    started = time.monotonic()
+    batch_summary, miss_keys, messages = await asyncio.to_thread(
+        prepare_batch, file_paths, project_path, prompt_template, scenario, cache, compactor, endpoint)
+    parser = start_incremental(batch_summary, miss_keys, cache, on_entry) if on_entry is not None else None
+    if messages is None:
+        record_batch_metrics(len(file_paths), len(batch_summary), None, started)
+        return batch_summary
+    cache_hits = len(batch_summary)
+    response = error = None
+    try:
+        response = await call_model_api_async(messages, stream=True, big_model_log_path=BIG_MODEL_LOG,
+                                              raise_on_error=raise_on_error,
+                                              on_content=parser.feed if parser else None, endpoint=endpoint)
+    except ModelAPIError as e:
+        if parser is None or not parser.entries:
+            raise
+        error = e
+    try:
+        if parser is not None:
+            return finish_incremental(batch_summary, parser, response, error, raise_on_error)
+        return finish_batch(batch_summary, miss_keys, response, cache, raise_on_error)
+    finally:
+        record_batch_metrics(len(file_paths), cache_hits, messages, started)
+
+def record_batch_metrics(file_count, cache_hits, messages, started):
+    """记录批次规模（发送的文件数、提示词字符数）与耗时，耗时按批次规模分组以便对比"""
+    metrics = get_metrics()
+    if cache_hits:
+        metrics.inc("batch_cache_hits_total", cache_hits)
+    if messages is None:
+        return
+    chars = len(messages[0]["content"])
+    metrics.observe("batch_files", file_count - cache_hits, buckets=(1, 2, 5, 10, 20, 50, 100, 200))
+    metrics.observe("batch_input_chars", chars, buckets=(1000, 4000, 16000, 64000, 256000, 1000000))
+    metrics.observe("batch_seconds", time.monotonic() - started, size=size_class(chars))
+
+def prepare_batch(file_paths, project_path, prompt_template, scenario=None, cache=None, compactor=None,
+                  endpoint=None):
+    """
+    读取一批文件并构造请求消息，返回 (缓存命中的摘要, 未命中文件的缓存键, messages)；
+    全部命中缓存时 messages 为 None。启用压缩时缓存键中的场景带上压缩模式与参数，
+    与未压缩时生成的摘要互不混用。
+    """
+    batch_summary = {}
+    template_hash = prompt_template_hash(prompt_template) if cache else None
+    model_name = get_model_endpoint(endpoint).model_name if cache else None
+    cache_scenario = f"{scenario}+{compactor.cache_tag}" if compactor is not None else scenario
+    miss_keys = {}
     batch_content_list = []
     for fp in file_paths:
-        abs_fp = os.path.join(project_path, fp)
-        content = read_file_content(abs_fp)
+        chunk = parse_chunk_label(fp)
+        if chunk:
+            # 超长文件的分块：只读取对应行区间
+            rel, start_line, end_line = chunk
+            try:
+                content = read_chunk_content(os.path.join(project_path, rel), start_line, end_line)
+            except Exception as e:
+                logging.warning(f"读取文件分块 {fp} 失败：{e}")
+                content = ""
+        else:
+            content = read_file_content(os.path.join(project_path, fp))
+        if cache and content:
+            key = SummaryCache.make_key(content_hash(content.encode("utf-8")), cache_scenario, template_hash,
+                                        model_name)
+            cached = cache.get(key)
+            if cached is not None:
+                batch_summary[fp] = cached
+                if compactor is not None:
+                    compactor.discard(fp)
+                continue
+            miss_keys[fp] = key
+        if compactor is not None:
+            content = compactor.compact(fp, content, partial=bool(chunk))
         file_text = f"【文件路径：{fp}】\n【开始】\n{content}\n【结束】"
         batch_content_list.append(file_text)
+    if cache:
+        logging.info(f"批次摘要缓存：命中 {len(batch_summary)} 个，未命中 {len(batch_content_list)} 个")
+    if not batch_content_list:
+        return batch_summary, miss_keys, None
     batch_content = "\n===FILE_SEPARATOR===\n".join(batch_content_list)
     prompt = prompt_template.format(batch_content=batch_content)
     messages = [{"role": "user", "content": prompt}]
-    response = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG)
+    return batch_summary, miss_keys, messages
+
+def finish_batch(batch_summary, miss_keys, response, cache=None, raise_on_error=False):
+    """解析模型返回的批量摘要 JSON，合并到 batch_summary 并写回缓存"""
     if response is None:
         logging.error("批量文件摘要生成失败，返回结果为 None")
-        return {}
+        return batch_summary
     logging.info("批量文件摘要生成完成")
     response_clean = clean_response_text(response)
     try:
-        batch_summary = json.loads(response_clean)
+        model_summary = json.loads(response_clean)
     except Exception as e:
+        get_metrics().inc("batch_parse_errors_total")
         logging.error(f"解析批量摘要 JSON 失败：{e}")
         logging.error("大模型返回的文本为：")
         logging.error(response_clean)
-        batch_summary = {}
+        if raise_on_error:
+            raise ModelAPIError(f"解析批量摘要 JSON 失败：{e}") from e
+        model_summary = {}
+    for key, value in model_summary.items():
+        batch_summary[key] = value
+        if key in miss_keys and value:
+            cache.put(miss_keys[key], value)
     return batch_summary
 
-def split_and_summarize_final(initial_summary, aggregated, final_summary_prompt, max_len):
+def start_incremental(batch_summary, miss_keys, cache, on_entry):
+    """增量解析的准备：缓存命中的摘要立即回调；返回解析器，模型返回的每个文件摘要解析完成即写回缓存并回调"""
+    for key, value in list(batch_summary.items()):
+        on_entry(key, value)
+
+    def accept(key, value):
+        batch_summary[key] = value
+        if key in miss_keys and value:
+            cache.put(miss_keys[key], value)
+        on_entry(key, value)
+    return StreamingObjectParser(accept, loads=get_json_loads())
+
+def finish_incremental(batch_summary, parser, response, error=None, raise_on_error=False):
+    """
+    增量解析的收尾：记录被截断或无法解析的文件（由调用方重新排队）；
+    响应结构损坏且一个文件也没有解析出来时与 finish_batch 相同，抛出 ModelAPIError 整批重试
+    """
+    parser.finish()
+    parsed = len(parser.entries)
+    metrics = get_metrics()
+    if error is not None:
+        logging.warning(f"批量摘要响应中断（{error}），已保存 {parsed} 个文件的摘要")
+        metrics.inc("batch_partial_total", reason="interrupted")
+        return batch_summary
+    if response is None:
+        logging.error("批量文件摘要生成失败，返回结果为 None")
+        return batch_summary
+    if not parsed and not parser.complete:
+        metrics.inc("batch_parse_errors_total")
+        reason = parser.error or "未找到完整的 JSON 对象"
+        logging.error(f"解析批量摘要 JSON 失败：{reason}")
+        logging.error("大模型返回的文本为：")
+        logging.error(clean_response_text(response))
+        if raise_on_error:
+            raise ModelAPIError(f"解析批量摘要 JSON 失败：{reason}")
+        return batch_summary
+    if parser.malformed:
+        metrics.inc("batch_partial_total", reason="malformed")
+        logging.warning(f"以下文件的摘要无法解析：{', '.join(map(str, parser.malformed))}")
+    if not parser.complete:
+        metrics.inc("batch_partial_total", reason=("broken" if parser.error else "truncated"))
+        logging.warning(f"批量摘要响应不完整（{parser.error or '响应被截断'}），已保存 {parsed} 个文件的摘要")
+    else:
+        logging.info("批量文件摘要生成完成")
+    return batch_summary
+
+def split_and_summarize_final(initial_summary, entries, final_summary_prompt, max_len, endpoint=None):
     """
-    生成最终项目总结报告：
-      - 如果 aggregated 长度小于或等于 max_len，则直接带入 prompt 调用大模型生成最终总结；
-      - 否则，将 aggregated 拆分为 n_parts（n_parts = int(len(aggregated) / max_len) + 1）份，
+    生成最终项目总结报告（flat 模式）：
+      - 如果所有摘要条目拼接后长度小于或等于 max_len，则直接带入 prompt 调用大模型生成最终总结；
+      - 否则，按条目边界将摘要分为若干组（每组不超过 max_len，不会把单个文件摘要截断），
         分别调用大模型生成每个部分的精简摘要（使用 final_summary_prompt 模板，其中 {code_summaries} 替换为该部分），
         然后将所有部分的精简结果合并，再调用大模型生成最终总结报告。
     """
+    aggregated = "\n\n".join(entries)
     if len(aggregated) <= max_len:
         prompt = final_summary_prompt.format(initial_summary=initial_summary, code_summaries=aggregated)
         messages = [{"role": "user", "content": prompt}]
-        result = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG)
+        result = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG, endpoint=endpoint)
         return result
     else:
-        n_parts = int(len(aggregated) / max_len) + 1
-        logging.info(f"最终代码摘要长度 {len(aggregated)} 超过限制 {max_len}，拆分为 {n_parts} 份")
-        part_size = len(aggregated) // n_parts
+        groups = pack_entries(entries, max_len)
+        logging.info(f"最终代码摘要长度 {len(aggregated)} 超过限制 {max_len}，按条目边界拆分为 {len(groups)} 份")
         part_summaries = []
-        for i in range(n_parts):
-            start = i * part_size
-            if i == n_parts - 1:
-                part_text = aggregated[start:]
-            else:
-                part_text = aggregated[start: start + part_size]
+        for i, group in enumerate(groups):
+            part_text = "\n\n".join(group)
             logging.info(f"第 {i+1} 份摘要原始长度：{len(part_text)}")
             prompt = final_summary_prompt.format(initial_summary=initial_summary, code_summaries=part_text)
             messages = [{"role": "user", "content": prompt}]
-            part_result = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG)
+            part_result = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG, endpoint=endpoint)
             if part_result is None:
                 logging.error(f"第 {i+1} 份摘要生成失败")
                 part_result = ""
@@ -168,11 +352,11 @@ def split_and_summarize_final(initial_summary, aggregated, final_summary_prompt,
         logging.info(f"合并后摘要总长度：{len(combined)}")
         final_prompt = final_summary_prompt.format(initial_summary=initial_summary, code_summaries=combined)
         messages = [{"role": "user", "content": final_prompt}]
-        final_result = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG)
+        final_result = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG, endpoint=endpoint)
         logging.info(f"最终摘要生成成功，长度：{len(final_result) if final_result else 'None'}")
         return final_result
 
-def aggregate_final_summary(initial_summary, code_summaries, prompt_template, max_len):
+def aggregate_final_summary(initial_summary, code_summaries, prompt_template, max_len, endpoint=None):
     """
     将 readme.md 的内容作为初步总结，与所有代码文件的摘要整合，
     生成最终的项目总结报告。提示词格式如下：
@@ -181,58 +365,496 @@ def aggregate_final_summary(initial_summary, code_summaries, prompt_template, ma
       并给出与初步总结的对比备注。
     如果最终摘要部分超过 max_len，则对 aggregated 进行拆分求摘要。
     """
-    aggregated = "\n\n".join([f"【{fp}】\n{cs}" for fp, cs in code_summaries.items() if cs])
-    logging.info(f"最终代码摘要合集初始长度：{len(aggregated)}")
-    final_summary = split_and_summarize_final(initial_summary, aggregated, prompt_template, max_len)
+    entries = [format_entry(fp, cs) for fp, cs in code_summaries.items() if cs]
+    logging.info(f"最终代码摘要合集初始长度：{sum(len(e) for e in entries)}")
+    final_summary = split_and_summarize_final(initial_summary, entries, prompt_template, max_len, endpoint)
     return final_summary
 
-def update_structure_summary(node, file_rel, summary):
-    if node.get("type") == "file" and node.get("relative_path") == file_rel:
-        node["summaries"] = summary
-        node["need_traverse"] = False
-        logging.info(f"回填摘要到结构节点：{file_rel}，并将 need_traverse 设置为 False")
-        return True
-    if node.get("type") == "dir":
-        for child in node.get("children", []):
-            if update_structure_summary(child, file_rel, summary):
-                return True
-    return False
-
-def estimate_invocations(file_list, get_file_char_count, batch_threshold):
-    pending = file_list[:]  # 复制列表
-    count = 0
-    i = 0
-    while i < len(pending):
-        char_count = get_file_char_count(pending[i])
-        if char_count >= batch_threshold:
-            count += 1
-            i += 1
-        else:
-            total = char_count
-            i += 1
-            while i < len(pending) and total + get_file_char_count(pending[i]) <= batch_threshold:
-                total += get_file_char_count(pending[i])
-                i += 1
-            count += 1
-    return count
-
-def group_batches(pending_files, get_file_char_count, batch_threshold):
-    batches = []
-    current_batch = []
-    current_sum = 0
-    for fp in pending_files:
-        count = get_file_char_count(fp)
-        if current_sum + count <= batch_threshold:
-            current_batch.append(fp)
-            current_sum += count
+def compacted_char_count(compactor, project_path, file_rel):
+    """文件压缩后的字符数（用于装箱估算，压缩结果暂存在 compactor 中）；读取失败时返回 None"""
+    content = read_text(os.path.join(project_path, file_rel))
+    if content is None:
+        return None
+    return compactor.measure(file_rel, content)
+
+def scenario_prompts(summarizer_config, scenario):
+    """返回场景的 (batch_summary_prompt, final_summary_prompt)；场景不存在时抛出 ValueError"""
+    scenarios = summarizer_config.get("scenarios", {})
+    if scenario not in scenarios:
+        raise ValueError(f"配置文件中不包含场景 {scenario}")
+    scenario_conf = scenarios[scenario]
+    final_summary_prompt = scenario_conf.get("final_summary_prompt", "")
+    if final_summary_prompt == "":
+        logging.warning("当前场景的 final_summary_prompt 为空，请在配置文件中配置或选择其他场景。")
+    return scenario_conf.get("batch_summary_prompt", ""), final_summary_prompt
+
+class BatchSummarizer:
+    """
+    文件摘要阶段：调度器、摘要缓存、超长文件分块摘要的合并与进度统计，
+    summarize_project 与 summarize_streaming 共用。
+      - chunked：被切分文件 -> 分块标签列表（流式模式下随扫描增长）
+      - commit(file_rel, summary)：一个文件的摘要完成（分块文件在所有块到齐后合并提交一次）
+      - on_progress()：每个批次处理完后调用，用于压实进度日志
+      - total_batches：批次总数，流式模式下未知时为 None
+      - dedup：DedupIndex，代表文件的摘要提交后同时提交其变体（近似重复文件）的摘要
+      - compactor：Compactor，按场景配置压缩提示词中的文件内容，为 None 时原样发送
+      - router：ModelRouter（model_routing 开启时），批次按调用类别使用各自的模型端点与调度器并发池
+    incremental_parse 开启时（默认）每个文件的摘要在流式响应中一经完整即提交，不等整个批次结束；
+    响应截断或个别文件的摘要无法解析时，只把这些文件组成新批次重新排队；再次缺失的文件每个单独一个批次，
+    避免总是导致输出出错的文件拖累其他文件（每个文件最多重新排队 max_requeue 次）。
+    提交可能来自调度线程、工作线程或后台事件循环线程，由 _lock 串行化。
+    """
+
+    def __init__(self, summarizer_config, project_path, batch_summary_prompt, scenario, chunked,
+                 commit, on_progress=None, total_batches=None, dedup=None, compactor=None):
+        self.summarizer_config = summarizer_config
+        self.project_path = project_path
+        self.batch_summary_prompt = batch_summary_prompt
+        self.scenario = scenario
+        self.chunked = chunked
+        self.commit = commit
+        self.on_progress = on_progress
+        self.total_batches = total_batches
+        self.dedup = dedup
+        self.compactor = compactor
+        self.completed = 0
+        self._chunk_results = {}
+        self._lock = threading.RLock()
+        incremental_conf = summarizer_config.get("incremental_parse", {}) or {}
+        self.incremental = incremental_conf.get("enabled", True)
+        self.max_requeue = incremental_conf.get("max_requeue", 2)
+        self._requeued = {}
+        self.tokenizer = planner_settings(summarizer_config, batch_summary_prompt)[0]
+        self.router = ModelRouter.from_config(summarizer_config.get("model_routing"))
+
+        try:
+            max_workers = int(summarizer_config.get("max_concurrent_requests", "1"))
+        except Exception:
+            max_workers = 1
+        logging.info(f"最大并发请求数：{max_workers}")
+        # 调度器负责限流、失败重试与自适应并发；max_concurrent_requests 作为初始并发数
+        # 由 batch_run.py 批量启动时，所有项目共享编排器提供的全局并发与限流预算
+        self.scheduler = RequestScheduler.from_config(summarizer_config.get("scheduler"), max_workers,
+                                                      global_budget=connect_global_budget(),
+                                                      pools=self.router.pools() if self.router else None)
+        self.cache = open_summary_cache(summarizer_config.get("summary_cache"))
+
+    def accept(self, key, value):
+        """提交一个文件（或分块）的摘要；分块文件在所有块到齐后合并提交一次"""
+        with self._lock:
+            chunk = parse_chunk_label(key)
+            owner = chunk[0] if chunk and chunk[0] in self.chunked else None
+            if owner is None:
+                self._commit(key, value)
+                return
+            parts = self._chunk_results.setdefault(owner, {})
+            parts[key] = value
+            if len(parts) == len(self.chunked[owner]):
+                self._commit(owner, merge_chunk_summaries([parts[l] for l in self.chunked[owner]]))
+
+    def on_batch_done(self, batch, batch_result):
+        """一个批次完成；增量解析模式下摘要已逐条提交，返回需要重新排队的 [(文件列表, 预估 token 数)]"""
+        with self._lock:
+            self.completed += 1
+            requeue = []
+            if self.incremental:
+                missing = self._requeue_missing(batch, batch_result)
+                first = [label for label in missing if self._requeued[label] == 1]
+                groups = ([first] if first else []) + [[label] for label in missing if self._requeued[label] > 1]
+                requeue = [(group, self._estimate_tokens(group)) for group in groups]
+                if self.total_batches is not None:
+                    self.total_batches += len(groups)
+            else:
+                for key, value in batch_result.items():
+                    self.accept(key, value)
+            self.log_progress()
+            if self.on_progress:
+                self.on_progress()
+        return requeue
+
+    def _requeue_missing(self, batch, batch_result):
+        """批次中摘要缺失（响应截断、无法解析或模型遗漏）的文件，超过重新排队次数的保持待处理状态"""
+        missing, given_up = [], []
+        for label in batch:
+            if label in batch_result:
+                continue
+            count = self._requeued.get(label, 0) + 1
+            self._requeued[label] = count
+            (missing if count <= self.max_requeue else given_up).append(label)
+        if missing:
+            get_metrics().inc("batch_requeued_files_total", len(missing))
+            logging.warning(f"批次中 {len(missing)} 个文件的摘要缺失或无法解析，单独重新排队："
+                            f"{', '.join(missing[:5])}{' 等' if len(missing) > 5 else ''}")
+        if given_up:
+            logging.error(f"{len(given_up)} 个文件重新请求 {self.max_requeue} 次后仍未得到摘要，保持待处理状态，"
+                          f"下次运行时重新生成：{', '.join(given_up[:5])}{' 等' if len(given_up) > 5 else ''}")
+        return missing
+
+    def _estimate_tokens(self, labels):
+        """按文件大小粗略估算重新排队批次的 token 数（用于限流），分块按所属文件平均分摊"""
+        chars = 0
+        for label in labels:
+            chunk = parse_chunk_label(label)
+            rel = chunk[0] if chunk else label
+            try:
+                size = os.path.getsize(os.path.join(self.project_path, rel))
+            except OSError:
+                continue
+            chars += size // len(self.chunked.get(rel, [label])) if chunk else size
+        return self.tokenizer.estimate(chars)
+
+    def call_class(self, batch):
+        return self.router.classify(batch, self._estimate_tokens)
+
+    def _endpoint(self, batch):
+        """批次使用的模型端点；未开启多模型路由时为 None（默认配置）"""
+        if self.router is None:
+            return None
+        call_class = self.call_class(batch)
+        self.router.record(call_class)
+        return self.router.endpoint(call_class)
+
+    def _commit(self, file_rel, summary):
+        self.commit(file_rel, summary)
+        if self.dedup is not None and summary:
+            for variant, variant_summary in self.dedup.complete(file_rel, summary):
+                self.commit(variant, variant_summary)
+
+    def log_progress(self, final=False):
+        if self.total_batches is None:
+            logging.info(f"进度：已完成 {self.completed} 个批次")
+            return
+        progress = ((1 + self.completed + (1 if final else 0)) / (1 + self.total_batches + 1)) * 100
+        logging.info(f"进度：已完成 {progress:.1f}%")
+
+    @staticmethod
+    def on_batch_failed(batch, error):
+        logging.error(f"批次重试后仍失败（{error}），{len(batch)} 个文件保持待处理状态，下次运行时重新生成")
+
+    def run(self, batches, batch_tokens=None, feed=None):
+        """执行批次；feed 为 JobQueue 时还会处理生产者在扫描过程中投递的批次，直到队列关闭"""
+        scheduler = self.scheduler
+        started = time.monotonic()
+        on_entry = self.accept if self.incremental else None
+        classify = self.call_class if self.router is not None else None
+        if self.summarizer_config.get("async_requests", False) and async_client_available():
+            import asyncio
+            # 异步模式：所有批次在一个事件循环中并发执行，不为每个在途请求占用线程
+            logging.info("使用异步客户端并发处理批次")
+            configure_async_client(max_in_flight=scheduler.total_concurrency)
+
+            async def run_async():
+                try:
+                    await scheduler.run_async(
+                        batches,
+                        lambda batch: summarize_files_batch_async(batch, self.project_path, self.batch_summary_prompt,
+                                                                  self.scenario, self.cache, raise_on_error=True,
+                                                                  compactor=self.compactor, on_entry=on_entry,
+                                                                  endpoint=self._endpoint(batch)),
+                        self.on_batch_done, self.on_batch_failed, batch_tokens,
+                        feed=feed, classify=classify)
+                finally:
+                    await close_async_client()
+            asyncio.run(run_async())
         else:
-            if current_batch:
-                batches.append(current_batch)
-            current_batch = [fp]
-            current_sum = count
-    if current_batch:
-        batches.append(current_batch)
-    return batches
+            scheduler.run(
+                batches,
+                lambda batch: summarize_files_batch(batch, self.project_path, self.batch_summary_prompt,
+                                                    self.scenario, self.cache, raise_on_error=True,
+                                                    compactor=self.compactor, on_entry=on_entry,
+                                                    endpoint=self._endpoint(batch)),
+                self.on_batch_done, self.on_batch_failed, batch_tokens, feed=feed, classify=classify)
+        logging.info(f"批次调度完成：成功 {scheduler.stats['succeeded']}，失败 {scheduler.stats['failed']}，"
+                     f"重试 {scheduler.stats['retries']} 次，最终并发上限 {scheduler.limiter.current}")
+        if scheduler.pools:
+            logging.info("各调用类别的最终并发上限：" + "，".join(
+                f"{name} {limiter.current}" for name, (limiter, _) in scheduler.pools.items()))
+        self._finish(started)
+
+    def run_distributed(self, batches, batch_tokens, work_queue, context, poll_interval=1.0):
+        """
+        协调者模式：批次发布到 work_queue（WorkQueue），由其他进程或机器上的 worker 领取执行，
+        本进程轮询已完成的批次并按与 run() 相同的方式合并摘要、重新排队缺失的文件，所有批次结束后返回。
+        context 为 worker 执行批次所需的上下文（项目路径、场景与总结配置）。
+        """
+        started = time.monotonic()
+        max_attempts = self.scheduler.max_retries + 1
+        run_id = work_queue.publish(context, batches, batch_tokens, max_attempts)
+        logging.info(f"已发布 {len(batches)} 个批次到工作队列 {work_queue.db_path}（运行 {run_id}），等待 worker 执行")
+        if self.compactor is not None:
+            # 提示词由 worker 构造，装箱时暂存的压缩结果不再需要
+            self.compactor.clear()
+        stats = {"succeeded": 0, "failed": 0}
+        last_report = time.monotonic()
+        try:
+            while True:
+                for item in work_queue.take_finished(run_id):
+                    if item.state != "done":
+                        stats["failed"] += 1
+                        self.on_batch_failed(item.payload, item.error)
+                        continue
+                    stats["succeeded"] += 1
+                    if self.incremental:
+                        for key, value in item.result.items():
+                            self.accept(key, value)
+                    requeue = self.on_batch_done(item.payload, item.result)
+                    if requeue:
+                        work_queue.add_jobs(run_id, [group for group, _ in requeue],
+                                            [tokens for _, tokens in requeue], max_attempts)
+                counts = work_queue.counts(run_id)
+                if counts["pending"] == 0 and counts["leased"] == 0 and \
+                        counts["done"] + counts["failed"] == stats["succeeded"] + stats["failed"]:
+                    break
+                if time.monotonic() - last_report >= 30:
+                    logging.info(f"工作队列：待领取 {counts['pending']} 个批次，执行中 {counts['leased']} 个")
+                    last_report = time.monotonic()
+                time.sleep(poll_interval)
+        finally:
+            work_queue.close_run(run_id)
+        logging.info(f"分布式批次执行完成：成功 {stats['succeeded']}，失败 {stats['failed']}")
+        self._finish(started)
+
+    def _finish(self, started):
+        get_metrics().observe("stage_seconds", time.monotonic() - started, stage="summarize")
+        if self.compactor is not None:
+            # 失败的批次中未被取用的压缩结果不再保留
+            self.compactor.clear()
+            # 分布式模式下压缩在 worker 中进行，本进程没有统计
+            if self.compactor.stats["files"]:
+                logging.info(self.compactor.summary_line())
+        if self.cache:
+            logging.info(f"摘要缓存统计：命中 {self.cache.hits} 次，未命中 {self.cache.misses} 次")
+            self.cache.close()
+            self.cache = None
+
+def write_final_report(scan_data, scan_model, stage, journal, summarizer_config, final_summary_prompt,
+                       project_path, scan_json, output):
+    """生成最终项目总结报告并保存到扫描结果所在目录，关闭进度日志；返回 (最终总结文本, 报告文件路径)"""
+    # 使用 readme.md 的内容作为初步总结
+    initial_summary = extract_initial_summary_from_project_structure(scan_data.get("structure", {}), project_path)
+    if not initial_summary:
+        logging.warning("未在扫描结果中找到 readme.md，初步总结为空。")
+        initial_summary = ""
+    batch_threshold = summarizer_config.get("max_context_length", 100000) / 2
+
+    # 生成最终项目总结报告：tree 模式按目录树自底向上归约，flat 模式将全部文件摘要拼接后按条目边界拆分
+    reduce_conf = summarizer_config.get("final_reduce", {}) or {}
+    metrics = get_metrics()
+    # 多模型路由开启时，目录归约与最终总结使用 reduce 类别的端点与并发池
+    reduce_endpoint = stage.router.endpoint("reduce") if stage.router else None
+    if reduce_conf.get("mode", "tree") == "tree":
+        with metrics.stage("reduce"):
+            reducer = TreeReducer.from_config(scan_model, stage.scheduler, batch_threshold, reduce_conf, BIG_MODEL_LOG,
+                                              on_dir_summary=journal.record_dir, on_level_done=journal.maybe_compact,
+                                              endpoint=reduce_endpoint, pool="reduce" if stage.router else None)
+            reducer.run()
+            code_summaries = reducer.reduce_root()
+        logging.info(f"根目录代码摘要合集长度：{len(code_summaries)}")
+        final_prompt = final_summary_prompt.format(initial_summary=initial_summary, code_summaries=code_summaries)
+        messages = [{"role": "user", "content": final_prompt}]
+        with metrics.stage("final"):
+            final_summary = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG,
+                                           endpoint=reduce_endpoint)
+    else:
+        with metrics.stage("final"):
+            final_summary = aggregate_final_summary(initial_summary, scan_data.get("summaries", {}),
+                                                    final_summary_prompt, batch_threshold, reduce_endpoint)
+    journal.close()
+    stage.log_progress(final=True)
+    scan_results_dir = os.path.dirname(os.path.abspath(scan_json))
+    base_name = os.path.splitext(output)[0]
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    final_file_name = f"{base_name}_{timestamp}.md"
+    final_output_path = os.path.join(scan_results_dir, final_file_name)
+    with open(final_output_path, "w", encoding="utf-8") as f:
+        f.write(final_summary or "")
+    logging.info(f"最终项目总结报告已保存至 {final_output_path}")
+    # 文件摘要写入检索索引（只重写摘要发生变化的文件），供 codesense_query 查询
+    update_search_index(scan_results_dir, scan_model, summarizer_config.get("search_index"))
+    for line in summary_lines():
+        logging.info(line)
+    write_metrics_report(scan_results_dir, scan_data.get("project_name"), summarizer_config.get("metrics"))
+    return final_summary, final_output_path
+
+def summarize_project(scan_data, project_path, scan_json, summarizer_config, scenario="direct",
+                      output="final_project_summary.md", dry_run=False, work_queue=None):
+    """
+    对已加载的扫描结果生成文件摘要与最终项目总结报告，可在进程内直接调用（见 codesense_pipeline）。
+      scan_data: 扫描结果字典（原地回填摘要）
+      scan_json: 扫描结果文件路径，进度日志与报告写在其所在目录
+      summarizer_config: 已加载的总结工具配置字典
+    返回 (最终总结文本, 报告文件路径)；dry_run 时只输出批次划分预演，返回 (None, None)。
+    传入 work_queue（WorkQueue）时作为分布式总结的协调者：文件摘要批次由 worker 执行，本进程合并结果并生成最终报告。
+    场景不存在时抛出 ValueError。
+    """
+    batch_summary_prompt, final_summary_prompt = scenario_prompts(summarizer_config, scenario)
+
+    # 一次性建立 relative_path -> 节点 索引，后续查询与回填均为 O(1)
+    scan_model = ScanModel(scan_data)
+
+    # 启用压缩时按压缩后的长度装箱，同样的 token 预算可以装下更多文件
+    compactor = Compactor.from_config(summarizer_config, scenario)
+
+    def get_file_char_count(file_rel):
+        if compactor is not None:
+            count = compacted_char_count(compactor, project_path, file_rel)
+            if count is not None:
+                return count
+        return scan_model.get_char_count(file_rel, project_path)
+
+    pending_files = scan_model.collect_pending_files()
+    total_pending = len(pending_files)
+    logging.info(f"待处理文件数量（不包含 .md 文件且 need_traverse 为 True）：{total_pending}")
+
+    # 近似重复的文件只总结代表文件，其余文件复用代表文件的摘要
+    dedup = DedupIndex.from_config(summarizer_config.get("dedup"))
+    if dedup is not None:
+        pending_files = dedupe_pending(pending_files, project_path, dedup)
+        if dry_run:
+            print(dedup.summary_line())
+
+    plan = build_plan_from_config(pending_files, get_file_char_count, summarizer_config,
+                                  batch_summary_prompt, project_path)
+    batches = plan.batches
+    if compactor is not None:
+        # 超长文件按行区间分块发送，不会取用整文件的压缩结果
+        for file_rel in plan.chunked:
+            compactor.discard(file_rel)
+    logging.info(f"划分出 {len(batches)} 个批次")
+    for line in plan.summary_lines():
+        logging.info(line)
+    if dry_run:
+        for line in plan.summary_lines():
+            print(line)
+        return None, None
+
+    # 完成的摘要逐条追加到进度日志，定期压实到扫描结果文件，不再每个批次重写整个 JSON
+    journal = ProgressJournal.from_config(scan_json, scan_data, summarizer_config.get("journal"))
+
+    def commit_summary(file_rel, summary):
+        scan_model.update_summary(file_rel, summary)
+        journal.record_file(file_rel, summary)
+
+    # 超长文件被切分为多个块，所有块的摘要到齐后合并回填
+    stage = BatchSummarizer(summarizer_config, project_path, batch_summary_prompt, scenario, plan.chunked,
+                            commit_summary, on_progress=journal.maybe_compact, total_batches=len(batches),
+                            dedup=dedup, compactor=compactor)
+    if work_queue is not None:
+        context = {"project_name": scan_data.get("project_name"), "project_path": os.path.abspath(project_path),
+                   "scenario": scenario, "summarizer_config": summarizer_config}
+        stage.run_distributed(batches, plan.batch_tokens, work_queue, context)
+    else:
+        stage.run(batches, plan.batch_tokens)
+    return write_final_report(scan_data, scan_model, stage, journal, summarizer_config, final_summary_prompt,
+                              project_path, scan_json, output)
+
+def summarize_streaming(project_path, project_name, scan_config, summarizer_config, scenario="direct",
+                        output="project_structure.json", file_list_output="project_files.txt",
+                        final_output="final_project_summary.md", workers=None):
+    """
+    扫描与文件摘要重叠执行：扫描线程每发现一个待处理文件就交给 StreamingBatcher 装箱，
+    批次装满即投递给调度器开始调用模型，不必等整个目录树扫描完成。
+    扫描结束后照常合并上一次的结果并写入扫描结果文件，此前完成的摘要再回填并记入进度日志，
+    最终的扫描结果与先扫描、后总结得到的完全一致。返回 (最终总结文本, 报告文件路径)。
+    """
+    from codesense_scanner import ScanEngine, prepare_scan, finish_scan, fingerprint_changed
+
+    batch_summary_prompt, final_summary_prompt = scenario_prompts(summarizer_config, scenario)
+    _, scan_json, old_data = prepare_scan(project_path, project_name, output)
+    previous = ScanModel(old_data).files if old_data else {}
+
+    start = time.monotonic()
+    feed = JobQueue()
+    batcher = build_streaming_batcher(summarizer_config, batch_summary_prompt, feed.put, project_path)
+    # 扫描完成并写出扫描结果之前，完成的摘要先暂存，之后统一回填
+    lock = threading.Lock()
+    state = {"scan_data": None, "scan_model": None, "journal": None, "error": None, "buffered": []}
+
+    def commit_summary(file_rel, summary):
+        with lock:
+            if state["journal"] is None:
+                state["buffered"].append((file_rel, summary))
+                return
+        state["scan_model"].update_summary(file_rel, summary)
+        state["journal"].record_file(file_rel, summary)
+
+    def on_progress():
+        if stage.completed == 1:
+            logging.info(f"首个批次摘要完成，距开始 {time.monotonic() - start:.2f} 秒")
+        if state["journal"] is not None:
+            state["journal"].maybe_compact()
+
+    def is_pending(node):
+        # 与 merge_summaries + collect_pending_files 的判断一致：内容未变化且已有摘要（或已处理）的文件跳过
+        if node.get("name", "").lower().endswith(".md") or node.get("skip_reason"):
+            return False
+        old = previous.get(node.get("relative_path"))
+        if old is None or fingerprint_changed(old.get("fingerprint"), node.get("fingerprint")):
+            return True
+        return not old.get("summaries") and (old.get("need_traverse") is not False or bool(old.get("skip_reason")))
+
+    dedup = DedupIndex.from_config(summarizer_config.get("dedup"))
+    compactor = Compactor.from_config(summarizer_config, scenario)
+
+    def produce():
+        try:
+            engine = ScanEngine(scan_config, max_workers=workers, previous=previous)
+            pending = 0
+            for node in engine.stream(project_path):
+                file_rel = node["relative_path"]
+                if not is_pending(node):
+                    batcher.flush_expired()
+                    continue
+                content = None
+                if dedup is not None or compactor is not None:
+                    content = read_text(os.path.join(project_path, file_rel))
+                if dedup is not None and dedup.add(file_rel, content):
+                    # 变体文件：代表文件的摘要已完成时立即提交，否则在代表文件完成时提交
+                    ready = dedup.take_ready(file_rel)
+                    if ready is not None:
+                        commit_summary(file_rel, ready)
+                    batcher.flush_expired()
+                else:
+                    pending += 1
+                    char_count = node.get("character_count") or 0
+                    if compactor is not None and content is not None:
+                        char_count = compactor.measure(file_rel, content)
+                    batcher.add(file_rel, char_count)
+                    if compactor is not None and file_rel in batcher.chunked:
+                        compactor.discard(file_rel)
+            plan = batcher.finish()
+            if dedup is not None:
+                logging.info(dedup.summary_line())
+            logging.info(f"目录扫描完成，耗时 {time.monotonic() - start:.2f} 秒，读取 {engine.stats['read']} 个文件，"
+                         f"复用 {engine.stats['reused']} 个文件的指纹；待处理文件 {pending} 个，"
+                         f"已投递 {len(plan.batches)} 个批次，其中 {stage.completed} 个已完成")
+            for line in plan.summary_lines():
+                logging.info(line)
+            scan_data = finish_scan(project_name, engine.structure, scan_json, old_data, file_list_output)
+            scan_model = ScanModel(scan_data)
+            journal = ProgressJournal.from_config(scan_json, scan_data, summarizer_config.get("journal"))
+            with lock:
+                for file_rel, summary in state["buffered"]:
+                    scan_model.update_summary(file_rel, summary)
+                    journal.record_file(file_rel, summary)
+                state["buffered"].clear()
+                state.update(scan_data=scan_data, scan_model=scan_model, journal=journal)
+        except BaseException as e:
+            state["error"] = e
+        finally:
+            feed.close()
+
+    stage = BatchSummarizer(summarizer_config, project_path, batch_summary_prompt, scenario, batcher.chunked,
+                            commit_summary, on_progress=on_progress, dedup=dedup, compactor=compactor)
+    producer = threading.Thread(target=produce, name="codesense-stream-scan", daemon=True)
+    producer.start()
+    stage.run([], feed=feed)
+    producer.join()
+    if state["error"] is not None:
+        raise state["error"]
+    stage.total_batches = len(batcher.plan.batches)
+    return write_final_report(state["scan_data"], state["scan_model"], stage, state["journal"], summarizer_config,
+                              final_summary_prompt, project_path, scan_json, final_output)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -246,6 +868,7 @@ def main():
     parser.add_argument("--output", type=str, default="final_project_summary.md", help="最终总结报告输出文件名称")
     parser.add_argument("--scenario", type=str, choices=["direct", "correct", "usage", "custom"], default="direct",
                         help="选择总结场景")
+    parser.add_argument("--dry_run", action="store_true", help="只输出批次划分预演（预计调用次数与 token 数），不调用大模型")
     args = parser.parse_args()
 
     # 加载扫描结果 JSON
@@ -254,205 +877,16 @@ def main():
         logging.error(f"扫描结果文件 {args.scan_json} 不存在或内容为空")
         return
 
-    # 使用 readme.md 的内容作为初步总结
-    initial_summary = extract_initial_summary_from_project_structure(scan_data.get("structure", {}), args.project_path)
-    if not initial_summary:
-        logging.warning("未在扫描结果中找到 readme.md，初步总结为空。")
-        initial_summary = ""
-
     with open(args.summarizer_config, "r", encoding="utf-8") as f:
         summarizer_config = json.load(f)
     logging.info(f"加载总结工具配置文件：{args.summarizer_config}")
 
-    # 根据传入的 scenario 选择对应的配置项
-    scenarios = summarizer_config.get("scenarios", {})
-    if args.scenario not in scenarios:
-        logging.error(f"配置文件中不包含场景 {args.scenario}")
-        sys.exit(1)
-    scenario_conf = scenarios[args.scenario]
-    batch_summary_prompt = scenario_conf.get("batch_summary_prompt", "")
-    final_summary_prompt = scenario_conf.get("final_summary_prompt", "")
-    if final_summary_prompt == "":
-        logging.warning("当前场景的 final_summary_prompt 为空，请在配置文件中配置或选择其他场景。")
-    max_context = summarizer_config.get("max_context_length", 100000)
-    batch_threshold = max_context / 2
-
-    max_invocations = summarizer_config.get("max_invocations", None)
-    invocation_count = 0
-
-    def get_file_char_count(file_rel):
-        def recursive_search(node, target):
-            if node.get("relative_path") == target:
-                return node.get("character_count", 0) or 0
-            if node.get("type") == "dir":
-                for child in node.get("children", []):
-                    res = recursive_search(child, target)
-                    if res is not None:
-                        return res
-            return None
-        count = recursive_search(scan_data.get("structure", {}), file_rel)
-        if count is None:
-            abs_fp = os.path.join(args.project_path, file_rel)
-            try:
-                with open(abs_fp, "r", encoding="utf-8") as f:
-                    count = len(f.read())
-            except Exception:
-                count = 0
-        return count
-
-    def collect_pending_files(node, pending_list=None):
-        if pending_list is None:
-            pending_list = []
-        if node.get("type") == "file":
-            if (not node.get("name", "").lower().endswith(".md")) and node.get("need_traverse", True) and not node.get("summaries"):
-                pending_list.append(node.get("relative_path"))
-        elif node.get("type") == "dir":
-            for child in node.get("children", []):
-                collect_pending_files(child, pending_list)
-        return pending_list
-
-    pending_files = collect_pending_files(scan_data.get("structure", {}))
-    total_pending = len(pending_files)
-    logging.info(f"待处理文件数量（不包含 .md 文件且 need_traverse 为 True）：{total_pending}")
-
-    batches = group_batches(pending_files, lambda fp: get_file_char_count(fp), batch_threshold)
-    logging.info(f"划分出 {len(batches)} 个批次")
-
     try:
-        max_workers = int(summarizer_config.get("max_concurrent_requests", "1"))
-    except Exception:
-        max_workers = 1
-    logging.info(f"最大并发请求数：{max_workers}")
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_batch = {executor.submit(summarize_files_batch, batch, args.project_path, batch_summary_prompt): batch for batch in batches}
-        for future in as_completed(future_to_batch):
-            batch = future_to_batch[future]
-            try:
-                batch_result = future.result()
-                invocation_count += 1
-                for key, value in batch_result.items():
-                    scan_data["summaries"][key] = value
-                    update_structure_summary(scan_data["structure"], key, value)
-                progress = ((1 + invocation_count) / (1 + len(batches) + 1)) * 100
-                logging.info(f"进度：已完成 {progress:.1f}%")
-                save_scan_json(args.scan_json, scan_data)
-            except Exception as e:
-                logging.error(f"批次处理时发生异常：{e}")
-
-    # 生成最终项目总结报告：构建代码摘要合集
-    aggregated = "\n\n".join([f"【{fp}】\n{cs}" for fp, cs in scan_data.get("summaries", {}).items() if cs])
-    logging.info(f"聚合后的代码摘要合集长度：{len(aggregated)}")
-    # 如果 aggregated 长度超过阈值，则拆分
-    if len(aggregated) > batch_threshold:
-        logging.info("最终摘要文本超过限制，进行拆分求摘要")
-        final_summary = split_and_summarize_final(initial_summary, aggregated, final_summary_prompt, batch_threshold)
-    else:
-        final_prompt = final_summary_prompt.format(initial_summary=initial_summary, code_summaries=aggregated)
-        messages = [{"role": "user", "content": final_prompt}]
-        final_summary = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG)
-    invocation_count += 1
-    progress = ((1 + invocation_count) / (1 + len(batches) + 1)) * 100
-    logging.info(f"进度：已完成 {progress:.1f}%")
-    scan_results_dir = os.path.dirname(os.path.abspath(args.scan_json))
-    base_name = os.path.splitext(args.output)[0]
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    final_file_name = f"{base_name}_{timestamp}.md"
-    final_output_path = os.path.join(scan_results_dir, final_file_name)
-    with open(final_output_path, "w", encoding="utf-8") as f:
-        f.write(final_summary)
-    logging.info(f"最终项目总结报告已保存至 {final_output_path}")
-
-def split_and_summarize_final(initial_summary, aggregated, final_summary_prompt, max_len):
-    """
-    如果 aggregated 的长度超过 max_len，则拆分为 n_parts（n_parts = int(len(aggregated) / max_len) + 1）份，
-    分别使用 final_summary_prompt 模板（其中 {code_summaries} 替换为：
-        "部分1：\n{summary_front}\n部分2：\n{summary_back}\n"）
-    对每份调用模型生成部分摘要（每次调用都作为 final_summary 处理），
-    最后将所有部分摘要合并后再调用模型生成最终摘要。
-    """
-    if len(aggregated) <= max_len:
-        prompt = final_summary_prompt.format(initial_summary=initial_summary, code_summaries=aggregated)
-        messages = [{"role": "user", "content": prompt}]
-        return call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG)
-    else:
-        n_parts = int(len(aggregated) / max_len) + 1
-        logging.info(f"最终摘要聚合文本长度 {len(aggregated)} 超过限制 {max_len}，拆分为 {n_parts} 份")
-        part_size = len(aggregated) // n_parts
-        part_summaries = []
-        for i in range(n_parts):
-            start = i * part_size
-            if i == n_parts - 1:
-                part_text = aggregated[start:]
-            else:
-                part_text = aggregated[start: start + part_size]
-            logging.info(f"第 {i+1} 部分文本长度：{len(part_text)}")
-            # 构造每一部分的 prompt：将原提示模板中的 {code_summaries} 替换为拆分文本，{initial_summary} 保持
-            prompt = final_summary_prompt.format(initial_summary=initial_summary, code_summaries=f"部分1：\n{part_text}\n")
-            messages = [{"role": "user", "content": prompt}]
-            part_result = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG)
-            if part_result is None:
-                logging.error(f"第 {i+1} 部分摘要生成失败")
-                part_result = ""
-            else:
-                logging.info(f"第 {i+1} 部分摘要生成成功，摘要长度：{len(part_result)}")
-            part_summaries.append(part_result)
-        # 合并所有部分摘要，并生成一次最终摘要
-        combined_parts = "\n".join(part_summaries)
-        logging.info(f"合并所有部分摘要，总长度：{len(combined_parts)}")
-        final_prompt = final_summary_prompt.format(initial_summary=initial_summary, code_summaries=combined_parts)
-        messages = [{"role": "user", "content": final_prompt}]
-        final_result = call_model_api(messages, stream=True, big_model_log_path=BIG_MODEL_LOG)
-        logging.info(f"最终摘要生成成功，长度：{len(final_result) if final_result else 'None'}")
-        return final_result
-
-def update_structure_summary(node, file_rel, summary):
-    if node.get("type") == "file" and node.get("relative_path") == file_rel:
-        node["summaries"] = summary
-        node["need_traverse"] = False
-        logging.info(f"回填摘要到结构节点：{file_rel}，并将 need_traverse 设置为 False")
-        return True
-    if node.get("type") == "dir":
-        for child in node.get("children", []):
-            if update_structure_summary(child, file_rel, summary):
-                return True
-    return False
-
-def estimate_invocations(file_list, get_file_char_count, batch_threshold):
-    pending = file_list[:]  # 复制列表
-    count = 0
-    i = 0
-    while i < len(pending):
-        char_count = get_file_char_count(pending[i])
-        if char_count >= batch_threshold:
-            count += 1
-            i += 1
-        else:
-            total = char_count
-            i += 1
-            while i < len(pending) and total + get_file_char_count(pending[i]) <= batch_threshold:
-                total += get_file_char_count(pending[i])
-                i += 1
-            count += 1
-    return count
-
-def group_batches(pending_files, get_file_char_count, batch_threshold):
-    batches = []
-    current_batch = []
-    current_sum = 0
-    for fp in pending_files:
-        count = get_file_char_count(fp)
-        if current_sum + count <= batch_threshold:
-            current_batch.append(fp)
-            current_sum += count
-        else:
-            if current_batch:
-                batches.append(current_batch)
-            current_batch = [fp]
-            current_sum = count
-    if current_batch:
-        batches.append(current_batch)
-    return batches
+        summarize_project(scan_data, args.project_path, args.scan_json, summarizer_config,
+                          scenario=args.scenario, output=args.output, dry_run=args.dry_run)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
 
 def main_wrapper():
     parser = argparse.ArgumentParser(add_help=False)
@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+from codesense_search_index import SearchIndex, INDEX_FILE, update_search_index
+
+CODE_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_ROOT = os.path.join(CODE_ROOT, "scan_results")
+DEFAULT_SUMMARIZER_CONFIG = os.path.join(CODE_ROOT, "codesense_summarizer_config.json")
+
+
+def load_index_conf(summarizer_config=DEFAULT_SUMMARIZER_CONFIG):
+    """读取总结配置中的 search_index 段；配置文件不存在时使用默认设置"""
+    try:
+        with open(summarizer_config, "r", encoding="utf-8") as f:
+            return json.load(f).get("search_index", {}) or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def list_indexed_projects(results_root=DEFAULT_RESULTS_ROOT, index_file=INDEX_FILE):
+    """返回 results_root 下已建立检索索引的项目：[(项目名, 索引文件路径)]"""
+    projects = []
+    if not os.path.isdir(results_root):
+        return projects
+    for name in sorted(os.listdir(results_root)):
+        path = os.path.join(results_root, name, index_file)
+        if os.path.isfile(path):
+            projects.append((name, path))
+    return projects
+
+
+def search_projects(query, projects=None, results_root=DEFAULT_RESULTS_ROOT, limit=10, language=None,
+                    category=None, index_file=INDEX_FILE):
+    """
+    在多个项目的检索索引中查询，返回按 BM25 得分从高到低排列的前 limit 个文件：
+    [{"project", "path", "score", "language", "category", "snippet"}]。
+    projects 为项目名列表，None 表示 results_root 下所有已建立索引的项目；
+    各项目的得分按各自的文件数与平均长度计算，跨项目合并时直接按得分排序。
+    """
+    hits = []
+    for name, path in list_indexed_projects(results_root, index_file):
+        if projects is not None and name not in projects:
+            continue
+        index = SearchIndex(path, readonly=True)
+        try:
+            for hit in index.search(query, limit, language, category):
+                hit["project"] = name
+                hits.append(hit)
+        finally:
+            index.close()
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    return hits[:limit]
+
+
+def reindex_project(project_name, scan_json=None, results_root=DEFAULT_RESULTS_ROOT, index_conf=None):
+    """由已有的扫描结果（含未压实的进度日志）更新项目的检索索引，无需重新总结；扫描结果不存在时返回 None"""
+    from codesense_progress_journal import load_scan_json_with_journal
+    from codesense_scan_model import ScanModel
+    output_dir = os.path.join(results_root, project_name)
+    scan_json = scan_json or os.path.join(output_dir, "project_structure.json")
+    scan_data = load_scan_json_with_journal(scan_json)
+    if not scan_data:
+        logging.error(f"扫描结果文件 {scan_json} 不存在或内容为空")
+        return None
+    return update_search_index(output_dir, ScanModel(scan_data), dict(index_conf or {}, enabled=True))
+
+
+def format_hit(hit):
+    return (f"{hit['score']:>8.3f}  {hit['project']}/{hit['path']}  [{hit['language']}, {hit['category']}]\n"
+            f"          {hit['snippet']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeSense 摘要检索：在已扫描项目的文件摘要中按 BM25 查询相关文件")
+    parser.add_argument("query", nargs="?", help="查询内容（中英文均可，如 \"用户认证 token\"）")
+    parser.add_argument("--project", action="append", help="只在指定项目中查询（可重复），默认查询所有已建立索引的项目")
+    parser.add_argument("--limit", type=int, default=10, help="返回的文件数")
+    parser.add_argument("--language", type=str, help="只返回该语言的文件（如 python）")
+    parser.add_argument("--category", type=str, help="只返回该类别的文件（如 code）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--results_root", type=str, default=DEFAULT_RESULTS_ROOT, help="扫描结果根目录")
+    parser.add_argument("--summarizer_config", type=str, default=DEFAULT_SUMMARIZER_CONFIG,
+                        help="总结工具配置文件路径（读取其中的 search_index 段）")
+    parser.add_argument("--reindex", action="store_true",
+                        help="由 --project 指定项目的已有扫描结果更新检索索引（不调用大模型）")
+    parser.add_argument("--scan_json", type=str, help="--reindex 时使用的扫描结果文件，默认为项目目录下的 project_structure.json")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    index_conf = load_index_conf(args.summarizer_config)
+    index_file = index_conf.get("file", INDEX_FILE)
+
+    if args.reindex:
+        if not args.project:
+            parser.error("--reindex 需要通过 --project 指定项目")
+        for name in args.project:
+            if reindex_project(name, args.scan_json, args.results_root, index_conf) is None:
+                sys.exit(1)
+        if not args.query:
+            return
+    if not args.query:
+        parser.error("缺少查询内容")
+
+    started = time.perf_counter()
+    hits = search_projects(args.query, args.project, args.results_root, args.limit, args.language, args.category,
+                           index_file)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if args.json:
+        print(json.dumps({"query": args.query, "elapsed_ms": round(elapsed_ms, 2), "hits": hits},
+                         ensure_ascii=False, indent=2))
+        return
+    if not hits:
+        print(f"没有找到相关文件（{elapsed_ms:.1f} ms）")
+        return
+    for hit in hits:
+        print(format_hit(hit))
+    print(f"共 {len(hits)} 个结果，耗时 {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
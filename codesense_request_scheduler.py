@@ -0,0 +1,447 @@
+import time
+import heapq
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from model_api_client import ModelAPIError, is_retryable_error
+from codesense_metrics import get_metrics
+
+
+class TokenBucket:
+    """
+    令牌桶限流：同时限制每分钟请求数（requests_per_minute）与每分钟 token 数（tokens_per_minute），
+    任一项为 None 时不限制该项。reserve() 预占额度并返回需要等待的秒数，
+    同步与异步调用方分别用 time.sleep / asyncio.sleep 等待。
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self._lock = threading.Lock()
+        self._buckets = []
+        for limit in (requests_per_minute, tokens_per_minute):
+            if limit:
+                # [每秒补充量, 容量, 当前余量, 上次补充时间]
+                self._buckets.append([limit / 60.0, float(limit), float(limit), time.monotonic()])
+            else:
+                self._buckets.append(None)
+
+    def reserve(self, tokens=0):
+        amounts = (1, tokens)
+        wait = 0.0
+        with self._lock:
+            now = time.monotonic()
+            for bucket, amount in zip(self._buckets, amounts):
+                if bucket is None:
+                    continue
+                rate, capacity, level, last = bucket
+                level = min(capacity, level + (now - last) * rate)
+                # 单次请求超过容量时按容量计，避免永远等待
+                amount = min(amount, capacity)
+                level -= amount
+                bucket[2], bucket[3] = level, now
+                if level < 0:
+                    wait = max(wait, -level / rate)
+        return wait
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 自适应并发上限：
+      - 成功且延迟正常：加性增加（每个窗口约 +1）
+      - 单位 token 延迟超过历史基线的 latency_tolerance 倍：轻微下调（×0.9）
+      - 限流或服务端错误：乘性减半
+    上限始终在 [min_limit, max_limit] 之间。
+    """
+
+    def __init__(self, initial, min_limit=1, max_limit=32, latency_tolerance=2.0, enabled=True):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.enabled = enabled
+        self._baseline = None
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        return int(self.limit)
+
+    def on_success(self, latency, tokens):
+        if not self.enabled:
+            return
+        normalized = latency / max(1.0, tokens / 1000.0)
+        with self._lock:
+            if self._baseline is None or normalized < self._baseline:
+                self._baseline = normalized
+            else:
+                # 基线缓慢上浮，适应服务端整体变慢的情况
+                self._baseline = self._baseline * 0.99 + normalized * 0.01
+            if normalized > self._baseline * self.latency_tolerance:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def on_error(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.limit = max(self.min_limit, self.limit / 2)
+
+
+class BatchJob:
+    def __init__(self, index, payload, tokens, pool=None):
+        self.index = index
+        self.payload = payload
+        self.tokens = tokens
+        self.pool = pool
+        self.attempts = 0
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other):
+        return self.index < other.index
+
+
+class _PendingJobs:
+    """
+    一次调度中等待执行的任务，按并发池分队列：每个池的在途数不超过该池的并发上限，
+    某个池排满时其他池的任务仍可出队；pool 为 None 或未配置的池名使用调度器的默认并发上限。
+    """
+
+    def __init__(self, scheduler, classify=None):
+        self.scheduler = scheduler
+        self.classify = classify
+        self.next_index = 0
+        self.in_flight = 0
+        self._queues = {}
+        self._in_flight = {}
+
+    def __bool__(self):
+        return any(self._queues.values())
+
+    def add(self, payload, tokens):
+        """新任务（初始任务、生产者投递或 on_done 追加的任务），由 classify(payload) 决定所属的池"""
+        pool = self.scheduler.pool_name(self.classify(payload)) if self.classify is not None else None
+        self.push(BatchJob(self.next_index, payload, tokens, pool))
+        self.next_index += 1
+
+    def push(self, job):
+        self._queues.setdefault(job.pool, deque()).append(job)
+
+    def pop_ready(self):
+        """取出第一个所在池尚有并发余量的任务，没有时返回 None"""
+        for pool, queue in self._queues.items():
+            if queue and self._in_flight.get(pool, 0) < self.scheduler.limiter_for(pool).current:
+                self._in_flight[pool] = self._in_flight.get(pool, 0) + 1
+                self.in_flight += 1
+                return queue.popleft()
+        return None
+
+    def finished(self, job):
+        self._in_flight[job.pool] -= 1
+        self.in_flight -= 1
+
+
+class JobQueue:
+    """
+    由生产者线程逐步投递任务的队列，供 RequestScheduler.run(feed=...) / run_async(feed=...) 边生产边调度：
+    put() 投递一个任务并唤醒调度器，close() 表示不再有新任务；调度器在队列关闭且所有任务完成后返回。
+    生产者出错时也必须调用 close()，否则调度器会一直等待。
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.closed = False
+        self._items = deque()
+        self._waker = None
+
+    def put(self, payload, tokens=0):
+        with self.cond:
+            self._items.append((payload, tokens))
+            self.cond.notify_all()
+        if self._waker is not None:
+            self._waker()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self._waker is not None:
+            self._waker()
+
+    def drain(self):
+        """取出当前已投递的全部任务（调用方需持有 cond）"""
+        items = list(self._items)
+        self._items.clear()
+        return items
+
+
+class RequestScheduler:
+    """
+    位于总结流程与模型客户端之间的请求调度器：
+      - 令牌桶限制请求数 / token 数速率
+      - 可重试错误（429、5xx、网络与超时异常、响应无法解析）按指数退避 + 随机抖动重新排队，优先采用 Retry-After；
+        其余异常（4xx、配置缺项等程序或配置错误）不重试，直接失败
+      - AIMD 根据观测到的延迟与错误率动态调整并发上限
+    run() 使用线程池执行同步 worker，run_async() 在事件循环中执行协程 worker；传入 feed（JobQueue）时
+    除 payloads 外还会持续接收生产者投递的任务；
+    两者都在调用方线程中回调 on_done(payload, result) / on_failed(payload, error)，回调无需加锁；
+    on_done 可返回 [(payload, tokens)]，作为追加的任务排入队列（如只重新请求一个批次中缺失的文件）。
+    传入 global_budget（批量编排器提供的跨进程预算代理）时，每个请求还需先取得全局并发槽与全局限流额度。
+    pools 为 {池名: 池配置}（如多模型路由的各调用类别），run() / run_async() 传入 classify(payload) 返回任务所属的池名，
+    每个池有独立的自适应并发上限，池配置中给出 requests_per_minute / tokens_per_minute 时还有独立的令牌桶，
+    否则与默认池共用令牌桶。
+    """
+
+    def __init__(self, max_concurrency=32, initial_concurrency=4, min_concurrency=1,
+                 requests_per_minute=None, tokens_per_minute=None, max_retries=5,
+                 base_delay=1.0, max_delay=60.0, adaptive=True, latency_tolerance=2.0, global_budget=None,
+                 pools=None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.bucket = TokenBucket(requests_per_minute, tokens_per_minute)
+        self.limiter = AdaptiveConcurrency(initial_concurrency, min_concurrency, self.max_concurrency,
+                                           latency_tolerance, enabled=adaptive)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.global_budget = global_budget
+        self.stats = {"succeeded": 0, "failed": 0, "retries": 0}
+        self.pools = {}
+        for name, pool_conf in (pools or {}).items():
+            initial = pool_conf.get("max_concurrent_requests", initial_concurrency)
+            limiter = AdaptiveConcurrency(initial, pool_conf.get("min_concurrency", min_concurrency),
+                                          pool_conf.get("max_concurrency") or max(initial, self.max_concurrency),
+                                          latency_tolerance, enabled=pool_conf.get("adaptive", adaptive))
+            rpm, tpm = pool_conf.get("requests_per_minute"), pool_conf.get("tokens_per_minute")
+            self.pools[name] = (limiter, TokenBucket(rpm, tpm) if (rpm or tpm) else self.bucket)
+
+    @classmethod
+    def from_config(cls, scheduler_conf, max_concurrent_requests, global_budget=None, pools=None):
+        """
+        按总结工具配置中的 scheduler 段创建调度器；max_concurrent_requests 作为初始并发数，
+        pools 中未给出的并发参数同样取自 scheduler 段
+        """
+        conf = scheduler_conf or {}
+        return cls(
+            max_concurrency=conf.get("max_concurrency") or max(max_concurrent_requests, 32),
+            initial_concurrency=max_concurrent_requests,
+            min_concurrency=conf.get("min_concurrency", 1),
+            requests_per_minute=conf.get("requests_per_minute"),
+            tokens_per_minute=conf.get("tokens_per_minute"),
+            max_retries=conf.get("max_retries", 5),
+            base_delay=conf.get("base_delay", 1.0),
+            max_delay=conf.get("max_delay", 60.0),
+            adaptive=conf.get("adaptive", True),
+            latency_tolerance=conf.get("latency_tolerance", 2.0),
+            global_budget=global_budget,
+            pools=pools,
+        )
+
+    @property
+    def total_concurrency(self):
+        """默认池与各并发池的并发上限之和（线程池大小、异步客户端在途请求数上限）"""
+        return self.max_concurrency + sum(limiter.max_limit for limiter, _ in self.pools.values())
+
+    def pool_name(self, name):
+        return name if name in self.pools else None
+
+    def limiter_for(self, pool):
+        return self.pools[pool][0] if pool is not None else self.limiter
+
+    def bucket_for(self, pool):
+        return self.pools[pool][1] if pool is not None else self.bucket
+
+    def _record_limits(self):
+        metrics = get_metrics()
+        metrics.set("scheduler_concurrency_limit", self.limiter.current)
+        for name, (limiter, _) in self.pools.items():
+            metrics.set("scheduler_pool_concurrency_limit", limiter.current, pool=name)
+
+    def _acquire_global(self, tokens):
+        """取得全局预算，返回需要等待的限流秒数与是否需要释放；预算服务不可用时退回本进程限制"""
+        budget = self.global_budget
+        if budget is None:
+            return 0.0, False
+        try:
+            return budget.acquire(tokens), True
+        except Exception as e:
+            logging.error(f"全局请求预算服务不可用，之后仅使用本进程的并发与限流设置：{e}")
+            self.global_budget = None
+            return 0.0, False
+
+    def _release_global(self):
+        budget = self.global_budget
+        if budget is None:
+            return
+        try:
+            budget.release()
+        except Exception as e:
+            logging.error(f"释放全局请求预算失败：{e}")
+
+    def _backoff(self, job, error):
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            return min(self.max_delay, retry_after)
+        # Full Jitter：在 [0, min(max_delay, base * 2^attempt)] 内均匀取值
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** job.attempts)))
+
+    @staticmethod
+    def _requeue(job):
+        job.enqueued = time.monotonic()
+        return job
+
+    def _dispatched(self, job):
+        """任务出队时记录排队等待时间（重试任务从退避结束时算起）"""
+        get_metrics().observe("scheduler_queue_wait_seconds", time.monotonic() - job.enqueued)
+
+    def _handle_result(self, job, started, result, error, on_done, on_failed, delayed):
+        """处理一个已完成的任务，需要重试时放入 delayed 堆；返回 on_done 追加的任务"""
+        limiter = self.limiter_for(job.pool)
+        if error is None:
+            limiter.on_success(time.monotonic() - started, job.tokens)
+            self.stats["succeeded"] += 1
+            return on_done(job.payload, result) or ()
+        retryable = is_retryable_error(error)
+        if not retryable and not isinstance(error, ModelAPIError):
+            logging.error(f"批次 {job.index} 出现非临时性错误，不再重试：{error!r}", exc_info=error)
+        if isinstance(error, ModelAPIError) and (error.status_code == 429 or (error.status_code or 0) >= 500):
+            limiter.on_error()
+        job.attempts += 1
+        if retryable and job.attempts <= self.max_retries:
+            delay = self._backoff(job, error)
+            self.stats["retries"] += 1
+            get_metrics().inc("scheduler_retries_total")
+            logging.warning(f"批次 {job.index} 第 {job.attempts} 次失败（{error}），{delay:.1f} 秒后重试，"
+                            f"当前并发上限 {limiter.current}")
+            heapq.heappush(delayed, (time.monotonic() + delay, job))
+            return ()
+        self.stats["failed"] += 1
+        get_metrics().inc("scheduler_failed_total")
+        on_failed(job.payload, error)
+        return ()
+
+    def run(self, payloads, worker, on_done, on_failed, tokens=None, feed=None, classify=None):
+        """
+        使用线程池执行 worker(payload)；tokens 为每个任务预估的 token 数（用于限流与延迟归一化），
+        classify(payload) 返回任务所属的并发池名。
+        """
+        pending = _PendingJobs(self, classify)
+        for i, payload in enumerate(payloads):
+            pending.add(payload, tokens[i] if tokens else 0)
+        delayed = []
+        completed = deque()
+        cond = feed.cond if feed is not None else threading.Condition()
+
+        def execute(job):
+            wait, acquired = self._acquire_global(job.tokens)
+            if wait > 0:
+                time.sleep(wait)
+            started = time.monotonic()
+            try:
+                result, error = worker(job.payload), None
+            except Exception as e:
+                result, error = None, e
+            if acquired:
+                self._release_global()
+            with cond:
+                completed.append((job, started, result, error))
+                cond.notify()
+
+        with ThreadPoolExecutor(max_workers=self.total_concurrency) as executor:
+            while True:
+                with cond:
+                    while True:
+                        while completed:
+                            job, started, result, error = completed.popleft()
+                            pending.finished(job)
+                            for payload, job_tokens in self._handle_result(job, started, result, error, on_done,
+                                                                           on_failed, delayed):
+                                pending.add(payload, job_tokens)
+                        if feed is not None:
+                            for payload, job_tokens in feed.drain():
+                                pending.add(payload, job_tokens)
+                        now = time.monotonic()
+                        while delayed and delayed[0][0] <= now:
+                            pending.push(self._requeue(heapq.heappop(delayed)[1]))
+                        job = pending.pop_ready()
+                        if job is not None:
+                            break
+                        if (not pending and not delayed and pending.in_flight == 0
+                                and (feed is None or feed.closed)):
+                            self._record_limits()
+                            return self.stats
+                        timeout = delayed[0][0] - now if delayed else None
+                        cond.wait(timeout=timeout)
+                self._dispatched(job)
+                wait = self.bucket_for(job.pool).reserve(job.tokens)
+                if wait > 0:
+                    time.sleep(wait)
+                executor.submit(execute, job)
+
+    async def run_async(self, payloads, worker, on_done, on_failed, tokens=None, feed=None, classify=None):
+        """在当前事件循环中执行协程 worker(payload)，调度语义与 run() 相同"""
+        import asyncio
+        pending = _PendingJobs(self, classify)
+        for i, payload in enumerate(payloads):
+            pending.add(payload, tokens[i] if tokens else 0)
+        delayed = []
+        completed = deque()
+        wakeup = asyncio.Event()
+        tasks = set()
+
+        loop = asyncio.get_running_loop()
+        if feed is not None:
+            # 生产者线程投递任务后通过事件循环唤醒调度
+            feed._waker = lambda: loop.call_soon_threadsafe(wakeup.set)
+
+        async def execute(job):
+            # 全局预算的 acquire 是阻塞的跨进程调用，放到线程池中执行，不阻塞事件循环
+            wait, acquired = (await loop.run_in_executor(None, self._acquire_global, job.tokens)
+                              if self.global_budget is not None else (0.0, False))
+            if wait > 0:
+                await asyncio.sleep(wait)
+            started = time.monotonic()
+            try:
+                result, error = await worker(job.payload), None
+            except Exception as e:
+                result, error = None, e
+            if acquired:
+                await loop.run_in_executor(None, self._release_global)
+            completed.append((job, started, result, error))
+            wakeup.set()
+
+        while True:
+            while completed:
+                job, started, result, error = completed.popleft()
+                pending.finished(job)
+                for payload, job_tokens in self._handle_result(job, started, result, error, on_done, on_failed,
+                                                               delayed):
+                    pending.add(payload, job_tokens)
+            if feed is not None:
+                with feed.cond:
+                    closed = feed.closed
+                    for payload, job_tokens in feed.drain():
+                        pending.add(payload, job_tokens)
+            now = time.monotonic()
+            while delayed and delayed[0][0] <= now:
+                pending.push(self._requeue(heapq.heappop(delayed)[1]))
+            job = pending.pop_ready()
+            if job is not None:
+                self._dispatched(job)
+                wait = self.bucket_for(job.pool).reserve(job.tokens)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                task = asyncio.ensure_future(execute(job))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                continue
+            if not pending and not delayed and pending.in_flight == 0 and (feed is None or closed):
+                self._record_limits()
+                return self.stats
+            timeout = delayed[0][0] - now if delayed else None
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
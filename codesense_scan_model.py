@@ -0,0 +1,98 @@
+import os
+import logging
+
+
+class ScanModel:
+    """
+    扫描结果的内存模型：在 load_scan_json 之后一次性遍历 structure 树，
+    建立 relative_path -> 节点 的索引以及父节点链接，
+    之后的批次划分、字符数查询、待处理文件收集与摘要回填都通过索引以 O(1) 完成，
+    避免对每个文件都从根节点递归搜索整棵树。
+
+    说明：
+      - 文件节点与目录节点分别建立索引（"Permission Denied" 占位节点与其父目录共用 relative_path）
+      - files 按树的先序遍历顺序插入，迭代顺序与原先递归遍历一致
+      - 模型直接引用 scan_data 中的节点，回填摘要即修改原始字典，save_scan_json 无需额外转换
+    """
+
+    def __init__(self, scan_data):
+        self.data = scan_data
+        self.structure = scan_data.get("structure") or {}
+        if "summaries" not in self.data or self.data["summaries"] is None:
+            self.data["summaries"] = {}
+        self.files = {}
+        self.dirs = {}
+        self.parents = {}
+        self._build_index()
+
+    def _build_index(self):
+        """使用显式栈做先序遍历，建立文件 / 目录索引与父节点链接"""
+        if not self.structure:
+            return
+        stack = [(self.structure, None)]
+        while stack:
+            node, parent = stack.pop()
+            rel = node.get("relative_path")
+            node_type = node.get("type")
+            if node_type == "file":
+                self.files[rel] = node
+                self.parents[rel] = parent
+            elif node_type == "dir":
+                if rel not in self.dirs:
+                    self.dirs[rel] = node
+                    if parent is not None:
+                        self.parents.setdefault(rel, parent)
+                children = node.get("children", [])
+                for child in reversed(children):
+                    stack.append((child, node))
+        logging.debug(f"扫描结果索引建立完成：文件 {len(self.files)} 个，目录 {len(self.dirs)} 个")
+
+    def get_file(self, file_rel):
+        return self.files.get(file_rel)
+
+    def get_parent(self, rel_path):
+        return self.parents.get(rel_path)
+
+    def iter_files(self):
+        """按树的先序遍历顺序返回所有文件节点"""
+        return iter(self.files.values())
+
+    def get_char_count(self, file_rel, project_path=None):
+        """
+        查询文件字符数；若索引中不存在该文件且提供了 project_path，则回退到读取磁盘文件计算。
+        """
+        node = self.files.get(file_rel)
+        if node is not None:
+            return node.get("character_count", 0) or 0
+        if project_path is None:
+            return 0
+        abs_fp = os.path.join(project_path, file_rel)
+        try:
+            with open(abs_fp, "r", encoding="utf-8") as f:
+                return len(f.read())
+        except Exception:
+            return 0
+
+    def collect_pending_files(self):
+        """收集需要生成摘要的文件：非 .md、文本文件、need_traverse 为 True 且尚无 summaries"""
+        pending_list = []
+        for rel, node in self.files.items():
+            if node.get("name", "").lower().endswith(".md") or node.get("is_text") is False:
+                continue
+            if node.get("need_traverse", True) and not node.get("summaries"):
+                pending_list.append(rel)
+        return pending_list
+
+    def update_summary(self, file_rel, summary):
+        """
+        将摘要回填到结构节点，并将 need_traverse 设置为 False；
+        同时写入 scan_data["summaries"]。返回是否找到对应文件节点。
+        """
+        self.data["summaries"][file_rel] = summary
+        node = self.files.get(file_rel)
+        if node is None:
+            return False
+        node["summaries"] = summary
+        node["need_traverse"] = False
+        logging.info(f"回填摘要到结构节点：{file_rel}，并将 need_traverse 设置为 False")
+        return True
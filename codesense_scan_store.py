@@ -0,0 +1,613 @@
+import os
+import sys
+import json
+import mmap
+import array
+import bisect
+import hashlib
+import logging
+import argparse
+
+# 二进制扫描结果文件格式（.cstore）：
+#   [8 字节魔数][4 字节头长度][JSON 头][按 8 字节对齐的各个段]
+# JSON 头记录版本、字节序、节点数与各段的 (偏移, 字节数, 类型码)；段为定长列数组或字节块，
+# 打开时用 mmap 映射整个文件，列通过 memoryview.cast 零拷贝访问，只有实际访问到的节点才会被解码。
+STORE_MAGIC = b"CSSTORE\x01"
+STORE_VERSION = 2
+# 可读取的版本：版本 1 没有 skip_reason_id 列
+READABLE_VERSIONS = (1, 2)
+STORE_SUFFIX = ".cstore"
+
+NONE_ID = 0xFFFFFFFF
+
+# 节点标志位
+F_DIR = 1 << 0
+F_IS_TEXT = 1 << 1
+F_NEED_TRAVERSE = 1 << 2
+F_PATH_SAME_AS_PARENT = 1 << 3   # "Permission Denied" 占位节点，与父目录共用 relative_path
+F_PATH_ROOT = 1 << 4             # 根节点，relative_path 为空字符串
+F_HAS_FP_KEY = 1 << 5            # 节点含 fingerprint 字段（旧版扫描结果没有）
+F_FP_PRESENT = 1 << 6            # fingerprint 不为 None
+F_FP_HASH = 1 << 7               # fingerprint.hash 不为 None
+F_CHARS_PRESENT = 1 << 8         # character_count 不为 None
+F_HAS_SUMMARY = 1 << 9           # summaries 非空，存放在 blob 段
+F_HAS_DIR_SUMMARY = 1 << 10      # 目录摘要缓存，存放在 aux
+F_RAW_NODE = 1 << 11             # 非标准节点，完整字段（键值对列表）存放在 aux
+F_HAS_SKIP_REASON = 1 << 12      # 文件节点含 skip_reason 字段（扫描分诊跳过的原因，驻留在字符串表）
+
+FILE_KEYS = ["type", "name", "relative_path", "is_text", "character_count", "language", "category",
+             "need_traverse", "summaries", "fingerprint"]
+# 扫描分诊跳过的文件在末尾多一个 skip_reason 字段
+STANDARD_FILE_KEYS = (FILE_KEYS, FILE_KEYS[:-1], FILE_KEYS + ["skip_reason"], FILE_KEYS[:-1] + ["skip_reason"])
+DIR_KEYS = ["type", "name", "relative_path", "children"]
+
+# 段名 -> 类型码（"s" 表示字节块）
+COLUMNS = [
+    ("parent", "i"), ("first_child", "i"), ("next_sibling", "i"), ("flags", "H"),
+    ("name_id", "I"), ("language_id", "I"), ("category_id", "I"), ("skip_reason_id", "I"),
+    ("char_count", "q"), ("fp_size", "q"), ("fp_mtime", "q"),
+    ("summary_off", "Q"), ("summary_len", "I"), ("aux_off", "Q"), ("aux_len", "I"),
+]
+
+
+def is_scan_store(path):
+    return path.endswith(STORE_SUFFIX)
+
+
+def path_hash(rel_path):
+    return int.from_bytes(hashlib.blake2b(rel_path.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _join(parent_rel, name):
+    return os.path.join(parent_rel, name) if parent_rel else name
+
+
+def _is_hash_hex(value):
+    if not isinstance(value, str) or len(value) != 32:
+        return False
+    try:
+        return bytes.fromhex(value).hex() == value
+    except ValueError:
+        return False
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _standard_fingerprint(fp):
+    if fp is None:
+        return True
+    return (isinstance(fp, dict) and list(fp) == ["size", "mtime_ns", "hash"]
+            and _is_int(fp["size"]) and _is_int(fp["mtime_ns"])
+            and (fp["hash"] is None or _is_hash_hex(fp["hash"])))
+
+
+def _path_mode(node, parent_rel, is_root):
+    """返回路径标志（0 表示 parent/name），无法按规则还原时返回 None"""
+    rel = node.get("relative_path")
+    if is_root:
+        return F_PATH_ROOT if rel == "" else None
+    if rel == _join(parent_rel, node.get("name")):
+        return 0
+    if node.get("type") == "dir" and rel == parent_rel:
+        return F_PATH_SAME_AS_PARENT
+    return None
+
+
+class _StringTable:
+    """字符串驻留表：文件名、语言、类别等重复出现的字符串只存一份"""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, value):
+        if value is None:
+            return NONE_ID
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = len(self.strings)
+            self.ids[value] = sid
+            self.strings.append(value)
+        return sid
+
+    def encode(self):
+        offsets = array.array("I", [0])
+        data = bytearray()
+        for s in self.strings:
+            data += s.encode("utf-8")
+            offsets.append(len(data))
+        return offsets, bytes(data)
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_scan_store(scan_data):
+    """将扫描结果（load_scan_json 得到的字典）编码为 .cstore 字节串"""
+    cols = {name: array.array(code) for name, code in COLUMNS}
+    fp_hash = bytearray()
+    strings = _StringTable()
+    blob = bytearray()
+    paths = []
+
+    def put_blob(value):
+        data = _dumps(value)
+        offset = len(blob)
+        blob.extend(data)
+        return offset, len(data)
+
+    structure = scan_data.get("structure")
+    has_tree = isinstance(structure, dict) and structure.get("type") in ("file", "dir")
+    last_child = {}
+    if has_tree:
+        # 先序遍历，节点编号即遍历顺序；兄弟节点通过 first_child / next_sibling 串联
+        stack = [(structure, -1, "")]
+        while stack:
+            node, parent, parent_rel = stack.pop()
+            idx = len(paths)
+            is_dir = node.get("type") == "dir"
+            flags = F_DIR if is_dir else 0
+            mode = _path_mode(node, parent_rel, parent == -1)
+            keys = list(node)
+            standard = mode is not None and isinstance(node.get("name"), str)
+            if is_dir:
+                standard = standard and keys in (DIR_KEYS, DIR_KEYS + ["dir_summary"]) \
+                    and isinstance(node.get("children"), list)
+            else:
+                standard = (standard and keys in STANDARD_FILE_KEYS
+                            and isinstance(node["is_text"], bool)
+                            and isinstance(node.get("skip_reason", ""), str)
+                            and (node["character_count"] is None or _is_int(node["character_count"]))
+                            and isinstance(node["language"], str) and isinstance(node["category"], str)
+                            and isinstance(node["need_traverse"], bool)
+                            and _standard_fingerprint(node.get("fingerprint")))
+            rel = node.get("relative_path")
+            paths.append(rel)
+            cols["parent"].append(parent)
+            cols["first_child"].append(-1)
+            cols["next_sibling"].append(-1)
+            if parent >= 0:
+                prev = last_child.get(parent)
+                if prev is None:
+                    cols["first_child"][parent] = idx
+                else:
+                    cols["next_sibling"][prev] = idx
+                last_child[parent] = idx
+            name_id = language_id = category_id = skip_reason_id = NONE_ID
+            char_count = fp_size = fp_mtime = 0
+            digest = bytes(16)
+            summary_ref = (0, 0)
+            aux_ref = (0, 0)
+            if not standard:
+                flags |= F_RAW_NODE
+                aux_ref = put_blob([[k, (None if k == "children" else v)] for k, v in node.items()])
+            elif is_dir:
+                flags |= mode
+                name_id = strings.intern(node["name"])
+                if "dir_summary" in node:
+                    flags |= F_HAS_DIR_SUMMARY
+                    aux_ref = put_blob(node["dir_summary"])
+            else:
+                flags |= mode
+                name_id = strings.intern(node["name"])
+                language_id = strings.intern(node["language"])
+                category_id = strings.intern(node["category"])
+                if node["is_text"]:
+                    flags |= F_IS_TEXT
+                if node["need_traverse"]:
+                    flags |= F_NEED_TRAVERSE
+                if "skip_reason" in node:
+                    flags |= F_HAS_SKIP_REASON
+                    skip_reason_id = strings.intern(node["skip_reason"])
+                if node["character_count"] is not None:
+                    flags |= F_CHARS_PRESENT
+                    char_count = node["character_count"]
+                if node["summaries"] != {} or type(node["summaries"]) is not dict:
+                    flags |= F_HAS_SUMMARY
+                    summary_ref = put_blob(node["summaries"])
+                if "fingerprint" in node:
+                    flags |= F_HAS_FP_KEY
+                    fp = node["fingerprint"]
+                    if fp is not None:
+                        flags |= F_FP_PRESENT
+                        fp_size, fp_mtime = fp["size"], fp["mtime_ns"]
+                        if fp["hash"] is not None:
+                            flags |= F_FP_HASH
+                            digest = bytes.fromhex(fp["hash"])
+            cols["flags"].append(flags)
+            cols["name_id"].append(name_id)
+            cols["language_id"].append(language_id)
+            cols["category_id"].append(category_id)
+            cols["skip_reason_id"].append(skip_reason_id)
+            cols["char_count"].append(char_count)
+            cols["fp_size"].append(fp_size)
+            cols["fp_mtime"].append(fp_mtime)
+            fp_hash += digest
+            cols["summary_off"].append(summary_ref[0])
+            cols["summary_len"].append(summary_ref[1])
+            cols["aux_off"].append(aux_ref[0])
+            cols["aux_len"].append(aux_ref[1])
+            if is_dir:
+                for child in reversed(node.get("children") or []):
+                    stack.append((child, idx, rel if isinstance(rel, str) else ""))
+
+    # relative_path 哈希索引（按哈希排序），打开后可二分查找任意路径，无需建立字典
+    order = sorted(range(len(paths)), key=lambda i: path_hash(paths[i]) if isinstance(paths[i], str) else 0)
+    hash_col = array.array("Q", (path_hash(paths[i]) if isinstance(paths[i], str) else 0 for i in order))
+    hash_node = array.array("i", order)
+
+    # 顶层 summaries：与文件节点摘要相同的条目只记录节点编号，其余条目存入 meta
+    file_index = {}
+    for i, rel in enumerate(paths):
+        if not cols["flags"][i] & (F_DIR | F_RAW_NODE):
+            file_index.setdefault(rel, i)
+    summary_order = array.array("i")
+    extras = []
+    top_summaries = scan_data.get("summaries")
+    summaries_inline = not isinstance(top_summaries, dict)
+    if not summaries_inline:
+        for key, value in top_summaries.items():
+            i = file_index.get(key)
+            if i is not None and cols["flags"][i] & F_HAS_SUMMARY and \
+                    json.loads(blob[cols["summary_off"][i]:cols["summary_off"][i] + cols["summary_len"][i]]) == value:
+                summary_order.append(i)
+            else:
+                extras.append([key, value])
+                summary_order.append(-len(extras))
+    meta = {
+        "keys": list(scan_data),
+        "top": {k: v for k, v in scan_data.items()
+                if k not in ("structure", "summaries") or (k == "structure" and not has_tree)
+                or (k == "summaries" and summaries_inline)},
+        "summary_extras": extras,
+    }
+
+    str_offsets, str_data = strings.encode()
+    sections = [(name, code, cols[name].tobytes()) for name, code in COLUMNS]
+    sections += [
+        ("fp_hash", "s", bytes(fp_hash)),
+        ("str_offsets", "I", str_offsets.tobytes()),
+        ("str_data", "s", str_data),
+        ("blob", "s", bytes(blob)),
+        ("hash_col", "Q", hash_col.tobytes()),
+        ("hash_node", "i", hash_node.tobytes()),
+        ("summary_order", "i", summary_order.tobytes()),
+        ("meta", "s", _dumps(meta)),
+    ]
+    return _assemble(len(paths), sections)
+
+
+def _assemble(node_count, sections):
+    header = {"version": STORE_VERSION, "byteorder": sys.byteorder, "nodes": node_count, "sections": {}}
+    # 头长度依赖各段偏移，先用占位偏移估算头长度，再按对齐后的真实偏移生成最终头
+    for _ in range(2):
+        header_bytes = _dumps(header)
+        offset = _align(len(STORE_MAGIC) + 4 + len(header_bytes) + 64)
+        layout = {}
+        for name, code, data in sections:
+            layout[name] = [offset, len(data), code]
+            offset = _align(offset + len(data))
+        header["sections"] = layout
+    header_bytes = _dumps(header)
+    out = bytearray(STORE_MAGIC)
+    out += len(header_bytes).to_bytes(4, "little")
+    out += header_bytes
+    for name, code, data in sections:
+        start = header["sections"][name][0]
+        out += bytes(start - len(out))
+        out += data
+    return bytes(out)
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def write_scan_store(path, scan_data):
+    """编码并原子写入 .cstore 文件（临时文件 + fsync + os.replace）"""
+    data = encode_scan_store(scan_data)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+class ScanStore:
+    """
+    以 mmap 方式打开 .cstore 扫描结果，按需读取：
+      - 打开时只解析文件头并建立各列的零拷贝视图，耗时与项目规模基本无关
+      - find() 通过排序后的路径哈希二分查找节点，relative_path 由父节点链与驻留的文件名拼出
+      - get_char_count / collect_pending_files 与 ScanModel 同名方法语义一致，可直接用于批次划分预演
+      - node() 只物化单个节点；to_scan_data() 导出与 project_structure.json 完全一致的字典
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(STORE_MAGIC)] != STORE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} 不是有效的 CodeSense 扫描结果存储文件")
+        pos = len(STORE_MAGIC)
+        header_len = int.from_bytes(self._mm[pos:pos + 4], "little")
+        header = json.loads(self._mm[pos + 4:pos + 4 + header_len])
+        if header.get("version") not in READABLE_VERSIONS or header.get("byteorder") != sys.byteorder:
+            self.close()
+            raise ValueError(f"{path} 的版本或字节序与当前平台不兼容，请使用 JSON 格式重新扫描")
+        self.node_count = header["nodes"]
+        self._view = memoryview(self._mm)
+        self._sections = header["sections"]
+        for name, code in COLUMNS + [("str_offsets", "I"), ("hash_col", "Q"), ("hash_node", "i"),
+                                     ("summary_order", "i")]:
+            # 旧版本文件缺少的列为 None，对应的标志位不会被设置
+            setattr(self, "_" + name, self._section(name, code) if name in self._sections else None)
+        self._fp_hash = self._section("fp_hash")
+        self._str_data = self._section("str_data")
+        self._blob = self._section("blob")
+        self._meta = None
+        self._strings = {}
+        self._dir_paths = {}
+
+    def _section(self, name, code=None):
+        offset, length, _ = self._sections[name]
+        view = self._view[offset:offset + length]
+        return view.cast(code) if code else view
+
+    def close(self):
+        # 先释放各列视图，最后释放整个文件的视图，否则 mmap 无法关闭
+        for attr in reversed(list(vars(self))):
+            if attr != "_view" and isinstance(getattr(self, attr), memoryview):
+                getattr(self, attr).release()
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        if getattr(self, "_fh", None) is not None:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            self._meta = json.loads(self._section("meta").tobytes())
+        return self._meta
+
+    def string(self, sid):
+        if sid == NONE_ID:
+            return None
+        value = self._strings.get(sid)
+        if value is None:
+            value = self._str_data[self._str_offsets[sid]:self._str_offsets[sid + 1]].tobytes().decode("utf-8")
+            self._strings[sid] = value
+        return value
+
+    def _blob_value(self, offset, length):
+        return json.loads(self._blob[offset:offset + length].tobytes())
+
+    def _raw_pairs(self, i):
+        return self._blob_value(self._aux_off[i], self._aux_len[i])
+
+    def relative_path(self, i):
+        flags = self._flags[i]
+        if flags & F_RAW_NODE:
+            return dict(self._raw_pairs(i)).get("relative_path")
+        if flags & F_PATH_ROOT:
+            return ""
+        parent = self._parent[i]
+        if flags & F_DIR:
+            cached = self._dir_paths.get(i)
+            if cached is not None:
+                return cached
+        parent_rel = self.relative_path(parent) if parent >= 0 else ""
+        if flags & F_PATH_SAME_AS_PARENT:
+            rel = parent_rel
+        else:
+            rel = _join(parent_rel, self.string(self._name_id[i]))
+        if flags & F_DIR:
+            self._dir_paths[i] = rel
+        return rel
+
+    def is_dir(self, i):
+        flags = self._flags[i]
+        if flags & F_RAW_NODE:
+            return dict(self._raw_pairs(i)).get("type") == "dir"
+        return bool(flags & F_DIR)
+
+    def find(self, rel_path, want_dir=False):
+        """按 relative_path 查找节点编号，找不到返回 -1"""
+        h = path_hash(rel_path)
+        pos = bisect.bisect_left(self._hash_col, h)
+        while pos < len(self._hash_col) and self._hash_col[pos] == h:
+            i = self._hash_node[pos]
+            if self.is_dir(i) == want_dir and self.relative_path(i) == rel_path:
+                return i
+            pos += 1
+        return -1
+
+    def summary(self, i):
+        if self._flags[i] & F_RAW_NODE:
+            return dict(self._raw_pairs(i)).get("summaries")
+        if self._flags[i] & F_HAS_SUMMARY:
+            return self._blob_value(self._summary_off[i], self._summary_len[i])
+        return {}
+
+    def node(self, i, rel=None):
+        """物化单个节点（目录节点的 children 为空列表，由 to_scan_data 填充）"""
+        flags = self._flags[i]
+        if flags & F_RAW_NODE:
+            node = {}
+            for key, value in self._raw_pairs(i):
+                node[key] = [] if key == "children" else value
+            return node
+        if rel is None:
+            rel = self.relative_path(i)
+        name = self.string(self._name_id[i])
+        if flags & F_DIR:
+            node = {"type": "dir", "name": name, "relative_path": rel, "children": []}
+            if flags & F_HAS_DIR_SUMMARY:
+                node["dir_summary"] = self._blob_value(self._aux_off[i], self._aux_len[i])
+            return node
+        node = {
+            "type": "file",
+            "name": name,
+            "relative_path": rel,
+            "is_text": bool(flags & F_IS_TEXT),
+            "character_count": self._char_count[i] if flags & F_CHARS_PRESENT else None,
+            "language": self.string(self._language_id[i]),
+            "category": self.string(self._category_id[i]),
+            "need_traverse": bool(flags & F_NEED_TRAVERSE),
+            "summaries": self.summary(i),
+        }
+        if flags & F_HAS_FP_KEY:
+            if flags & F_FP_PRESENT:
+                node["fingerprint"] = {
+                    "size": self._fp_size[i],
+                    "mtime_ns": self._fp_mtime[i],
+                    "hash": self._fp_hash[i * 16:(i + 1) * 16].hex() if flags & F_FP_HASH else None,
+                }
+            else:
+                node["fingerprint"] = None
+        if flags & F_HAS_SKIP_REASON:
+            node["skip_reason"] = self.string(self._skip_reason_id[i])
+        return node
+
+    def get_file(self, file_rel):
+        i = self.find(file_rel)
+        return self.node(i) if i >= 0 else None
+
+    def get_char_count(self, file_rel, project_path=None):
+        """与 ScanModel.get_char_count 一致：存储中不存在该文件时可回退到读取磁盘文件"""
+        i = self.find(file_rel)
+        if i >= 0:
+            if self._flags[i] & F_RAW_NODE:
+                return self.node(i).get("character_count", 0) or 0
+            return self._char_count[i] if self._flags[i] & F_CHARS_PRESENT else 0
+        if project_path is None:
+            return 0
+        try:
+            with open(os.path.join(project_path, file_rel), "r", encoding="utf-8") as f:
+                return len(f.read())
+        except Exception:
+            return 0
+
+    def collect_pending_files(self):
+        """与 ScanModel.collect_pending_files 一致，仅扫描标志列，不物化节点"""
+        pending = []
+        seen = set()
+        for i in range(self.node_count):
+            flags = self._flags[i]
+            if flags & F_RAW_NODE:
+                node = self.node(i)
+                if node.get("type") != "file":
+                    continue
+                rel = node.get("relative_path")
+                ok = node.get("need_traverse", True) and not node.get("summaries") and node.get("is_text") is not False
+                name = node.get("name", "")
+            else:
+                if flags & F_DIR or not flags & F_NEED_TRAVERSE or flags & F_HAS_SUMMARY or not flags & F_IS_TEXT:
+                    continue
+                rel = self.relative_path(i)
+                ok = True
+                name = self.string(self._name_id[i])
+            # 与 ScanModel 的 relative_path 索引一致，同一路径只返回一次
+            if rel in seen:
+                continue
+            seen.add(rel)
+            if ok and not name.lower().endswith(".md"):
+                pending.append(rel)
+        return pending
+
+    def to_scan_data(self):
+        """无损导出为与 project_structure.json 相同的字典"""
+        meta = self.meta
+        nodes = [None] * self.node_count
+        rels = [None] * self.node_count
+        for i in range(self.node_count):
+            flags = self._flags[i]
+            parent = self._parent[i]
+            if flags & F_RAW_NODE:
+                node = self.node(i)
+                rel = node.get("relative_path")
+            else:
+                if flags & F_PATH_ROOT:
+                    rel = ""
+                elif flags & F_PATH_SAME_AS_PARENT:
+                    rel = rels[parent]
+                else:
+                    parent_rel = rels[parent] if parent >= 0 else ""
+                    rel = _join(parent_rel if isinstance(parent_rel, str) else "", self.string(self._name_id[i]))
+                node = self.node(i, rel)
+            rels[i] = rel
+            nodes[i] = node
+            if parent >= 0:
+                nodes[parent]["children"].append(node)
+        data = {}
+        extras = meta["summary_extras"]
+        for key in meta["keys"]:
+            if key == "structure" and key not in meta["top"]:
+                data[key] = nodes[0] if nodes else None
+            elif key == "summaries" and key not in meta["top"]:
+                summaries = {}
+                for ref in self._summary_order:
+                    if ref >= 0:
+                        summaries[rels[ref]] = nodes[ref]["summaries"]
+                    else:
+                        k, v = extras[-ref - 1]
+                        summaries[k] = v
+                data[key] = summaries
+            else:
+                data[key] = meta["top"][key]
+        return data
+
+
+def load_scan_store(path):
+    with ScanStore(path) as store:
+        return store.to_scan_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeSense 扫描结果二进制存储（.cstore）与 JSON 之间的转换")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_import = sub.add_parser("import", help="将 project_structure.json 转换为 .cstore")
+    p_import.add_argument("json_path")
+    p_import.add_argument("store_path")
+    p_export = sub.add_parser("export", help="将 .cstore 无损导出为 JSON")
+    p_export.add_argument("store_path")
+    p_export.add_argument("json_path")
+    p_info = sub.add_parser("info", help="查看 .cstore 的节点数、待处理文件数与各段大小")
+    p_info.add_argument("store_path")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    if args.command == "import":
+        with open(args.json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        size = write_scan_store(args.store_path, data)
+        logging.info(f"已写入 {args.store_path}：{size} 字节（JSON {os.path.getsize(args.json_path)} 字节）")
+    elif args.command == "export":
+        data = load_scan_store(args.store_path)
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        logging.info(f"已导出 {args.json_path}")
+    else:
+        with ScanStore(args.store_path) as store:
+            print(f"节点数：{store.node_count}，待处理文件数：{len(store.collect_pending_files())}")
+            for name, (offset, length, code) in store._sections.items():
+                print(f"  {name:<14}{length:>12} 字节")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,16 @@ import os
 import json
 import argparse
 import datetime
+import hashlib
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from codesense_scan_model import ScanModel
+from codesense_metrics import get_metrics, write_metrics_report
+from codesense_file_triage import FileTriage, DEFAULT_TRIAGE, SIZE_SKIP_REASONS, SKIP_BINARY
+from codesense_ignore import IgnoreMatcher
+from codesense_progress_journal import write_scan_data, journal_path_for, load_scan_json_with_journal
 
 # 默认全局配置（加载配置文件失败时使用）
 DEFAULT_CONFIG = {
@@ -35,105 +44,292 @@ DEFAULT_CONFIG = {
     "exclude_dirs": ["node_modules", "dist", "build", ".git", "__pycache__"],
     "binary_extensions": [
         ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".pdf", ".mp4", ".avi", ".exe", ".dll", ".zip", ".rar"
-    ]
+    ],
+    "use_gitignore": True,
+    "include": [],
+    "exclude": [],
+    "triage": DEFAULT_TRIAGE
 }
 
-def is_binary_file(file_path, binary_extensions):
-    """根据文件扩展名判断是否为二进制文件"""
-    ext = os.path.splitext(file_path)[1].lower()
-    return ext in binary_extensions
-
-def detect_language(file_name, languages_config):
-    """根据文件扩展名判断文件所属开发语言"""
-    ext = os.path.splitext(file_name)[1].lower()
-    for lang, exts in languages_config.items():
-        if ext in exts:
-            return lang
-    return "unknown"
+def content_hash(data):
+    """计算文件内容的快速哈希（blake2b，128 位），用于判断文件内容是否发生变化"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
 
-def detect_category(file_name, file_categories):
+def count_characters_in_bytes(data):
     """
-    根据文件名判断文件所属类别：
-    如果匹配到配置、依赖或运行时文件，则返回对应类别；否则默认为 "code"
+    计算 UTF-8 字节串在文本模式下读取得到的字符数，结果与以 UTF-8 文本模式读取文件后取 len() 完全一致：
+      - 纯 ASCII 内容无需解码，直接使用字节数
+      - 文本模式下的换行符转换会把 "\r\n" 合并为一个字符，因此需要减去其出现次数
+    若 UTF-8 解码失败则返回 None。
     """
-    base = os.path.basename(file_name)
-    for category, names in file_categories.items():
-        if base in names:
-            return category
-    return "code"
+    if data.isascii():
+        length = len(data)
+    else:
+        try:
+            length = len(data.decode("utf-8"))
+        except UnicodeDecodeError:
+            return None
+    return length - data.count(b"\r\n")
 
-def count_file_characters(file_path):
+def fingerprint_file(file_path, is_text, previous=None, triage=None):
     """
-    尝试以 UTF-8 编码读取文件，并返回字符数；
-    若读取失败则返回 None。
+    计算文件指纹 {"size", "mtime_ns", "hash"} 及字符数，返回 (character_count, fingerprint, was_read, skip_reason)：
+      - 先 stat；若 previous（上一次扫描的文件节点）的 size 与 mtime_ns 均未变化，则直接复用其字符数、哈希
+        与跳过原因，不读取文件
+      - 传入 triage（FileTriage）时先按大小分诊，命中（如超过 max_file_bytes）则不读取内容；
+        读取后再按内容分诊（NUL 字节、编码、压缩代码、生成代码标记）
+      - 否则读取文件内容，计算字符数与内容哈希
+      - 二进制文件不读取内容，hash 为 None，跳过原因为 "binary"
     """
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-            return len(content)
+        st = os.stat(file_path)
+    except OSError:
+        return None, None, False, None
+    fingerprint = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": None}
+    if not is_text:
+        return None, fingerprint, False, SKIP_BINARY
+    if previous and previous.get("is_text") == is_text:
+        prev_fp = previous.get("fingerprint") or {}
+        if prev_fp.get("size") == st.st_size and prev_fp.get("mtime_ns") == st.st_mtime_ns:
+            reason = None
+            if triage is not None:
+                reason = triage.classify_size(os.path.basename(file_path), st.st_size)
+                if reason is None and previous.get("skip_reason") not in SIZE_SKIP_REASONS:
+                    reason = previous.get("skip_reason")
+            # 上次因大小未读取、本次上限放宽的文件需要重新读取
+            if reason is not None or previous.get("skip_reason") not in SIZE_SKIP_REASONS:
+                fingerprint["hash"] = prev_fp.get("hash")
+                return previous.get("character_count"), fingerprint, False, reason
+    if triage is not None:
+        reason = triage.classify_size(os.path.basename(file_path), st.st_size)
+        if reason:
+            return None, fingerprint, False, reason
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
     except Exception:
-        return None
+        return None, fingerprint, False, None
+    fingerprint["hash"] = content_hash(data)
+    count = count_characters_in_bytes(data)
+    reason = triage.classify_content(data, count) if triage is not None else None
+    return count, fingerprint, True, reason
 
-def scan_directory(path, config, rel_path="", is_root=False):
+def fingerprint_changed(old_fp, new_fp):
     """
-    递归扫描目录，返回目录结构描述字典：
-      - 目录节点包含： type, name, relative_path, children
-      - 文件节点包含： type, name, relative_path, language, category, is_text, character_count,
-                         need_traverse, summaries
-    参数 is_root 用于第一次调用时，避免将项目根目录名称加入相对路径中。
+    判断文件内容是否发生变化：文本文件比较内容哈希（仅 mtime 变化不算修改），
+    二进制文件（无哈希）比较 size 与 mtime_ns。任一方缺少指纹时视为未变化，兼容旧版扫描结果。
     """
-    basename = os.path.basename(path)
-    # 根目录时不将名称加入 relative_path
-    current_rel_path = "" if is_root else (os.path.join(rel_path, basename) if rel_path else basename)
+    if not old_fp or not new_fp:
+        return False
+    if old_fp.get("hash") is not None or new_fp.get("hash") is not None:
+        return old_fp.get("hash") != new_fp.get("hash")
+    return old_fp.get("size") != new_fp.get("size") or old_fp.get("mtime_ns") != new_fp.get("mtime_ns")
 
-    # 判断是否扫描隐藏目录或文件（以 "." 开头）
-    if not config.get("scan_hidden", False) and basename.startswith('.'):
-        return None
+class ScanEngine:
+    """
+    基于 os.scandir 的并行扫描引擎：
+      - 目录遍历在调用线程中进行，使用 DirEntry 缓存的类型信息，避免对每个条目再调用 os.path.isdir
+      - 文件的 stat、字符统计与内容哈希分发到线程池中执行
+      - stream() 以生成器形式在文件节点统计完成后逐个产出，扫描结束后 structure 即为完整目录树
+      - 传入 previous（relative_path -> 上一次扫描的文件节点）时进行增量扫描：
+        stat 未变化的文件直接复用上次的字符数与指纹，不再读取
+    目录树的子节点顺序与 os.listdir 一致，文件节点额外带有 fingerprint 字段。
+    """
 
-    # 排除配置中指定的不扫描目录
-    if basename in config.get("exclude_dirs", []):
-        return None
+    def __init__(self, config, max_workers=None, chunk_size=64, previous=None):
+        self.config = config
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.chunk_size = chunk_size
+        self.previous = previous or {}
+        self.scan_hidden = config.get("scan_hidden", False)
+        self.exclude_dirs = set(config.get("exclude_dirs", []))
+        self.binary_extensions = set(config.get("binary_extensions", []))
+        # 预先展开为查找表，保持配置中"先匹配者优先"的语义
+        self.ext_language = {}
+        for lang, exts in config.get("languages", {}).items():
+            for ext in exts:
+                self.ext_language.setdefault(ext, lang)
+        self.name_category = {}
+        for category, names in config.get("file_categories", {}).items():
+            for name in names:
+                self.name_category.setdefault(name, category)
+        self.triage = FileTriage.from_config(config)
+        self.structure = None
+        self.stats = {"read": 0, "reused": 0, "skipped": {}, "ignored": 0}
 
-    if os.path.isdir(path):
-        dir_dict = {
-            "type": "dir",
-            "name": basename,
-            "relative_path": current_rel_path,
-            "children": []
-        }
-        try:
-            for entry in os.listdir(path):
-                full_path = os.path.join(path, entry)
-                child = scan_directory(full_path, config, current_rel_path, is_root=False)
-                if child is not None:
-                    dir_dict["children"].append(child)
-        except PermissionError:
-            dir_dict["children"].append({
-                "type": "dir",
-                "name": "Permission Denied",
-                "relative_path": current_rel_path,
-                "children": []
-            })
-        return dir_dict
-    else:
+    def _is_skipped(self, name):
+        if not self.scan_hidden and name.startswith('.'):
+            return True
+        return name in self.exclude_dirs
+
+    def _make_file_node(self, name, rel_path):
+        """构造文件节点；字符数与指纹稍后由线程池回填"""
         file_info = {
             "type": "file",
-            "name": basename,
-            "relative_path": current_rel_path,
+            "name": name,
+            "relative_path": rel_path,
         }
-        if is_binary_file(path, config.get("binary_extensions", [])):
-            file_info["is_text"] = False
-            file_info["character_count"] = None
-        else:
-            file_info["is_text"] = True
-            file_info["character_count"] = count_file_characters(path)
-        file_info["language"] = detect_language(basename, config.get("languages", {}))
-        file_info["category"] = detect_category(basename, config.get("file_categories", {}))
-        # 为每个文件增加预留字段，表示是否需要遍历文件内容，默认值为 True（是）
+        ext = os.path.splitext(name)[1].lower()
+        file_info["is_text"] = ext not in self.binary_extensions
+        file_info["character_count"] = None
+        file_info["language"] = self.ext_language.get(ext, "unknown")
+        file_info["category"] = self.name_category.get(name, "code")
         file_info["need_traverse"] = True
         file_info["summaries"] = {}
+        file_info["fingerprint"] = None
+        if not file_info["is_text"]:
+            # 按扩展名判定的二进制文件不读取、不生成摘要
+            self._skip(file_info, SKIP_BINARY)
+        elif self.triage is not None:
+            reason = self.triage.classify_path(rel_path, name)
+            if reason:
+                self._skip(file_info, reason)
         return file_info
 
+    def _skip(self, node, reason):
+        node["need_traverse"] = False
+        node["skip_reason"] = reason
+        self.stats["skipped"][reason] = self.stats["skipped"].get(reason, 0) + 1
+
+    def _fingerprint_many(self, items):
+        return [fingerprint_file(path, is_text, previous, self.triage) for path, is_text, previous in items]
+
+    def _submit(self, executor, pending, items):
+        """
+        将一个目录下的文件节点登记到 pending，并按 chunk_size 分组提交到线程池，
+        减少小文件场景下逐个提交任务的调度开销。
+        """
+        futures = []
+        for i in range(0, len(items), self.chunk_size):
+            chunk = items[i:i + self.chunk_size]
+            # 已按文件名分诊跳过的文件只做 stat，不读取内容
+            args = [(path, node["is_text"] and "skip_reason" not in node, self.previous.get(node["relative_path"]))
+                    for node, path in chunk]
+            futures.append((chunk, executor.submit(self._fingerprint_many, args)))
+        pending.append(([node for node, _ in items], futures))
+
+    def _resolve(self, futures, block):
+        """回填字符数与指纹；block 为 False 时若仍有任务未完成则返回 False"""
+        if not block and not all(f.done() for _, f in futures):
+            return False
+        for chunk, future in futures:
+            for (node, _), (count, fingerprint, was_read, reason) in zip(chunk, future.result()):
+                node["character_count"] = count
+                node["fingerprint"] = fingerprint
+                if reason and "skip_reason" not in node:
+                    self._skip(node, reason)
+                if was_read:
+                    self.stats["read"] += 1
+                elif fingerprint is not None and fingerprint.get("hash") is not None:
+                    self.stats["reused"] += 1
+        return True
+
+    def stream(self, path):
+        """
+        扫描 path，按发现顺序逐个产出已完成统计的文件节点；生成器耗尽后 self.structure 为完整目录树。
+        """
+        self.structure = None
+        basename = os.path.basename(path)
+        if self._is_skipped(basename):
+            return
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = []
+        started = time.monotonic()
+        file_count = 0
+        try:
+            if not os.path.isdir(path):
+                node = self._make_file_node(basename, "")
+                self.structure = node
+                self._submit(executor, pending, [(node, path)])
+            else:
+                self.structure = {
+                    "type": "dir",
+                    "name": basename,
+                    "relative_path": "",
+                    "children": []
+                }
+                # .gitignore 与 include / exclude 在进入目录时判断，被忽略的子目录不会被列出
+                matcher = IgnoreMatcher.from_config(path, self.config)
+                stack = [(path, self.structure, matcher.root_rules if matcher else ())]
+                while stack:
+                    dir_path, dir_dict, rules = stack.pop()
+                    parent_rel = dir_dict["relative_path"]
+                    sub_dirs = []
+                    items = []
+                    try:
+                        with os.scandir(dir_path) as it:
+                            entries = list(it)
+                        if matcher is not None:
+                            rules = matcher.rules_for_dir(dir_path, parent_rel, [e.name for e in entries], rules)
+                        for entry in entries:
+                            name = entry.name
+                            if self._is_skipped(name):
+                                continue
+                            rel = os.path.join(parent_rel, name) if parent_rel else name
+                            try:
+                                is_dir = entry.is_dir()
+                            except OSError:
+                                is_dir = False
+                            if matcher is not None and matcher.is_ignored(rel, name, is_dir, rules):
+                                self.stats["ignored"] += 1
+                                continue
+                            if is_dir:
+                                child = {
+                                    "type": "dir",
+                                    "name": name,
+                                    "relative_path": rel,
+                                    "children": []
+                                }
+                                dir_dict["children"].append(child)
+                                sub_dirs.append((entry.path, child, rules))
+                            else:
+                                file_count += 1
+                                node = self._make_file_node(name, rel)
+                                dir_dict["children"].append(node)
+                                items.append((node, entry.path))
+                    except PermissionError:
+                        dir_dict["children"].append({
+                            "type": "dir",
+                            "name": "Permission Denied",
+                            "relative_path": parent_rel,
+                            "children": []
+                        })
+                    if items:
+                        self._submit(executor, pending, items)
+                    # 逆序入栈，保持与递归版本一致的先序遍历顺序
+                    stack.extend(reversed(sub_dirs))
+                    # 产出已完成统计的文件节点，不阻塞目录遍历
+                    done = 0
+                    for nodes_done, futures in pending:
+                        if not self._resolve(futures, block=False):
+                            break
+                        yield from nodes_done
+                        done += 1
+                    if done:
+                        del pending[:done]
+            for nodes_done, futures in pending:
+                self._resolve(futures, block=True)
+                yield from nodes_done
+            pending.clear()
+            metrics = get_metrics()
+            metrics.observe("stage_seconds", time.monotonic() - started, stage="scan")
+            metrics.inc("scan_files_total", file_count or (1 if self.structure.get("type") == "file" else 0))
+            metrics.inc("scan_files_read_total", self.stats["read"])
+            metrics.inc("scan_files_reused_total", self.stats["reused"])
+            metrics.inc("scan_entries_ignored_total", self.stats["ignored"])
+            for reason, count in sorted(self.stats["skipped"].items()):
+                metrics.inc("scan_files_skipped_total", count, reason=reason)
+            if self.stats["skipped"]:
+                logging.info("分诊跳过的文件：" + "，".join(f"{r} {c} 个" for r, c in sorted(self.stats["skipped"].items())))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def scan(self, path):
+        """扫描 path 并返回完整目录树（根目录的 relative_path 为空字符串）"""
+        for _ in self.stream(path):
+            pass
+        return self.structure
+
 def generate_tree_markdown(node, indent=0):
     """
     递归生成 Markdown 格式的树状目录结构字符串
@@ -181,20 +377,28 @@ def setup_logging():
     )
     logging.info(f"日志记录初始化：日志文件 -> {log_file}")
 
-def merge_summaries(old_node, new_node):
+def merge_summaries(old_node, new_node, changed=None):
     """
     递归合并旧结构和新结构：
-      - 如果新节点为文件且旧节点已有 summaries，则保留旧 summaries，
+      - 如果新节点为文件且内容未变化（指纹哈希一致，或旧结构尚无指纹），则保留旧 summaries，
         同时如果旧节点的 need_traverse 为 False，则更新新节点状态为 False
-      - 对于目录，递归合并子节点
+      - 如果文件内容已变化，则丢弃旧摘要，保持 need_traverse 为 True，并将其相对路径加入 changed
+      - 对于目录，保留旧的目录摘要缓存（dir_summary，带输入签名，输入变化时总结阶段会自动重新生成），并递归合并子节点
     """
     if new_node.get("type") == "file":
         if old_node:
+            if fingerprint_changed(old_node.get("fingerprint"), new_node.get("fingerprint")):
+                if changed is not None:
+                    changed.add(new_node.get("relative_path"))
+                return new_node
             if old_node.get("summaries"):
                 new_node["summaries"] = old_node["summaries"]
-            if old_node.get("need_traverse") is False:
+            # 上次因分诊跳过（而非已总结）的文件，按本次分诊结果决定是否需要总结
+            if old_node.get("need_traverse") is False and not old_node.get("skip_reason"):
                 new_node["need_traverse"] = False
     elif new_node.get("type") == "dir":
+        if old_node and old_node.get("dir_summary"):
+            new_node["dir_summary"] = old_node["dir_summary"]
         old_children = {}
         if old_node and "children" in old_node:
             for child in old_node["children"]:
@@ -202,47 +406,53 @@ def merge_summaries(old_node, new_node):
         for child in new_node.get("children", []):
             rel = child.get("relative_path")
             if rel in old_children:
-                merge_summaries(old_children[rel], child)
+                merge_summaries(old_children[rel], child, changed)
     return new_node
 
-def save_scan_json_with_merge(scan_json_path, new_data):
+def load_previous_scan(scan_json_path):
+    """加载上一次的扫描结果（含总结阶段中断时未压实的进度日志），不存在或解析失败时返回 None"""
+    if not os.path.exists(scan_json_path):
+        return None
+    try:
+        return load_scan_json_with_journal(scan_json_path)
+    except Exception as e:
+        logging.error(f"加载已有扫描结果失败：{e}")
+        return None
+
+def save_scan_json_with_merge(scan_json_path, new_data, old_data=None):
     """
-    如果已有扫描结果文件存在，则先加载旧数据，并将旧数据（例如 summaries 和 need_traverse 状态）合并到 new_data，
-    然后写入 scan_json_path。
+    如果已有扫描结果（old_data，未传入时从 scan_json_path 加载），则将旧数据（例如 summaries 和 need_traverse 状态）
+    合并到 new_data，然后写入 scan_json_path。内容已变化的文件不保留旧摘要。
     """
-    if os.path.exists(scan_json_path):
+    if old_data is None:
+        old_data = load_previous_scan(scan_json_path)
+    if old_data:
         try:
-            with open(scan_json_path, "r", encoding="utf-8") as f:
-                old_data = json.load(f)
-            if "structure" in new_data and "structure" in old_data:
-                new_data["structure"] = merge_summaries(old_data["structure"], new_data["structure"])
+            changed = set()
+            if "structure" in new_data and old_data.get("structure"):
+                new_data["structure"] = merge_summaries(old_data["structure"], new_data["structure"], changed)
             if "summaries" in old_data:
-                new_data["summaries"].update(old_data["summaries"])
+                for rel, summary in old_data["summaries"].items():
+                    if rel not in changed:
+                        new_data["summaries"][rel] = summary
+            if changed:
+                logging.info(f"检测到 {len(changed)} 个文件内容发生变化，需重新生成摘要")
             logging.info("成功合并已有的扫描结果")
         except Exception as e:
             logging.error(f"合并已有扫描结果失败：{e}")
-    with open(scan_json_path, "w", encoding="utf-8") as f:
-        json.dump(new_data, f, ensure_ascii=False, indent=4)
+    write_scan_data(scan_json_path, new_data)
+    # 进度日志中的记录已随旧数据合并进新的扫描结果，删除后避免被重放到新结构上
+    journal_path = journal_path_for(scan_json_path)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
     logging.info(f"保存扫描结果至 {scan_json_path}")
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="CodeSense 代码扫描工具：生成项目目录结构及文件属性"
-    )
-    parser.add_argument("--project_name", type=str, default="CodeSense", help="项目名称 (默认: CodeSense)")
-    parser.add_argument("--path", type=str, required=True, help="待扫描的项目根目录路径")
-    parser.add_argument("--output", type=str, default="project_structure.json", help="输出 JSON 文件名称")
-    parser.add_argument("--tree_output", type=str, default="project_tree.md", help="输出树状目录的 Markdown 文件名称")
-    parser.add_argument("--file_list_output", type=str, default="project_files.txt", help="输出所有文件相对路径的文本文件名称")
-    parser.add_argument("--config", type=str, default=None, help="全局配置文件路径 (JSON格式)，默认加载 codesense_config.json")
-    args = parser.parse_args()
-
-    setup_logging()
-
-    # 加载全局配置
-    if args.config:
-        config_path = args.config
-    else:
+def load_scan_config(project_path, config_path=None):
+    """
+    加载全局配置（默认 codesense_config.json，失败时使用默认配置），
+    再用项目根目录下的 codesense_project_config.json 覆盖
+    """
+    if config_path is None:
         config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "codesense_config.json")
     try:
         with open(config_path, "r", encoding="utf-8") as cf:
@@ -250,10 +460,10 @@ def main():
         logging.info(f"加载全局配置文件：{config_path}")
     except Exception as e:
         logging.error(f"加载全局配置文件失败，将使用默认配置。错误信息：{e}")
-        config = DEFAULT_CONFIG
+        config = dict(DEFAULT_CONFIG)
 
     # 检查项目根目录下是否存在项目级配置文件 codesense_project_config.json
-    project_config_path = os.path.join(args.path, "codesense_project_config.json")
+    project_config_path = os.path.join(project_path, "codesense_project_config.json")
     if os.path.exists(project_config_path):
         try:
             with open(project_config_path, "r", encoding="utf-8") as pcf:
@@ -262,42 +472,92 @@ def main():
             logging.info("已加载项目级配置文件 codesense_project_config.json")
         except Exception as e:
             logging.error(f"加载项目级配置文件失败，继续使用全局配置。错误信息：{e}")
+    return config
 
-    if not os.path.exists(args.path):
-        logging.error(f"错误：提供的待扫描路径 {args.path} 不存在。")
-        return
-
-    # 确定输出目录
+def prepare_scan(project_path, project_name="CodeSense", output="project_structure.json"):
+    """
+    准备扫描输出：创建 scan_results/<project_name>/，加载上一次的扫描结果用于增量扫描。
+    返回 (输出目录, 扫描结果文件路径, 上一次的扫描结果或 None)。项目路径不存在时抛出 FileNotFoundError。
+    """
+    if not os.path.exists(project_path):
+        raise FileNotFoundError(f"错误：提供的待扫描路径 {project_path} 不存在。")
     code_root = os.path.dirname(os.path.abspath(__file__))
-    base_output = os.path.join(code_root, "scan_results")
-    if not os.path.exists(base_output):
-        os.makedirs(base_output)
-    output_dir = os.path.join(base_output, args.project_name)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    # 扫描指定项目目录（第一次调用时 is_root=True，不将项目根目录名称加入相对路径）
-    directory_structure = scan_directory(args.path, config, rel_path="", is_root=True)
+    output_dir = os.path.join(code_root, "scan_results", project_name)
+    os.makedirs(output_dir, exist_ok=True)
+    json_output_path = os.path.join(output_dir, output)
+    return output_dir, json_output_path, load_previous_scan(json_output_path)
 
+def finish_scan(project_name, directory_structure, json_output_path, old_data=None,
+                file_list_output="project_files.txt"):
+    """构造扫描结果字典，与上一次的结果合并后写入 json_output_path，并输出文件列表；返回扫描结果字典"""
     # 构造最终项目结构 JSON，其中每个文件节点包含预留字段 need_traverse 和 summaries
     project_structure = {
-        "project_name": args.project_name,
+        "project_name": project_name,
         "structure": directory_structure,
         "need_traverse": True,
         "summaries": {}
     }
 
-    json_output_path = os.path.join(output_dir, args.output)
     # 使用合并策略保存扫描结果，避免覆盖之前的记录
-    save_scan_json_with_merge(json_output_path, project_structure)
-    print(f"项目结构及文件信息已保存至 {json_output_path}")
+    save_scan_json_with_merge(json_output_path, project_structure, old_data)
 
-    file_list = collect_file_names(directory_structure)
-    file_list_output_path = os.path.join(output_dir, args.file_list_output)
+    file_list = collect_file_names(project_structure["structure"])
+    file_list_output_path = os.path.join(os.path.dirname(json_output_path), file_list_output)
     with open(file_list_output_path, "w", encoding="utf-8") as f:
         for file_name in file_list:
             f.write(file_name + "\n")
     logging.info(f"文件列表已保存至 {file_list_output_path}")
+    return project_structure
+
+def scan_project(project_path, project_name="CodeSense", config=None, output="project_structure.json",
+                 file_list_output="project_files.txt", workers=None):
+    """
+    扫描项目并与上一次的扫描结果合并，写入 scan_results/<project_name>/ 下的扫描结果与文件列表。
+    config 为 None 时按 load_scan_config 加载。返回 (合并后的扫描结果字典, 扫描结果文件路径)，
+    可直接交给 codesense_project_summarizer.summarize_project，无需重新读取文件。
+    项目路径不存在时抛出 FileNotFoundError。
+    """
+    if config is None:
+        config = load_scan_config(project_path)
+    _, json_output_path, old_data = prepare_scan(project_path, project_name, output)
+    previous_files = ScanModel(old_data).files if old_data else None
+
+    # 扫描指定项目目录（根目录名称不加入相对路径），字符统计由线程池并行完成；
+    # 上一次的扫描结果用于增量扫描：stat 未变化的文件不再读取
+    start_time = datetime.datetime.now()
+    engine = ScanEngine(config, max_workers=workers, previous=previous_files)
+    directory_structure = engine.scan(project_path)
+    logging.info(f"目录扫描完成，耗时 {(datetime.datetime.now() - start_time).total_seconds():.2f} 秒，"
+                 f"读取 {engine.stats['read']} 个文件，复用 {engine.stats['reused']} 个文件的指纹")
+
+    project_structure = finish_scan(project_name, directory_structure, json_output_path, old_data, file_list_output)
+    return project_structure, json_output_path
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="CodeSense 代码扫描工具：生成项目目录结构及文件属性"
+    )
+    parser.add_argument("--project_name", type=str, default="CodeSense", help="项目名称 (默认: CodeSense)")
+    parser.add_argument("--path", type=str, required=True, help="待扫描的项目根目录路径")
+    parser.add_argument("--output", type=str, default="project_structure.json",
+                        help="输出扫描结果文件名称，扩展名为 .cstore 时保存为二进制列式存储")
+    parser.add_argument("--tree_output", type=str, default="project_tree.md", help="输出树状目录的 Markdown 文件名称")
+    parser.add_argument("--file_list_output", type=str, default="project_files.txt", help="输出所有文件相对路径的文本文件名称")
+    parser.add_argument("--config", type=str, default=None, help="全局配置文件路径 (JSON格式)，默认加载 codesense_config.json")
+    parser.add_argument("--workers", type=int, default=None, help="字符统计线程数 (默认: min(32, CPU 核数 + 4))")
+    args = parser.parse_args()
+
+    setup_logging()
+
+    config = load_scan_config(args.path, args.config)
+    try:
+        _, json_output_path = scan_project(args.path, args.project_name, config, output=args.output,
+                                           file_list_output=args.file_list_output, workers=args.workers)
+    except FileNotFoundError as e:
+        logging.error(str(e))
+        return
+    print(f"项目结构及文件信息已保存至 {json_output_path}")
+    write_metrics_report(os.path.dirname(json_output_path), args.project_name)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
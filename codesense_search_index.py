@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import math
+import heapq
+import sqlite3
+import hashlib
+import logging
+
+from codesense_metrics import get_metrics
+
+INDEX_FILE = "search_index.sqlite"
+# 分词规则或字段权重的存储方式变化时递增，旧索引自动重建
+INDEX_VERSION = 1
+DEFAULT_FIELD_WEIGHTS = {"path": 2.0, "summary": 1.0, "language": 1.0, "category": 1.0}
+
+# 英文 / 数字单词与连续的中日韩文字
+_WORD = re.compile(r"[A-Za-z0-9]+|[㐀-䶿一-鿿豈-﫿]+")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def tokenize(text):
+    """
+    分词：英文与数字转为小写，驼峰标识符另外按大小写切分（getUserName -> getusername / get / user / name），
+    中文按相邻两字切分（bigram），单个汉字保留原样；下划线与路径中的 / . - 均为分隔符。
+    """
+    tokens = []
+    for m in _WORD.finditer(text or ""):
+        word = m.group()
+        if word[0] < "㐀":
+            lower = word.lower()
+            tokens.append(lower)
+            parts = _CAMEL.findall(word)
+            if len(parts) > 1:
+                tokens.extend(p.lower() for p in parts)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def summary_text(summary):
+    """摘要转为可检索的文本：字符串原样返回，字典与列表（如 usage 场景的结构化摘要）展开所有键和值"""
+    if summary is None:
+        return ""
+    if isinstance(summary, str):
+        return summary
+    if isinstance(summary, dict):
+        parts = ((k, summary_text(v)) for k, v in summary.items())
+        return "\n".join(f"{k}: {text}" for k, text in parts if text)
+    if isinstance(summary, (list, tuple)):
+        return "\n".join(filter(None, map(summary_text, summary)))
+    return str(summary)
+
+
+def make_snippet(text, terms, width=120):
+    """截取摘要中第一个命中词附近的片段"""
+    text = " ".join(text.split())
+    lower = text.lower()
+    hits = [i for i in (lower.find(t) for t in terms) if i >= 0]
+    start = max(0, min(hits) - width // 4) if hits else 0
+    snippet = text[start:start + width]
+    return ("…" if start > 0 else "") + snippet + ("…" if start + width < len(text) else "")
+
+
+class SearchIndex:
+    """
+    一个项目的文件摘要全文检索索引（SQLite，保存在扫描结果目录下）：
+      - docs：每个有摘要的文件一行，记录路径、语言、类别、摘要原文、加权长度与内容签名
+      - postings：倒排表 (词, 文件) -> 加权词频，主键按词聚簇，查询一个词只需一次范围扫描
+    路径、摘要、语言、类别分别分词，词频按 field_weights 加权后合并（路径中的命中默认权重更高），
+    查询时按 BM25（参数 k1、b）打分。update() 按签名只重写摘要、语言或类别发生变化的文件，并删除已不存在的文件。
+    readonly 为 True 时以只读方式打开已有索引（查询端），字段权重以索引中记录的为准。
+    """
+
+    def __init__(self, db_path, field_weights=None, k1=1.2, b=0.75, readonly=False):
+        self.db_path = db_path
+        self.field_weights = dict(DEFAULT_FIELD_WEIGHTS, **(field_weights or {}))
+        self.k1 = k1
+        self.b = b
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            return
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " id INTEGER PRIMARY KEY,"
+            " path TEXT NOT NULL UNIQUE,"
+            " language TEXT,"
+            " category TEXT,"
+            " summary TEXT NOT NULL,"
+            " length REAL NOT NULL,"
+            " signature TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL,"
+            " doc_id INTEGER NOT NULL,"
+            " tf REAL NOT NULL,"
+            " PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id)")
+        self._conn.commit()
+        self._check_layout()
+
+    @classmethod
+    def from_config(cls, output_dir, conf=None):
+        """由总结配置中的 "search_index" 段打开 output_dir 下的索引文件"""
+        conf = conf or {}
+        return cls(os.path.join(output_dir, conf.get("file", INDEX_FILE)), conf.get("field_weights"),
+                   conf.get("k1", 1.2), conf.get("b", 0.75))
+
+    def _get_meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _check_layout(self):
+        """索引版本或字段权重与当前设置不一致时清空索引（下一次 update 全量重建）"""
+        layout = {"version": INDEX_VERSION, "field_weights": self.field_weights}
+        if self._get_meta("layout") == layout:
+            return
+        if self._get_meta("layout") is not None:
+            logging.info(f"检索索引的版本或字段权重已变化，重建索引：{self.db_path}")
+        self._conn.execute("DELETE FROM postings")
+        self._conn.execute("DELETE FROM docs")
+        self._set_meta("layout", layout)
+        self._set_meta("stats", {"docs": 0, "total_length": 0.0})
+        self._conn.commit()
+
+    def _weighted_terms(self, rel, node, text):
+        counts = {}
+        fields = (("path", rel), ("summary", text), ("language", node.get("language")),
+                  ("category", node.get("category")))
+        for field, value in fields:
+            weight = self.field_weights.get(field, 0.0)
+            if not weight or not value:
+                continue
+            for token in tokenize(value):
+                counts[token] = counts.get(token, 0.0) + weight
+        return counts
+
+    def update(self, files):
+        """
+        files 为 {相对路径: 文件节点}（ScanModel.files），有摘要的文件进入索引；
+        返回 {"added", "updated", "removed", "unchanged"} 统计
+        """
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        existing = {path: (doc_id, signature) for doc_id, path, signature
+                    in self._conn.execute("SELECT id, path, signature FROM docs")}
+        seen = set()
+        conn = self._conn
+        for rel, node in files.items():
+            text = summary_text(node.get("summaries"))
+            if not text.strip():
+                continue
+            seen.add(rel)
+            signature = hashlib.blake2b("\x1f".join([text, node.get("language") or "", node.get("category") or ""])
+                                        .encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+            old = existing.get(rel)
+            if old is not None and old[1] == signature:
+                stats["unchanged"] += 1
+                continue
+            counts = self._weighted_terms(rel, node, text)
+            length = sum(counts.values())
+            if old is not None:
+                doc_id = old[0]
+                conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+                conn.execute("UPDATE docs SET language = ?, category = ?, summary = ?, length = ?, signature = ? "
+                             "WHERE id = ?", (node.get("language"), node.get("category"), text, length, signature,
+                                              doc_id))
+                stats["updated"] += 1
+            else:
+                doc_id = conn.execute("INSERT INTO docs (path, language, category, summary, length, signature) "
+                                      "VALUES (?, ?, ?, ?, ?, ?)",
+                                      (rel, node.get("language"), node.get("category"), text, length,
+                                       signature)).lastrowid
+                stats["added"] += 1
+            conn.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                             [(term, doc_id, tf) for term, tf in counts.items()])
+        removed = [(doc_id,) for path, (doc_id, _) in existing.items() if path not in seen]
+        if removed:
+            conn.executemany("DELETE FROM postings WHERE doc_id = ?", removed)
+            conn.executemany("DELETE FROM docs WHERE id = ?", removed)
+            stats["removed"] = len(removed)
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+        self._set_meta("stats", {"docs": count, "total_length": total})
+        conn.commit()
+        return stats
+
+    def search(self, query, limit=10, language=None, category=None):
+        """
+        按 BM25 返回最相关的 limit 个文件：[{"path", "score", "language", "category", "snippet"}]，
+        language / category 不为 None 时只返回该语言 / 类别的文件
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        stats = self._get_meta("stats", {"docs": 0, "total_length": 0.0})
+        n = stats["docs"]
+        if not terms or not n:
+            return []
+        avg_length = (stats["total_length"] / n) or 1.0
+        k1, b = self.k1, self.b
+        scores = {}
+        for term in terms:
+            rows = self._conn.execute(
+                "SELECT p.doc_id, p.tf, d.length, d.language, d.category FROM postings p "
+                "JOIN docs d ON d.id = p.doc_id WHERE p.term = ?", (term,)).fetchall()
+            if not rows:
+                continue
+            # 文档频率按全部文件计算，语言 / 类别过滤只影响返回哪些文件
+            df = len(rows)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for doc_id, tf, length, doc_language, doc_category in rows:
+                if (language is not None and doc_language != language) or \
+                        (category is not None and doc_category != category):
+                    continue
+                norm = tf + k1 * (1.0 - b + b * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / norm
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        hits = []
+        for doc_id, score in ranked:
+            path, doc_language, doc_category, summary = self._conn.execute(
+                "SELECT path, language, category, summary FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            hits.append({"path": path, "score": round(score, 4), "language": doc_language, "category": doc_category,
+                         "snippet": make_snippet(summary, terms)})
+        return hits
+
+    def doc_count(self):
+        return self._get_meta("stats", {"docs": 0})["docs"]
+
+    def close(self):
+        self._conn.close()
+
+
+def update_search_index(output_dir, scan_model, index_conf=None):
+    """
+    总结结束时增量更新 output_dir（scan_results/<项目名>/）下的检索索引；
+    未启用时跳过，失败只记录错误，不影响总结结果
+    """
+    conf = index_conf or {}
+    if not conf.get("enabled", True):
+        return None
+    try:
+        index = SearchIndex.from_config(output_dir, conf)
+        try:
+            stats = index.update(scan_model.files)
+        finally:
+            index.close()
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"更新检索索引失败：{e}")
+        return None
+    metrics = get_metrics()
+    for outcome in ("added", "updated", "removed"):
+        if stats[outcome]:
+            metrics.inc("search_index_docs_total", stats[outcome], outcome=outcome)
+    logging.info(f"检索索引已更新：新增 {stats['added']} 个文件，更新 {stats['updated']} 个，删除 {stats['removed']} 个，"
+                 f"未变化 {stats['unchanged']} 个")
+    return stats
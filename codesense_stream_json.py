@@ -0,0 +1,184 @@
+import re
+import json
+
+# 字符串外需要关注的字符，与字符串内需要关注的字符（引号与转义）
+_STRUCTURAL = re.compile(r'["{}\[\],:]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = " \t\r\n"
+
+
+class StreamingObjectParser:
+    """
+    流式响应正文的增量解析：模型输出的是一个 JSON 对象（可带 ```json 代码块标记或前后说明文字），
+    每收到一段正文就调用 feed(text)，对象的某个成员（"文件路径": 摘要）完整到达时立即回调 on_entry(key, value)，
+    不必等整个响应结束再统一 json.loads。
+      - entries：已解析的成员
+      - malformed：值无法解析的成员键名（跳过后继续解析后续成员）
+      - complete：顶层对象是否已闭合；finish() 之后仍为 False 说明响应被截断
+      - error：对象结构损坏（如键名不是字符串）时的说明，此后的内容不再解析
+    只扫描新到达的字符，字符串内用正则跳到下一个引号或转义符，整体为线性时间。
+    """
+
+    def __init__(self, on_entry=None, loads=None):
+        self.on_entry = on_entry
+        self.loads = loads or json.loads
+        self.entries = {}
+        self.malformed = []
+        self.complete = False
+        self.error = None
+        self._buf = ""
+        self._pos = 0
+        self._state = "prefix"   # prefix / key / colon / value / after
+        self._in_string = False
+        self._escape = False
+        self._depth = 0
+        self._start = None       # 当前键或值在 _buf 中的起始位置
+        self._key = None
+
+    @property
+    def done(self):
+        return self.complete or self.error is not None
+
+    def feed(self, text):
+        if self.done or not text:
+            return
+        self._buf += text
+        self._scan()
+        # 已处理的前缀超过缓冲区一半时丢弃，缓冲区只保留当前未完成的键或值（均摊线性）
+        keep = self._start if self._start is not None else self._pos
+        if keep > 0 and keep * 2 >= len(self._buf):
+            self._buf = self._buf[keep:]
+            self._pos -= keep
+            if self._start is not None:
+                self._start = 0
+
+    def finish(self):
+        """响应结束，返回已解析的成员；对象或字符串类型的值在闭合时即已回调，截断处之前的成员不受影响"""
+        self._buf = ""
+        return self.entries
+
+    def _emit(self, text):
+        key = self._key
+        try:
+            value = self.loads(text)
+        except ValueError:
+            self.malformed.append(key)
+            return
+        self.entries[key] = value
+        if self.on_entry is not None:
+            self.on_entry(key, value)
+
+    def _scan(self):
+        buf = self._buf
+        n = len(buf)
+        pos = self._pos
+        while pos < n and not self.done:
+            if self._escape:
+                # 上一段以转义符结尾：跳过被转义的字符
+                self._escape = False
+                pos += 1
+                continue
+            if self._in_string:
+                m = _STRING_SPECIAL.search(buf, pos)
+                if m is None:
+                    pos = n
+                    break
+                pos = m.end()
+                if m.group() == "\\":
+                    if pos >= n:
+                        # 转义符在本段末尾，下一段的第一个字符被转义
+                        self._escape = True
+                        break
+                    pos += 1
+                    continue
+                self._in_string = False
+                if self._state == "key":
+                    try:
+                        self._key = json.loads(buf[self._start:pos])
+                    except ValueError:
+                        self._key = buf[self._start + 1:pos - 1]
+                    self._start = None
+                    self._state = "colon"
+                elif self._state == "value" and self._depth == 0:
+                    self._emit(buf[self._start:pos])
+                    self._start = None
+                    self._state = "after"
+                continue
+            state = self._state
+            if state == "prefix":
+                i = buf.find("{", pos)
+                if i < 0:
+                    pos = n
+                    break
+                pos = i + 1
+                self._state = "key"
+                continue
+            if state == "value" and self._start is None:
+                while pos < n and buf[pos] in _WHITESPACE:
+                    pos += 1
+                if pos >= n:
+                    break
+                self._start = pos
+            m = _STRUCTURAL.search(buf, pos)
+            if m is None:
+                if state in ("key", "colon", "after") and buf[pos:].strip():
+                    self._fail(state, buf[pos:].strip()[:20])
+                pos = n
+                break
+            ch = m.group()
+            if state != "value" and buf[pos:m.start()].strip():
+                self._fail(state, buf[pos:m.start()].strip()[:20])
+                break
+            pos = m.end()
+            if state == "key":
+                if ch == '"':
+                    self._start = m.start()
+                    self._in_string = True
+                elif ch == "}":
+                    self.complete = True
+                elif ch != ",":
+                    self._fail(state, ch)
+            elif state == "colon":
+                if ch == ":":
+                    self._state = "value"
+                    self._start = None
+                else:
+                    self._fail(state, ch)
+            elif state == "after":
+                if ch == ",":
+                    self._state = "key"
+                elif ch == "}":
+                    self.complete = True
+                elif ch == '"':
+                    # 宽容处理缺少逗号的情况：直接开始下一个键
+                    self._state = "key"
+                    self._start = m.start()
+                    self._in_string = True
+                else:
+                    self._fail(state, ch)
+            else:
+                if ch == '"':
+                    self._in_string = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    if self._depth == 0:
+                        # 标量值后紧跟顶层对象的 }
+                        self._emit(buf[self._start:m.start()].strip())
+                        self._start = None
+                        self.complete = True
+                    else:
+                        self._depth -= 1
+                        if self._depth == 0:
+                            self._emit(buf[self._start:pos])
+                            self._start = None
+                            self._state = "after"
+                elif ch == "," and self._depth == 0:
+                    self._emit(buf[self._start:m.start()].strip())
+                    self._start = None
+                    self._state = "key"
+        self._pos = pos
+
+    def _fail(self, state, near):
+        self.error = f"JSON 结构错误（{state} 处遇到 {near!r}）"
+        self._start = None
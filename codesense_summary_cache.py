@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+
+def prompt_template_hash(template):
+    """计算提示词模板的哈希，模板变化后旧缓存自动失效"""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+class SummaryCache:
+    """
+    基于 SQLite 的文件摘要缓存（内容寻址）：
+      - 键为 (内容哈希, 场景, 提示词模板哈希, 模型名称) 的组合哈希，跨项目、跨 fork 共享
+      - 值为 JSON 序列化后的单文件摘要
+      - 记录每个条目的大小与最近访问时间，总大小超过 max_size_bytes 时按 LRU 淘汰至 90%
+      - 总大小保存在单行表 cache_size 中，写入与淘汰在同一个写事务（BEGIN IMMEDIATE）中更新，
+        多个进程（并行项目、分布式 worker）共用一个缓存时各自看到的总大小始终一致
+      - 连接在线程间共享，所有操作由锁串行化；数据库使用 WAL 模式，允许多个进程同时读写
+    hits / misses 记录本次运行的命中与未命中次数。
+    """
+
+    def __init__(self, db_path, max_size_bytes=512 * 1024 * 1024):
+        db_path = os.path.expanduser(db_path)
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        self.db_path = db_path
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON summaries(last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0),"
+                           " total INTEGER NOT NULL)")
+        # 旧版缓存没有 cache_size 表，首次打开时按现有条目统计
+        self._conn.execute("INSERT OR IGNORE INTO cache_size (id, total) "
+                           "SELECT 0, COALESCE(SUM(size), 0) FROM summaries")
+        self._conn.commit()
+        logging.info(f"摘要缓存已打开：{db_path}（当前大小 {self._total_size()} 字节）")
+
+    def _total_size(self):
+        return self._conn.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+
+    @staticmethod
+    def make_key(content_hash, scenario, template_hash, model_name):
+        raw = "\x1f".join([content_hash, scenario or "", template_hash or "", model_name or ""])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """查询缓存，命中时刷新最近访问时间并返回摘要，未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, summary):
+        value = json.dumps(summary, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            # 写锁在读取旧条目之前取得，其他进程的写入不会夹在读取与更新总大小之间
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._conn.execute("SELECT size FROM summaries WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time())
+                )
+                self._conn.execute("UPDATE cache_size SET total = total + ? WHERE id = 0",
+                                   (size - (old[0] if old else 0),))
+                total = self._total_size()
+                if total > self.max_size_bytes:
+                    self._evict(total)
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def _evict(self, total):
+        """按最近访问时间从旧到新淘汰条目，直到总大小降到上限的 90% 以下（调用方持有锁并处于写事务中）"""
+        target = self.max_size_bytes * 0.9
+        freed = 0
+        cursor = self._conn.execute("SELECT key, size FROM summaries ORDER BY last_access ASC")
+        to_delete = []
+        for key, size in cursor:
+            if total - freed <= target:
+                break
+            to_delete.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM summaries WHERE key = ?", to_delete)
+        self._conn.execute("UPDATE cache_size SET total = total - ? WHERE id = 0", (freed,))
+        logging.info(f"摘要缓存超过上限，淘汰 {len(to_delete)} 个条目，当前大小 {total - freed} 字节")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_summary_cache(cache_conf):
+    """
+    根据总结工具配置中的 summary_cache 段创建缓存；未启用或打开失败时返回 None（不影响正常总结流程）。
+    """
+    if not cache_conf or not cache_conf.get("enabled", False):
+        return None
+    path = cache_conf.get("path", "~/.cache/codesense/summary_cache.sqlite")
+    max_size_mb = cache_conf.get("max_size_mb", 512)
+    try:
+        return SummaryCache(path, int(max_size_mb * 1024 * 1024))
+    except Exception as e:
+        logging.error(f"打开摘要缓存失败，将不使用缓存：{e}")
+        return None
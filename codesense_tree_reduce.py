@@ -0,0 +1,266 @@
+import time
+import hashlib
+import logging
+
+from model_api_client import call_model_api
+from codesense_metrics import get_metrics
+
+
+DEFAULT_DIR_SUMMARY_PROMPT = (
+    "以下是目录 {dir_path} 中各文件与子目录的摘要：\n{code_summaries}\n\n摘要结束。"
+    "请概括该目录的整体功能、主要模块及其相互关系，列出关键的类、函数与对外接口，"
+    "输出一段简洁的中文目录摘要（不超过 {max_chars} 字），不要输出与摘要无关的内容。"
+)
+
+
+def format_entry(label, summary):
+    """与原有最终聚合保持相同的条目格式：【路径】\\n摘要"""
+    return f"【{label}】\n{summary}"
+
+
+def pack_entries(entries, max_len):
+    """
+    按条目边界把摘要条目依次装入若干组，每组拼接后的长度不超过 max_len，
+    不会把单个条目从中间截断；单个条目本身超过 max_len 时单独成组并截断到 max_len。
+    """
+    groups = []
+    current = []
+    current_len = 0
+    for entry in entries:
+        if len(entry) > max_len:
+            logging.warning(f"单个摘要条目长度 {len(entry)} 超过限制 {max_len}，截断后单独处理")
+            entry = entry[:max_len]
+        extra = len(entry) + (2 if current else 0)
+        if current and current_len + extra > max_len:
+            groups.append(current)
+            current, current_len = [], 0
+            extra = len(entry)
+        current.append(entry)
+        current_len += extra
+    if current:
+        groups.append(current)
+    return groups
+
+
+def entries_signature(entries, prompt_hash):
+    """目录输入（子文件摘要与子目录摘要）及提示词的签名，签名不变时可直接复用缓存的目录摘要"""
+    h = hashlib.sha256(prompt_hash.encode("utf-8"))
+    for entry in entries:
+        h.update(b"\x1e")
+        h.update(entry.encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+class TreeReducer:
+    """
+    按 structure 树自底向上的层级式归约（map-reduce）：
+      - 每个目录把其直接子文件的摘要与子目录的目录摘要归约为一段目录摘要
+      - 目录按高度分层（叶子目录高度为 0），同一层的所有目录互不依赖，交给 RequestScheduler 并行处理
+      - 目录摘要连同输入签名缓存在目录节点的 dir_summary 字段中，输入未变化的目录直接复用，
+        只有发生变化的文件所在的目录链会重新调用大模型
+      - 目录输入超过 max_len 时按条目边界分组分别归约，再合并，不会把单个文件摘要切成两半
+      - 只有一个条目或总长度不超过 passthrough_chars 的目录不调用大模型，直接把条目向上传递
+    根目录不生成目录摘要，由 reduce_root() 返回可直接放入 final_summary_prompt 的代码摘要合集。
+    多模型路由开启时，endpoint 为目录归约使用的模型端点，pool 为其在调度器中的并发池。
+    """
+
+    def __init__(self, scan_model, scheduler, max_len, dir_summary_prompt=None, passthrough_chars=2000,
+                 summary_chars=1500, big_model_log_path="big_model_calls.log", on_dir_summary=None,
+                 on_level_done=None, endpoint=None, pool=None):
+        self.scan_model = scan_model
+        self.scheduler = scheduler
+        self.max_len = int(max_len)
+        self.prompt = dir_summary_prompt or DEFAULT_DIR_SUMMARY_PROMPT
+        self.prompt_hash = hashlib.sha256(self.prompt.encode("utf-8")).hexdigest()[:16]
+        self.passthrough_chars = passthrough_chars
+        self.summary_chars = summary_chars
+        self.big_model_log_path = big_model_log_path
+        # on_dir_summary(relative_path, dir_summary) 在目录摘要写入节点后回调（用于记录进度日志）
+        self.on_dir_summary = on_dir_summary
+        self.on_level_done = on_level_done
+        self.endpoint = endpoint
+        self.pool = pool
+        self.stats = {"reused": 0, "passthrough": 0, "generated": 0, "failed": 0, "calls": 0}
+        # 本次运行中每个目录最终向父目录提供的文本（失败的目录为截断后的原始条目，不写入缓存）
+        self._results = {}
+
+    @classmethod
+    def from_config(cls, scan_model, scheduler, max_len, reduce_conf, big_model_log_path, on_dir_summary=None,
+                    on_level_done=None, endpoint=None, pool=None):
+        conf = reduce_conf or {}
+        return cls(scan_model, scheduler, max_len,
+                   dir_summary_prompt=conf.get("dir_summary_prompt"),
+                   passthrough_chars=conf.get("passthrough_chars", 2000),
+                   summary_chars=conf.get("summary_chars", 1500),
+                   big_model_log_path=big_model_log_path,
+                   on_dir_summary=on_dir_summary,
+                   on_level_done=on_level_done,
+                   endpoint=endpoint,
+                   pool=pool)
+
+    def _subdirs(self, node):
+        rel = node.get("relative_path")
+        # "Permission Denied" 占位节点与父目录共用 relative_path，不作为子目录参与归约
+        return [c for c in node.get("children", []) if c.get("type") == "dir" and c.get("relative_path") != rel]
+
+    def _file_summary(self, node):
+        rel = node.get("relative_path")
+        summary = self.scan_model.data["summaries"].get(rel) or node.get("summaries")
+        return summary or None
+
+    def _entries(self, node):
+        """目录的归约输入：直接子文件摘要在前，子目录摘要在后，均保持结构树中的顺序"""
+        entries = []
+        subdirs = []
+        for child in node.get("children", []):
+            if child.get("type") == "file":
+                summary = self._file_summary(child)
+                if summary:
+                    entries.append(format_entry(child.get("relative_path"), summary))
+            elif child.get("type") == "dir" and child.get("relative_path") != node.get("relative_path"):
+                subdirs.append(child)
+        for child in subdirs:
+            text = self._results.get(child.get("relative_path"))
+            if text:
+                entries.append(format_entry(child.get("relative_path") + "/", text))
+        return entries
+
+    def _levels(self):
+        """按高度对根目录以下的目录分层，返回 [[高度 0 的目录节点], [高度 1 的目录节点], ...]"""
+        root = self.scan_model.structure
+        heights = {}
+        levels = []
+        stack = [(child, False) for child in self._subdirs(root)]
+        while stack:
+            node, visited = stack.pop()
+            subdirs = self._subdirs(node)
+            if not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in subdirs)
+                continue
+            height = max((heights[id(child)] + 1 for child in subdirs), default=0)
+            heights[id(node)] = height
+            while len(levels) <= height:
+                levels.append([])
+            levels[height].append(node)
+        return levels
+
+    def _call(self, dir_path, text):
+        prompt = self.prompt.format(dir_path=dir_path or "/", code_summaries=text, max_chars=self.summary_chars)
+        messages = [{"role": "user", "content": prompt}]
+        self.stats["calls"] += 1
+        result = call_model_api(messages, stream=True, big_model_log_path=self.big_model_log_path,
+                                raise_on_error=True, endpoint=self.endpoint)
+        if not result:
+            raise ValueError(f"目录 {dir_path or '/'} 的摘要为空")
+        return result.strip()
+
+    def reduce_entries(self, dir_path, entries, max_len=None):
+        """
+        将条目归约为一段文本：能放入一组时调用一次大模型；否则按条目边界分组分别归约，
+        把各组结果作为新条目重复上述过程，直到只剩一组。
+        """
+        max_len = max_len or self.max_len
+        groups = pack_entries(entries, max_len)
+        round_no = 0
+        while len(groups) > 1:
+            round_no += 1
+            logging.info(f"目录 {dir_path or '/'} 的摘要输入超过限制，第 {round_no} 轮按条目边界拆分为 {len(groups)} 组归约")
+            parts = [self._call(dir_path, "\n\n".join(group)) for group in groups]
+            entries = [format_entry(f"{dir_path or '/'} 第 {i + 1} 部分", part) for i, part in enumerate(parts)]
+            new_groups = pack_entries(entries, max_len)
+            if len(new_groups) >= len(groups):
+                # 模型输出没有变短时，按比例截断各部分，保证归约收敛
+                limit = max(1, max_len // len(entries) - 2)
+                logging.warning(f"目录 {dir_path or '/'} 的分组摘要未能收敛，截断各部分至 {limit} 字符")
+                new_groups = pack_entries([e[:limit] for e in entries], max_len)
+            groups = new_groups
+        return self._call(dir_path, "\n\n".join(groups[0]))
+
+    def _store(self, node, signature, summary):
+        node["dir_summary"] = {"signature": signature, "summary": summary}
+        if self.on_dir_summary:
+            self.on_dir_summary(node.get("relative_path"), node["dir_summary"])
+
+    def _resolve_without_model(self, node, entries, signature):
+        """不需要调用大模型的目录：无输入、缓存命中或可直接透传；返回是否已处理"""
+        rel = node.get("relative_path")
+        if not entries:
+            self._results[rel] = ""
+            return True
+        cached = node.get("dir_summary")
+        if cached and cached.get("signature") == signature:
+            self._results[rel] = cached.get("summary", "")
+            self.stats["reused"] += 1
+            return True
+        joined = "\n\n".join(entries)
+        if len(entries) == 1 or len(joined) <= self.passthrough_chars:
+            # 透传的文本与输入一一对应，同样写入缓存，下次运行可直接复用
+            self._results[rel] = joined
+            self._store(node, signature, joined)
+            self.stats["passthrough"] += 1
+            return True
+        return False
+
+    def run(self):
+        """自底向上逐层归约所有目录，同层目录并行；返回统计信息"""
+        levels = self._levels()
+        metrics = get_metrics()
+        for height, nodes in enumerate(levels):
+            level_start = time.monotonic()
+            jobs = []
+            for node in nodes:
+                entries = self._entries(node)
+                signature = entries_signature(entries, self.prompt_hash)
+                if not self._resolve_without_model(node, entries, signature):
+                    jobs.append((node, entries, signature))
+            if not jobs:
+                continue
+            logging.info(f"目录归约第 {height + 1}/{len(levels)} 层：{len(jobs)} 个目录需要生成摘要")
+
+            def on_done(job, summary):
+                node, _, signature = job
+                self._results[node.get("relative_path")] = summary
+                self._store(node, signature, summary)
+                self.stats["generated"] += 1
+
+            def on_failed(job, error):
+                node, entries, _ = job
+                rel = node.get("relative_path")
+                logging.error(f"目录 {rel} 摘要生成失败（{error}），使用截断后的原始条目代替，下次运行时重新生成")
+                self._results[rel] = "\n\n".join(entries)[:self.summary_chars]
+                self.stats["failed"] += 1
+
+            tokens = [len("\n\n".join(entries)) // 3 for _, entries, _ in jobs]
+            self.scheduler.run(jobs, lambda job: self.reduce_entries(job[0].get("relative_path"), job[1]),
+                               on_done, on_failed, tokens,
+                               classify=(lambda job: self.pool) if self.pool else None)
+            metrics.observe("reduce_level_seconds", time.monotonic() - level_start, level=height + 1)
+            if self.on_level_done:
+                self.on_level_done()
+        for outcome in ("generated", "reused", "passthrough", "failed"):
+            if self.stats[outcome]:
+                metrics.inc("reduce_dirs_total", self.stats[outcome], outcome=outcome)
+        logging.info(f"目录归约完成：生成 {self.stats['generated']} 个，复用缓存 {self.stats['reused']} 个，"
+                     f"直接透传 {self.stats['passthrough']} 个，失败 {self.stats['failed']} 个，"
+                     f"共调用大模型 {self.stats['calls']} 次")
+        return self.stats
+
+    def reduce_root(self):
+        """
+        返回根目录的代码摘要合集（根目录下的文件摘要与一级子目录摘要），长度不超过 max_len；
+        超过时先按条目边界分组归约。须在 run() 之后调用。
+        """
+        entries = self._entries(self.scan_model.structure)
+        aggregated = "\n\n".join(entries)
+        if len(aggregated) <= self.max_len:
+            return aggregated
+        groups = pack_entries(entries, self.max_len)
+        logging.info(f"根目录摘要合集长度 {len(aggregated)} 超过限制 {self.max_len}，按条目边界拆分为 {len(groups)} 组归约")
+        parts = []
+        for i, group in enumerate(groups):
+            try:
+                parts.append(format_entry(f"第 {i + 1} 部分", self.reduce_entries("", group)))
+            except Exception as e:
+                logging.error(f"根目录第 {i + 1} 组摘要生成失败：{e}")
+        return "\n\n".join(parts)[:self.max_len]
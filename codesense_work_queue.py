@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+
+from codesense_metrics import get_metrics
+
+
+class WorkItem:
+    """从队列取出的一个批次：id、所属运行、文件列表 payload、预估 token 数，以及完成后的结果或错误"""
+
+    def __init__(self, job_id, run_id, payload, tokens, attempts=0, state=None, result=None, error=None):
+        self.id = job_id
+        self.run_id = run_id
+        self.payload = payload
+        self.tokens = tokens
+        self.attempts = attempts
+        self.state = state
+        self.result = result
+        self.error = error
+
+
+class WorkQueue:
+    """
+    分布式总结的持久化批次队列（单个 SQLite 文件，可放在多台机器共享的存储上）：
+      - 协调者 publish() 发布一次运行（run）的上下文与全部批次，之后可 add_jobs() 追加重新排队的批次
+      - worker lease() 领取一个批次并获得 lease_seconds 秒的租约，执行期间 heartbeat() 续租，
+        完成后 complete() 写回结果，失败时 fail() 按退避时间重新排队或标记为失败
+      - 租约过期（worker 崩溃或失联）的批次可被其他 worker 重新领取；领取次数达到 max_attempts 后标记为失败
+      - 协调者 take_finished() 取出已完成 / 失败且尚未合并的批次
+    每个操作是一个短事务（BEGIN IMMEDIATE），多进程并发时由 SQLite 文件锁串行化；
+    默认使用回滚日志而非 WAL，网络文件系统上同样可用，本机多进程时可传入 wal=True 减少锁等待。
+    """
+
+    def __init__(self, db_path, wal=False, timeout=30.0):
+        db_path = os.path.expanduser(db_path)
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # isolation_level=None：由各方法显式 BEGIN IMMEDIATE，领取批次时的查询与更新在同一个写事务中
+        self._conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        if wal:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY,"
+            " context TEXT NOT NULL,"
+            " closed INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " run_id TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " tokens INTEGER NOT NULL DEFAULT 0,"
+            " state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " max_attempts INTEGER NOT NULL,"
+            " available_at REAL NOT NULL,"
+            " lease_owner TEXT,"
+            " lease_expires REAL,"
+            " result TEXT,"
+            " error TEXT,"
+            " merged INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_run ON jobs(run_id, state, merged)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def publish(self, context, payloads, tokens=None, max_attempts=6):
+        """发布一次运行：context 为 worker 执行批次所需的上下文（可 JSON 序列化），返回 run_id"""
+        run_id = uuid.uuid4().hex
+
+        def publish_run(conn):
+            conn.execute("INSERT INTO runs (run_id, context, created) VALUES (?, ?, ?)",
+                         (run_id, json.dumps(context, ensure_ascii=False), time.time()))
+            self._insert_jobs(conn, run_id, payloads, tokens, max_attempts)
+        self._transaction(publish_run)
+        return run_id
+
+    def add_jobs(self, run_id, payloads, tokens=None, max_attempts=6):
+        self._transaction(lambda conn: self._insert_jobs(conn, run_id, payloads, tokens, max_attempts))
+
+    @staticmethod
+    def _insert_jobs(conn, run_id, payloads, tokens, max_attempts):
+        now = time.time()
+        conn.executemany(
+            "INSERT INTO jobs (run_id, payload, tokens, state, max_attempts, available_at) "
+            "VALUES (?, ?, ?, 'pending', ?, ?)",
+            [(run_id, json.dumps(p, ensure_ascii=False), (tokens[i] if tokens else 0), max_attempts, now)
+             for i, p in enumerate(payloads)])
+
+    def context(self, run_id):
+        with self._lock:
+            row = self._conn.execute("SELECT context FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lease(self, worker_id, lease_seconds=300.0, run_id=None):
+        """领取一个可执行的批次（待处理且已过退避时间，或租约已过期），没有时返回 None"""
+        def lease_one(conn):
+            now = time.time()
+            expired = conn.execute(
+                "UPDATE jobs SET state = 'failed', error = '租约多次过期（worker 崩溃或执行超时）', lease_owner = NULL "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now,)).rowcount
+            if expired:
+                logging.error(f"{expired} 个批次的租约多次过期，标记为失败")
+            query = ("SELECT j.id, j.run_id, j.payload, j.tokens, j.attempts, j.state FROM jobs j "
+                     "JOIN runs r ON r.run_id = j.run_id WHERE r.closed = 0 AND "
+                     "((j.state = 'pending' AND j.available_at <= ?) OR (j.state = 'leased' AND j.lease_expires < ?))")
+            params = [now, now]
+            if run_id is not None:
+                query += " AND j.run_id = ?"
+                params.append(run_id)
+            row = conn.execute(query + " ORDER BY j.id LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            job_id, job_run, payload, tokens, attempts, state = row
+            if state == "leased":
+                get_metrics().inc("work_queue_lease_expired_total")
+                logging.warning(f"批次 {job_id} 的租约已过期，由 {worker_id} 重新领取")
+            conn.execute("UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                         "attempts = attempts + 1 WHERE id = ?", (worker_id, now + lease_seconds, job_id))
+            return WorkItem(job_id, job_run, json.loads(payload), tokens, attempts + 1, "leased")
+        return self._transaction(lease_one)
+
+    def heartbeat(self, job_ids, worker_id, lease_seconds=300.0):
+        """为仍在执行的批次续租"""
+        if not job_ids:
+            return
+        expires = time.time() + lease_seconds
+        self._transaction(lambda conn: conn.executemany(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND state = 'leased'",
+            [(expires, job_id, worker_id) for job_id in job_ids]))
+
+    def complete(self, job_id, worker_id, result):
+        """
+        写回批次结果，返回是否被采纳。租约过期后被他人领取的批次，先完成的结果有效；
+        协调者已按失败处理（合并）的批次不再接受结果
+        """
+        value = json.dumps(result, ensure_ascii=False)
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET state = 'done', result = ?, error = NULL, lease_owner = NULL "
+            "WHERE id = ? AND state != 'done' AND merged = 0", (value, job_id)).rowcount > 0)
+
+    def fail(self, job_id, worker_id, error, retry_delay=None):
+        """批次执行失败：retry_delay 不为 None 且领取次数未达上限时，退避 retry_delay 秒后重新排队，否则标记为失败"""
+        def fail_one(conn):
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND state = 'leased' "
+                               "AND lease_owner = ?", (job_id, worker_id)).fetchone()
+            if row is None:
+                return None
+            retry = retry_delay is not None and row[0] < row[1]
+            conn.execute("UPDATE jobs SET state = ?, available_at = ?, error = ?, lease_owner = NULL WHERE id = ?",
+                         ("pending" if retry else "failed", time.time() + (retry_delay or 0), str(error), job_id))
+            return retry
+        return self._transaction(fail_one)
+
+    def take_finished(self, run_id):
+        """取出运行中已完成或失败、尚未合并的批次，并标记为已合并"""
+        def take(conn):
+            rows = conn.execute("SELECT id, payload, tokens, attempts, state, result, error FROM jobs "
+                                "WHERE run_id = ? AND state IN ('done', 'failed') AND merged = 0 ORDER BY id",
+                                (run_id,)).fetchall()
+            conn.executemany("UPDATE jobs SET merged = 1 WHERE id = ?", [(row[0],) for row in rows])
+            return rows
+        return [WorkItem(job_id, run_id, json.loads(payload), tokens, attempts, state,
+                         json.loads(result) if result is not None else None, error)
+                for job_id, payload, tokens, attempts, state, result, error in self._transaction(take)]
+
+    def counts(self, run_id=None):
+        """各状态的批次数：{"pending", "leased", "done", "failed"}，run_id 为 None 时统计所有未关闭的运行"""
+        with self._lock:
+            if run_id is None:
+                rows = self._conn.execute("SELECT j.state, COUNT(*) FROM jobs j JOIN runs r ON r.run_id = j.run_id "
+                                          "WHERE r.closed = 0 GROUP BY j.state").fetchall()
+            else:
+                rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs WHERE run_id = ? GROUP BY state",
+                                          (run_id,)).fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(rows)
+        return counts
+
+    def close_run(self, run_id):
+        """结束一次运行：worker 不再领取其中的批次"""
+        self._transaction(lambda conn: conn.execute("UPDATE runs SET closed = 1 WHERE run_id = ?", (run_id,)))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,8 +1,15 @@
 import configparser
 import time
-import requests
+import atexit
+import threading
 import json
 import logging
+import sys
+
+# requests / asyncio / aiohttp 均在首次发起请求时才导入，导入本模块本身只需几毫秒
+
+from codesense_log_sink import get_log_sink
+from codesense_metrics import get_metrics
 
 def flush_reasoning_line(buffer, width=40, threshold=5):
     """
@@ -44,128 +51,720 @@ def read_model_api_config(config_file="config.ini"):
 
     return api_key, api_url, display_llm,model_name, is_inference_model
 
-STEP_API_KEY, BASE_URL, DISPLAY_LLM, model_name, is_inference_model = read_model_api_config()
+class ModelAPIConfig:
+    """模型 API 配置：api_key、api_url、display_llm、model_name、is_inference_model"""
+
+    def __init__(self, api_key, api_url, display_llm, model_name, is_inference_model):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.display_llm = display_llm
+        self.model_name = model_name
+        self.is_inference_model = is_inference_model
 
-# 选择使用的模型
-COMPLETION_MODEL = model_name
+# 配置在第一次使用时才读取（导入本模块不再要求工作目录下存在 config.ini）
+_config_file = "config.ini"
+_config_overrides = {}
+_api_config = None
+_api_config_lock = threading.Lock()
 
-def call_model_api(messages, model=COMPLETION_MODEL, stream=False, timeout=60, big_model_log_path="big_model_calls.log"):
+def configure_model_api(config_file=None, **overrides):
     """
-    调用模型 API，发送消息列表 messages。
+    指定模型 API 配置的来源：config_file 为配置文件路径；overrides 可直接给出
+    api_key / api_url / display_llm / model_name / is_inference_model，
+    给出全部五项时不再读取配置文件，便于在其他服务或测试中嵌入使用。下一次调用时生效。
+    """
+    global _config_file, _api_config
+    unknown = set(overrides) - {"api_key", "api_url", "display_llm", "model_name", "is_inference_model"}
+    if unknown:
+        raise TypeError(f"未知的模型 API 配置项：{', '.join(sorted(unknown))}")
+    with _api_config_lock:
+        if config_file is not None:
+            _config_file = config_file
+        _config_overrides.update(overrides)
+        _api_config = None
+        _endpoint_configs.clear()
 
-    参数:
-      messages: 消息列表（格式参照 ChatGPT 格式）
-      model: 模型名称
-      stream: 是否采用流式返回
-      timeout: 请求超时时间
-      big_model_log_path: 大模型调用日志文件存放路径
+def get_model_api_config():
+    """返回当前的模型 API 配置，首次调用时读取配置文件"""
+    global _api_config
+    if _api_config is None:
+        with _api_config_lock:
+            if _api_config is None:
+                fields = ["api_key", "api_url", "display_llm", "model_name", "is_inference_model"]
+                if all(f in _config_overrides for f in fields):
+                    values = dict(_config_overrides)
+                else:
+                    values = dict(zip(fields, read_model_api_config(_config_file)))
+                    values.update(_config_overrides)
+                _api_config = ModelAPIConfig(**values)
+    return _api_config
 
-    返回:
-      当 stream=False 时，直接返回生成的文本；
-      当 stream=True 时，实时记录返回过程（含思考过程断行显示），并返回最终生成的文本。
+# 命名端点：config.ini 中的 [model.<名称>] 段，或由 register_model_endpoint 在代码中给出
+_ENDPOINT_OPTIONS = {"key": "api_key", "url": "api_url", "model_name": "model_name",
+                     "is_inference_model": "is_inference_model"}
+_endpoint_overrides = {}
+_endpoint_configs = {}
 
-    大模型调用的详细输入、输出和 Trace ID 将写入 big_model_log_path 文件，
-    同时 Trace ID 总是在终端显示（便于快速定位问题）。
+def register_model_endpoint(name, **fields):
     """
-    url = f"{BASE_URL}/chat/completions"
+    在代码中定义命名端点 name，fields 为 api_key / api_url / model_name / is_inference_model 中的任意几项，
+    优先于配置文件中的 [model.<name>] 段；下一次调用时生效。
+    """
+    unknown = set(fields) - set(_ENDPOINT_OPTIONS.values())
+    if unknown:
+        raise TypeError(f"未知的模型端点配置项：{', '.join(sorted(unknown))}")
+    with _api_config_lock:
+        _endpoint_overrides[name] = dict(fields)
+        _endpoint_configs.pop(name, None)
+
+def read_model_endpoint_config(name, config_file="config.ini"):
+    """读取配置文件中 [model.<name>] 段给出的项（key / url / model_name / is_inference_model），段不存在时返回 None"""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    section = f"model.{name}"
+    if not config.has_section(section):
+        return None
+    return {field: config.get(section, option) for option, field in _ENDPOINT_OPTIONS.items()
+            if config.has_option(section, option)}
+
+def get_model_endpoint(name=None):
+    """
+    返回命名端点的配置（ModelAPIConfig），name 为 None 时即默认配置 get_model_api_config()。
+    端点未给出的项沿用默认配置（[step_api_prod]），display_llm 始终沿用默认配置；端点不存在时抛出 ValueError。
+    """
+    if not name:
+        return get_model_api_config()
+    config = _endpoint_configs.get(name)
+    if config is None:
+        base = get_model_api_config()
+        with _api_config_lock:
+            fields = _endpoint_overrides.get(name)
+            if fields is None:
+                fields = read_model_endpoint_config(name, _config_file)
+            if fields is None:
+                raise ValueError(f"未找到模型端点 {name!r}：请在 {_config_file} 中添加 [model.{name}] 段")
+            values = dict(vars(base))
+            values.update(fields)
+            config = ModelAPIConfig(**values)
+            _endpoint_configs[name] = config
+    return config
+
+# 兼容旧的模块级常量（STEP_API_KEY、COMPLETION_MODEL 等），访问时才读取配置
+_LEGACY_CONFIG_NAMES = {
+    "STEP_API_KEY": "api_key",
+    "BASE_URL": "api_url",
+    "DISPLAY_LLM": "display_llm",
+    "model_name": "model_name",
+    "is_inference_model": "is_inference_model",
+    "COMPLETION_MODEL": "model_name",
+}
+
+def __getattr__(name):
+    field = _LEGACY_CONFIG_NAMES.get(name)
+    if field is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(get_model_api_config(), field)
+
+class ModelAPIError(Exception):
+    """
+    模型调用失败（raise_on_error=True 时抛出）：
+      status_code 为 HTTP 状态码，网络异常或响应无法解析时为 None；
+      retry_after 为服务端 Retry-After 头给出的建议等待秒数。
+    """
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        """限流（429）、服务端错误（5xx）与网络异常可重试，其余 4xx 不重试"""
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
+
+def is_retryable_error(error):
+    """
+    批次失败后是否值得重试：ModelAPIError 按 retryable 判断，网络与超时异常（OSError、aiohttp.ClientError）可重试；
+    其余异常（配置缺项、KeyError、TypeError 等程序或配置错误）重试也不会成功，直接失败
+    """
+    if isinstance(error, ModelAPIError):
+        return error.retryable
+    if isinstance(error, OSError):
+        return True
+    aiohttp = sys.modules.get("aiohttp")
+    return aiohttp is not None and isinstance(error, aiohttp.ClientError)
+
+def _parse_retry_after(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+# 同步请求共享的连接池（keep-alive 与 TLS 会话复用）
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """返回进程内共享的 requests.Session，连接池大小按常见并发数设置"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=64)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def _build_request(messages, model, stream, endpoint=None):
+    config = get_model_endpoint(endpoint)
+    url = f"{config.api_url}/chat/completions"
     headers = {
-        "Authorization": f"Bearer {STEP_API_KEY}",
+        "Authorization": f"Bearer {config.api_key}",
         "Content-Type": "application/json",
         "Accept": "application/json"
     }
     payload = {
-        "model": model,
+        "model": model or config.model_name,
         "messages": messages,
         "stream": stream
     }
+    return url, headers, payload
+
+def _log_trace_id(traceid, log):
+    # 写入 Trace ID 到大模型调用日志
+    log.write(f"Trace ID: {traceid}\n")
+    # 始终在终端显示 Trace ID
+    print(f"Trace ID: {traceid}")
+
+def _report_status_error(status_code, parse_error_info):
+    print(f"请求失败，状态码：{status_code}")
     try:
-        response = requests.post(url, headers=headers, json=payload, stream=stream, timeout=timeout)
-        traceid = response.headers.get('X-Trace-ID')
-        # 写入 Trace ID 到 big_model_log_path 文件，并 flush
-        with open(big_model_log_path, "a", encoding="utf-8") as f:
-            f.write(f"Trace ID: {traceid}\n")
-            f.flush()
-        # 始终在终端显示 Trace ID
-        print(f"Trace ID: {traceid}")
-        if response.status_code != 200:
-            print(f"请求失败，状态码：{response.status_code}")
-            try:
-                error_info = response.json()
-                print("错误详情:", json.dumps(error_info, ensure_ascii=False, indent=2))
-            except Exception as e:
-                print("解析错误详情失败:", e)
-            return None
+        error_info = parse_error_info()
+        print("错误详情:", json.dumps(error_info, ensure_ascii=False, indent=2))
+    except Exception as e:
+        print("解析错误详情失败:", e)
+
+class _CallMetrics:
+    """
+    单次模型调用的性能数据：总耗时、首个 token 延迟（TTFT）、流式字符数 / 事件数、
+    接口返回的 usage 与失败原因，调用结束时由 finish() 写入 codesense_metrics
+    """
+
+    def __init__(self, stream, endpoint=None):
+        self.mode = "stream" if stream else "plain"
+        self.endpoint = endpoint or "default"
+        self.start = time.monotonic()
+        self.ttft = None
+        self.chars = 0
+        self.events = 0
+        self.usage = None
+        self.status = None
+
+    def on_event(self, chars):
+        self.events += 1
+        if chars:
+            if self.ttft is None:
+                self.ttft = time.monotonic() - self.start
+            self.chars += chars
+
+    def finish(self, result):
+        elapsed = time.monotonic() - self.start
+        outcome = "ok" if result is not None else "error"
+        metrics = get_metrics()
+        metrics.inc("model_calls_total", mode=self.mode, outcome=outcome)
+        metrics.observe("model_call_seconds", elapsed, mode=self.mode, outcome=outcome)
+        metrics.inc("model_endpoint_calls_total", endpoint=self.endpoint, outcome=outcome)
+        if outcome == "error":
+            metrics.inc("model_errors_total", status=self.status or "unknown")
+        if self.ttft is not None:
+            metrics.observe("model_ttft_seconds", self.ttft)
+        if self.events:
+            metrics.inc("model_stream_events_total", self.events)
+        if self.chars:
+            metrics.inc("model_stream_chars_total", self.chars, mode=self.mode)
+            generating = elapsed - (self.ttft or 0.0)
+            if generating > 0:
+                metrics.observe("model_output_chars_per_second", self.chars / generating,
+                                buckets=(10, 50, 100, 200, 500, 1000, 2000, 5000))
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if self.usage and isinstance(self.usage.get(kind), (int, float)):
+                metrics.inc("model_usage_tokens_total", self.usage[kind], kind=kind)
+
+def _extract_message_content(data, log, metrics=None, on_content=None):
+    try:
+        if metrics is not None:
+            metrics.usage = data.get("usage")
+        content = data["choices"][0]["message"]["content"]
+        log.write("大模型返回内容:\n" + content + "\n")
+        if metrics is not None:
+            metrics.on_event(len(content or ""))
+        if on_content is not None and content:
+            on_content(content)
+        return content
+    except Exception as e:
+        print(f"解析响应失败: {e}")
+        return None
+
+# 解析 JSON 的函数，第一次使用时选择：安装了 orjson 时使用 orjson.loads，否则使用标准库 json.loads
+_json_loads = None
+
+def set_json_loads(loads=None):
+    """指定解析响应 JSON 的函数（需接受 bytes）；传入 None 时恢复自动选择"""
+    global _json_loads
+    _json_loads = loads
+
+def get_json_loads():
+    global _json_loads
+    if _json_loads is None:
+        try:
+            import orjson
+            _json_loads = orjson.loads
+        except ImportError:
+            _json_loads = json.loads
+    return _json_loads
+
+def _is_true(value):
+    return str(value).strip().lower() in ("true", "1", "yes", "on")
+
+def _split_reasoning(text, width=40, threshold=5):
+    """
+    与 flush_reasoning_line 的断行规则相同，但一次切出 text 中所有满 width 的行，
+    只按下标移动而不反复切片剩余字符串。返回 (行列表, 剩余字符串)。
+    """
+    punctuation = "，。；、！？“”‘’"
+    lines = []
+    pos = 0
+    while len(text) - pos >= width:
+        cut = pos + width
+        for i in range(pos + width - 1, pos + threshold - 1, -1):
+            if text[i] in punctuation:
+                cut = i + 1
+                break
+        lines.append(text[pos:cut])
+        pos = cut
+    return lines, text[pos:]
+
+class SSEDecoder:
+    """
+    增量 SSE 解码器：feed() 接收任意切分的原始字节块，按行拆分后返回本块内完整的 "data:" 事件
+    （已解析为 dict）。未完成的行留在缓冲中，只有收到换行时才拆分，总开销与响应长度成线性。
+    每个 data 行单独作为一个事件（兼容不输出空行分隔的接口）；收到 [DONE] 后 done 为 True。
+    loads 为解析 JSON 的函数，默认见 get_json_loads()。
+    """
+
+    def __init__(self, loads=None):
+        self.loads = loads or get_json_loads()
+        self.done = False
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        if self.done or not chunk:
+            return []
+        self._buffer += chunk
+        if b"\n" not in chunk:
+            return []
+        lines = self._buffer.split(b"\n")
+        self._buffer = lines.pop()
+        return self._decode(lines)
+
+    def close(self):
+        """流结束时处理缓冲中最后一行（没有以换行结尾）"""
+        lines = [self._buffer] if self._buffer else []
+        self._buffer = bytearray()
+        return self._decode(lines)
+
+    def _decode(self, lines):
+        events = []
+        for line in lines:
+            if self.done:
+                break
+            if not line.startswith(b"data:"):
+                continue
+            payload = bytes(line[5:]).strip()
+            if payload == b"[DONE]":
+                self.done = True
+            elif payload:
+                try:
+                    events.append(self.loads(payload))
+                except Exception as e:
+                    print(f"\n解析流响应错误: {e}")
+        return events
+
+class StreamHandler:
+    """
+    流式响应处理：SSEDecoder 解出事件后，正文（content）与思考过程（reasoning）分别追加到列表，
+    结束时一次拼接为最终文本，并写入该请求的日志句柄 log（由 BigModelLogSink 后台落盘）。
+      - display_llm 开启时逐段打印正文，推理模型（is_inference_model）的思考过程按 40 字断行显示
+      - 静默模式（display_llm 关闭）不做任何显示格式化，日志内容攒够 LOG_FLUSH_CHARS 个字符再写入
+    同步与异步客户端共用此处理逻辑；传入 metrics（_CallMetrics）时记录首个 token 延迟、字符数与 usage；
+    传入 on_content 时每收到一段正文即以该段文本回调（用于增量解析）；endpoint 为命名端点，决定是否按推理模型处理。
+    """
+
+    LOG_FLUSH_CHARS = 8192
+
+    def __init__(self, log, metrics=None, loads=None, on_content=None, endpoint=None):
+        config = get_model_endpoint(endpoint)
+        self.log = log
+        self.metrics = metrics
+        self.on_content = on_content
+        self.display = config.display_llm
+        self.expect_reasoning = _is_true(config.is_inference_model)
+        self.decoder = SSEDecoder(loads)
+        self.content_parts = []
+        self.reasoning_parts = []
+        self.reasoning_buffer = ""
+        self._reasoning_open = False
+        self._log_parts = []
+        self._log_chars = 0
+        if self.display and self.expect_reasoning:
+            print("【模型推理中…】")
+        self._write_log("【模型推理中…】\n")
+
+    def _write_log(self, text):
+        if self.display:
+            self.log.write(text)
+            return
+        self._log_parts.append(text)
+        self._log_chars += len(text)
+        if self._log_chars >= self.LOG_FLUSH_CHARS:
+            self._flush_log()
+
+    def _flush_log(self):
+        if self._log_parts:
+            self.log.write("".join(self._log_parts))
+            self._log_parts = []
+            self._log_chars = 0
+
+    def feed(self, chunk):
+        """处理一段原始字节（可包含多行或不完整的行）；收到 [DONE] 后返回 False"""
+        for data in self.decoder.feed(chunk):
+            self._on_event(data)
+        return not self.decoder.done
+
+    def _on_event(self, data):
+        try:
+            if self.metrics is not None and data.get("usage"):
+                # 部分接口在最后一个事件中返回 usage，且 choices 可能为空
+                self.metrics.usage = data["usage"]
+            choices = data.get("choices")
+            if not choices:
+                return
+            delta = choices[0].get("delta") or {}
+            reasoning = delta.get("reasoning")
+            content = delta.get("content")
+            if self.metrics is not None:
+                self.metrics.on_event(len(reasoning or "") + len(content or ""))
+            if reasoning:
+                if not self.reasoning_parts:
+                    if self.display:
+                        print("\n\n[思考过程]:")
+                    self._write_log("\n\n[思考过程]:\n")
+                self.reasoning_parts.append(reasoning)
+                if self.display:
+                    lines, self.reasoning_buffer = _split_reasoning(self.reasoning_buffer + reasoning)
+                    for line in lines:
+                        print(line)
+                        self.log.write(line + "\n")
+                else:
+                    self._write_log(reasoning)
+                    self._reasoning_open = True
+            if content:
+                if self._reasoning_open:
+                    self._write_log("\n")
+                    self._reasoning_open = False
+                if self.display:
+                    print(content, end='', flush=True)
+                self.content_parts.append(content)
+                self._write_log(content)
+                if self.on_content is not None:
+                    self.on_content(content)
+        except Exception as e:
+            print(f"\n解析流响应错误: {e}")
+
+    def finish(self):
+        for data in self.decoder.close():
+            self._on_event(data)
+        if self.display:
+            if self.reasoning_buffer:
+                print(self.reasoning_buffer)
+                self.log.write(self.reasoning_buffer + "\n")
+            print("\n【模型推理完成】")
+        elif self._reasoning_open:
+            self._write_log("\n")
+        self._write_log("\n【模型推理完成】\n")
+        self._flush_log()
+        return "".join(self.content_parts)
+
+def _call_model_api_requests(messages, model, stream, timeout, big_model_log_path, raise_on_error=False,
+                             on_content=None, endpoint=None):
+    """基于共享 requests.Session 的同步实现（未安装 aiohttp 时使用）"""
+    log = get_log_sink().open_request(big_model_log_path)
+    try:
+        return _requests_call(messages, model, stream, timeout, log, raise_on_error, on_content, endpoint)
+    finally:
+        log.close()
+
+def _requests_call(messages, model, stream, timeout, log, raise_on_error=False, on_content=None, endpoint=None):
+    metrics = _CallMetrics(stream, endpoint)
+    result = None
+    try:
+        result = _requests_call_once(messages, model, stream, timeout, log, metrics, raise_on_error, on_content,
+                                     endpoint)
+        return result
+    finally:
+        metrics.finish(result)
+
+def _requests_call_once(messages, model, stream, timeout, log, metrics, raise_on_error=False, on_content=None,
+                        endpoint=None):
+    import requests
+    url, headers, payload = _build_request(messages, model, stream, endpoint)
+    try:
+        response = get_http_session().post(url, headers=headers, json=payload, stream=stream, timeout=timeout)
     except requests.RequestException as e:
+        metrics.status = "network"
         print(f"请求 API 时发生异常：{e}")
+        if raise_on_error:
+            raise ModelAPIError(f"请求 API 时发生异常：{e}") from e
         return None
+    # 所有路径结束时关闭响应：已读完的连接归还连接池复用，未读完的连接（出错时）直接关闭
+    with response:
+        return _requests_read_response(response, stream, log, metrics, raise_on_error, on_content, endpoint)
 
+def _requests_read_response(response, stream, log, metrics, raise_on_error, on_content, endpoint):
+    import requests
+    _log_trace_id(response.headers.get('X-Trace-ID'), log)
+    if response.status_code != 200:
+        metrics.status = response.status_code
+        _report_status_error(response.status_code, response.json)
+        if raise_on_error:
+            raise ModelAPIError(f"请求失败，状态码：{response.status_code}", response.status_code,
+                                _parse_retry_after(response.headers.get("Retry-After")))
+        return None
     if not stream:
         try:
-            data = response.json()
-            content = data["choices"][0]["message"]["content"]
-            with open(big_model_log_path, "a", encoding="utf-8") as f:
-                f.write("大模型返回内容:\n" + content + "\n")
-                f.flush()
-            return content
+            data = get_json_loads()(response.content)
+        except requests.RequestException as e:
+            metrics.status = "network"
+            print(f"请求 API 时发生异常：{e}")
+            if raise_on_error:
+                raise ModelAPIError(f"请求 API 时发生异常：{e}") from e
+            return None
         except Exception as e:
+            metrics.status = "parse"
             print(f"解析响应失败: {e}")
             return None
-    else:
-        final_content = ""
-        print("【模型推理中…】")
-        with open(big_model_log_path, "a", encoding="utf-8") as f:
-            f.write("【模型推理中…】\n")
-            f.flush()
-        reasoning_buffer = ""
-        reasoning_header_printed = False
-        for chunk in response.iter_lines():
-            if chunk:
-                decoded = chunk.decode('utf-8')
-                if decoded == "data: [DONE]":
-                    break
-                if decoded.startswith("data: "):
-                    json_str = decoded[6:].strip()
-                    try:
-                        data = json.loads(json_str)
-                        delta = data["choices"][0]["delta"]
-                        if "reasoning" in delta:
-                            reasoning_chunk = delta.get("reasoning", "")
-                            if reasoning_chunk:
-                                if not reasoning_header_printed:
-                                    if DISPLAY_LLM:
-                                        print("\n\n[思考过程]:")
-                                    with open(big_model_log_path, "a", encoding="utf-8") as f:
-                                        f.write("\n\n[思考过程]:\n")
-                                        f.flush()
-                                    reasoning_header_printed = True
-                                reasoning_buffer += reasoning_chunk
-                                while len(reasoning_buffer) >= 40:
-                                    line, reasoning_buffer = flush_reasoning_line(reasoning_buffer, width=40)
-                                    if line:
-                                        if DISPLAY_LLM:
-                                            print(line)
-                                        with open(big_model_log_path, "a", encoding="utf-8") as f:
-                                            f.write(line + "\n")
-                                            f.flush()
-                        content = delta.get("content", "")
-                        if content:
-                            if DISPLAY_LLM:
-                                print(content, end='', flush=True)
-                            final_content += content
-                            with open(big_model_log_path, "a", encoding="utf-8") as f:
-                                f.write(content)
-                                f.flush()
-                    except Exception as e:
-                        print(f"\n解析流响应错误: {e}")
-        if reasoning_buffer:
-            if DISPLAY_LLM:
-                print(reasoning_buffer)
-            with open(big_model_log_path, "a", encoding="utf-8") as f:
-                f.write(reasoning_buffer + "\n")
-                f.flush()
-        if DISPLAY_LLM:
-            print("\n【模型推理完成】")
-        with open(big_model_log_path, "a", encoding="utf-8") as f:
-            f.write("\n【模型推理完成】\n")
-            f.flush()
-        return final_content
\ No newline at end of file
+        return _extract_message_content(data, log, metrics, on_content)
+    handler = StreamHandler(log, metrics, on_content=on_content, endpoint=endpoint)
+    done = False
+    try:
+        # chunk_size=None：按网络到达的数据块读取，由 SSEDecoder 拆行；
+        # 收到 [DONE] 后继续读完剩余字节（通常只有分块结束标记），连接才能归还连接池复用
+        for chunk in response.iter_content(chunk_size=None):
+            if not done:
+                done = not handler.feed(chunk)
+    except requests.RequestException as e:
+        if done:
+            # [DONE] 之后的收尾字节读取失败不影响结果，连接随响应关闭
+            return handler.finish()
+        # 流式响应中途断开（ChunkedEncodingError、ReadTimeout 等）：已收到的部分照常落盘，
+        # 与 aiohttp 实现一致按网络异常处理，on_content 已收到的内容由调用方保留
+        metrics.status = "network"
+        handler.finish()
+        print(f"读取流式响应时发生异常：{e}")
+        if raise_on_error:
+            raise ModelAPIError(f"读取流式响应时发生异常：{e}") from e
+        return None
+    return handler.finish()
+
+class AsyncModelClient:
+    """
+    基于 aiohttp 的异步模型客户端：
+      - 一个 ClientSession 复用连接池（keep-alive / TLS 会话复用），max_connections 限制连接数
+      - asyncio.Semaphore 限制同时在途的请求数 max_in_flight
+    客户端绑定到创建它的事件循环，应在该循环内使用并在结束前调用 close()。
+    """
+
+    def __init__(self, max_in_flight=64, max_connections=None):
+        import asyncio
+        import aiohttp
+        self._aiohttp = aiohttp
+        self.max_in_flight = max_in_flight
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        connector = aiohttp.TCPConnector(limit=max_connections or max_in_flight, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector)
+
+    async def call(self, messages, model=None, stream=False, timeout=60, big_model_log_path="big_model_calls.log",
+                   raise_on_error=False, on_content=None, endpoint=None):
+        import asyncio
+        aiohttp = self._aiohttp
+        url, headers, payload = _build_request(messages, model, stream, endpoint)
+        # 与 requests 的 timeout 语义一致：限制建立连接与两次读取之间的等待时间
+        client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+        log = get_log_sink().open_request(big_model_log_path)
+        async with self._semaphore:
+            metrics = _CallMetrics(stream, endpoint)
+            result = None
+            handler = None
+            try:
+                async with self._session.post(url, headers=headers, json=payload, timeout=client_timeout) as response:
+                    _log_trace_id(response.headers.get('X-Trace-ID'), log)
+                    if response.status != 200:
+                        metrics.status = response.status
+                        body = await response.read()
+                        _report_status_error(response.status, lambda: json.loads(body))
+                        if raise_on_error:
+                            raise ModelAPIError(f"请求失败，状态码：{response.status}", response.status,
+                                                _parse_retry_after(response.headers.get("Retry-After")))
+                        return None
+                    if not stream:
+                        try:
+                            data = get_json_loads()(await response.read())
+                        except Exception as e:
+                            metrics.status = "parse"
+                            print(f"解析响应失败: {e}")
+                            return None
+                        result = _extract_message_content(data, log, metrics, on_content)
+                        return result
+                    handler = StreamHandler(log, metrics, on_content=on_content, endpoint=endpoint)
+                    async for chunk in response.content.iter_any():
+                        if not handler.feed(chunk):
+                            break
+                    result = handler.finish()
+                    return result
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.status = "network"
+                if handler is not None:
+                    # 流式响应中途断开：已收到的部分照常落盘，on_content 已收到的内容由调用方保留
+                    handler.finish()
+                print(f"请求 API 时发生异常：{e}")
+                if raise_on_error:
+                    raise ModelAPIError(f"请求 API 时发生异常：{e}") from e
+                return None
+            finally:
+                metrics.finish(result)
+                log.close()
+
+    async def close(self):
+        await self._session.close()
+
+# 每个事件循环各自持有一个异步客户端
+_async_clients = {}
+_async_client_options = {"max_in_flight": 64, "max_connections": None}
+
+def configure_async_client(max_in_flight=64, max_connections=None):
+    """设置之后新建的异步客户端的并发参数（在途请求数上限与连接池大小）"""
+    _async_client_options["max_in_flight"] = max_in_flight
+    _async_client_options["max_connections"] = max_connections
+
+def get_async_client():
+    """返回当前事件循环对应的 AsyncModelClient，不存在时按 configure_async_client 的参数创建"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncModelClient(**_async_client_options)
+        _async_clients[loop] = client
+    return client
+
+async def close_async_client():
+    """关闭当前事件循环对应的异步客户端（asyncio.run 结束前调用）"""
+    import asyncio
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+async def call_model_api_async(messages, model=None, stream=False, timeout=60, big_model_log_path="big_model_calls.log",
+                               raise_on_error=False, on_content=None, endpoint=None):
+    """
+    call_model_api 的异步版本，参数与返回值相同。
+    所有请求共享当前事件循环的连接池，并受 max_in_flight 并发上限约束，
+    大量并发的流式请求只占用一个线程。
+    """
+    client = get_async_client()
+    return await client.call(messages, model=model, stream=stream, timeout=timeout,
+                             big_model_log_path=big_model_log_path, raise_on_error=raise_on_error,
+                             on_content=on_content, endpoint=endpoint)
+
+_aiohttp_available = None
+
+def async_client_available():
+    """是否已安装 aiohttp（结果缓存，避免每次调用都尝试导入）"""
+    global _aiohttp_available
+    if _aiohttp_available is None:
+        try:
+            import aiohttp  # noqa: F401
+            _aiohttp_available = True
+        except ImportError:
+            _aiohttp_available = False
+    return _aiohttp_available
+
+class _BackgroundLoop:
+    """同步包装器使用的后台事件循环线程：所有同步调用共享同一个循环与连接池"""
+
+    def __init__(self):
+        import asyncio
+        self._asyncio = asyncio
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="model-api-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        return self._asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def close(self):
+        """进程退出时关闭连接池并停止事件循环"""
+        try:
+            self.run(close_async_client())
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+def _get_background_loop():
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                _background_loop = _BackgroundLoop()
+                atexit.register(_background_loop.close)
+    return _background_loop
+
+def call_model_api(messages, model=None, stream=False, timeout=60, big_model_log_path="big_model_calls.log",
+                   raise_on_error=False, on_content=None, endpoint=None):
+    """
+    调用模型 API，发送消息列表 messages。
+
+    参数:
+      messages: 消息列表（格式参照 ChatGPT 格式）
+      model: 模型名称，为 None 时使用端点配置中的 model_name
+      stream: 是否采用流式返回
+      timeout: 请求超时时间
+      big_model_log_path: 大模型调用日志文件存放路径
+      raise_on_error: 为 True 时请求失败抛出 ModelAPIError（含状态码与 Retry-After），否则返回 None
+      on_content: 每收到一段正文时以该段文本回调（非流式时以完整正文回调一次），可用于边接收边解析；
+        在发起请求的线程或共享的后台事件循环线程中调用
+      endpoint: 命名端点（config.ini 中的 [model.<名称>] 段），决定请求地址、密钥与默认模型；
+        为 None 时使用 [step_api_prod]
+
+    返回:
+      当 stream=False 时，直接返回生成的文本；
+      当 stream=True 时，实时记录返回过程（含思考过程断行显示），并返回最终生成的文本。
+
+    大模型调用的详细输入、输出和 Trace ID 经后台写入器（BigModelLogSink）写入 big_model_log_path 文件，
+    每行带有请求标记，并发调用互不交错；同时 Trace ID 总是在终端显示（便于快速定位问题）。
+
+    这是 call_model_api_async 的同步包装：已安装 aiohttp 时请求提交到共享的后台事件循环执行，
+    多个线程的调用共用一个连接池；否则回退到共享 requests.Session 的同步实现。
+    """
+    if async_client_available():
+        coro = call_model_api_async(messages, model=model, stream=stream, timeout=timeout,
+                                    big_model_log_path=big_model_log_path, raise_on_error=raise_on_error,
+                                    on_content=on_content, endpoint=endpoint)
+        return _get_background_loop().run(coro)
+    return _call_model_api_requests(messages, model, stream, timeout, big_model_log_path, raise_on_error, on_content,
+                                    endpoint)
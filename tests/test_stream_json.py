@@ -0,0 +1,123 @@
+import pytest
+
+from codesense_stream_json import StreamingObjectParser
+
+# (用例名, 完整响应正文, 期望 entries, 期望 malformed, 期望 complete, 是否期望 error)
+CASES = [
+    (
+        "plain",
+        '{"a.py": "摘要 A", "b.py": "摘要 B"}',
+        {"a.py": "摘要 A", "b.py": "摘要 B"},
+        [], True, False,
+    ),
+    (
+        "escapes",
+        '{"a\\"b.py": "say \\"hi\\" \\\\", "c.py": "tab\\tend\\u4e2d"}',
+        {'a"b.py': 'say "hi" \\', "c.py": "tab\tend中"},
+        [], True, False,
+    ),
+    (
+        "missing_comma",
+        '{"a.py": "x" "b.py": {"k": 1} "c.py": "z"}',
+        {"a.py": "x", "b.py": {"k": 1}, "c.py": "z"},
+        [], True, False,
+    ),
+    (
+        "scalar_before_brace",
+        '{"a.py": 1, "b.py": null, "c.py": true}',
+        {"a.py": 1, "b.py": None, "c.py": True},
+        [], True, False,
+    ),
+    (
+        "nested_with_structural_chars_in_strings",
+        '{"a.py": {"s": "}{,]:\\""}, "b.py": ["x", {"y": [2, 3]}]}',
+        {"a.py": {"s": '}{,]:"'}, "b.py": ["x", {"y": [2, 3]}]},
+        [], True, False,
+    ),
+    (
+        "truncated_string_value",
+        '{"a.py": "x", "b.py": "未写完的摘',
+        {"a.py": "x"},
+        [], False, False,
+    ),
+    (
+        "truncated_object_value",
+        '{"a.py": "x", "b.py": {"k": [1, 2',
+        {"a.py": "x"},
+        [], False, False,
+    ),
+    (
+        "truncated_key",
+        '{"a.py": "x", "b.p',
+        {"a.py": "x"},
+        [], False, False,
+    ),
+    (
+        "malformed_value",
+        '{"a.py": nope, "b.py": "y", "c.py": 1.2.3}',
+        {"b.py": "y"},
+        ["a.py", "c.py"], True, False,
+    ),
+    (
+        "prose_and_code_fence",
+        '好的，以下是摘要：\n```json\n{\n  "a.py": "x",\n  "b.py": "y"\n}\n```\n如有需要请告知。',
+        {"a.py": "x", "b.py": "y"},
+        [], True, False,
+    ),
+    (
+        "unquoted_key",
+        '{"a.py": "x", b.py: "y"}',
+        {"a.py": "x"},
+        [], False, True,
+    ),
+    (
+        "empty_object",
+        "```json\n{}\n```",
+        {},
+        [], True, False,
+    ),
+]
+
+
+def _split_points(text):
+    """所有两段切分，外加逐字符输入"""
+    for i in range(len(text) + 1):
+        yield f"split@{i}", [text[:i], text[i:]]
+    yield "per_char", list(text)
+
+
+def _run(chunks):
+    seen = []
+    parser = StreamingObjectParser(on_entry=lambda key, value: seen.append((key, value)))
+    for chunk in chunks:
+        parser.feed(chunk)
+    entries = parser.finish()
+    return parser, entries, seen
+
+
+@pytest.mark.parametrize(
+    "text, entries, malformed, complete, has_error",
+    [case[1:] for case in CASES],
+    ids=[case[0] for case in CASES],
+)
+def test_every_split_position(text, entries, malformed, complete, has_error):
+    for label, chunks in _split_points(text):
+        parser, result, seen = _run(chunks)
+        assert result == entries, label
+        assert list(result.items()) == list(entries.items()), label
+        assert seen == list(entries.items()), label
+        assert parser.malformed == malformed, label
+        assert parser.complete is complete, label
+        assert (parser.error is not None) is has_error, label
+
+
+def test_content_after_object_is_ignored():
+    parser, result, _ = _run(['{"a.py": "x"}', ' {"b.py": "y"}'])
+    assert result == {"a.py": "x"}
+    assert parser.complete
+
+
+def test_custom_loads():
+    parser = StreamingObjectParser(loads=lambda text: ("raw", text))
+    parser.feed('{"a.py": 12, "b.py": "y"}')
+    assert parser.finish() == {"a.py": ("raw", "12"), "b.py": ("raw", '"y"')}